@@ -1,13 +1,50 @@
+import multiprocessing
 import os
 import re
 import sys
-from typing import Dict, Optional
+import time
+import weakref
+from typing import Callable, Dict, Optional, Union
 
+import numpy as np
 import pandas as pd
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QAction, QFont, QIcon, QColor, QPixmap
+from PyQt6.QtCore import (QAbstractTableModel, QEvent, QFileSystemWatcher, QItemSelection, QItemSelectionModel,
+                          QModelIndex, QObject, Qt, QThread, QTimer, pyqtSignal)
+from PyQt6.QtGui import QAction, QActionGroup, QFont, QIcon, QColor, QKeySequence, QPixmap, QShortcut
 from PyQt6.QtWidgets import *
 
+import backends
+import engine
+from engine import TableRevision, TableStore
+from instrumentation import OperationRecord, performance_log
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Rows shown in the table previews of the merge and append dialogs, and the preview models kept for reuse
+PREVIEW_ROWS = 3
+MAX_PREVIEW_MODELS = 16
+MAX_RESIZED_PREVIEW_COLUMNS = 200
+
+# Watched files are read this long after their last change, so a burst of writes is read at once
+FOLLOW_DELAY_MS = 500
+
+# Tables are indexed for the search this long after they last changed, so a burst of changes is indexed at once
+SEARCH_INDEX_DELAY_MS = 500
+
+# Background colors of the rows of a diff by their change, and of the changed cells of modified rows
+DIFF_COLORS = {
+    "added": QColor(214, 245, 214),
+    "removed": QColor(250, 214, 214),
+    "modified": QColor(255, 248, 214),
+    "changed": QColor(255, 224, 140),
+}
+
+# Preview models by the id of the revision they show, least recently used first, see preview_model
+_preview_models: Dict[int, tuple] = {}
+
 
 # TODO: Make code device and OS agnostic
 
@@ -23,6 +60,59 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+def format_bytes(num_bytes: float) -> str:
+    """ Format a byte count as a human readable string (e.g. 1.5 MB) """
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TB"
+
+
+def format_count(count: Optional[int]) -> str:
+    """ Format a row or column count, which is unknown (None) for revisions that have not been evaluated yet """
+    return "-" if count is None else str(count)
+
+
+def compressed_patterns(extension: str) -> str:
+    """ File dialog patterns of the compressed files of a format, e.g. "*.csv.gz *.csv.bz2 ..." """
+    return " ".join(f"*{extension}{compression_extension}" for compression_extension in engine.COMPRESSION_EXTENSIONS)
+
+
+def format_value(value) -> str:
+    """ Format a profile value, shortening long text """
+    text = "-" if value is None else str(value)
+    return text if len(text) <= 40 else text[:37] + "..."
+
+
+def cell_texts(data: pd.DataFrame, rows: Optional[np.ndarray] = None) -> list:
+    """ The text of the cells as the table view shows them (str of the value), by column, for the rows in order """
+    return [list(map(str, data.iloc[:, j] if rows is None else data.iloc[rows, j])) for j in range(data.shape[1])]
+
+
+def format_profile(column, profile: Dict) -> str:
+    """ Format a column profile from TableRevision.column_profile as tooltip text """
+    approximate = "~" if profile["estimated"] else ""
+    lines = [
+        f"{column} ({profile['dtype']})",
+        f"Nulls: {profile['nulls']} of {profile['rows']}",
+        f"Distinct: {approximate}{profile['distinct']}",
+        f"Min: {format_value(profile['min'])}",
+        f"Max: {format_value(profile['max'])}",
+    ]
+    if profile["top"]:
+        lines.append("Top values" + (" (sampled):" if profile["estimated"] else ":"))
+        lines.extend(f"  {format_value(value)}: {approximate}{count}" for value, count in profile["top"])
+    return "\n".join(lines)
+
+
+def process_memory() -> Optional[int]:
+    """ Return the resident memory of this process in bytes, or None if psutil is not installed """
+    if psutil is None:
+        return None
+    return psutil.Process(os.getpid()).memory_info().rss
+
+
 class LoadingDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -66,10 +156,12 @@ class ExportDialog(QDialog):
     - browse_output_location: Opens a file dialog for the user to select the output location.
     - check_existing_files: Checks if the selected tables already exist in the output location.
     - update_table_data: Updates the table data when the user modifies the table list.
+    - output_file_name: Returns the file name of a table, with the selected compression for CSV and text files.
     - export_selected_tables: Exports the selected tables to the specified output location.
+    - write_files: Writes each output file through the engine, reporting warnings and unsupported extensions.
     """
 
-    def __init__(self, tables: Dict[str, 'TableRevision'], parent: Optional[QWidget] = None):
+    def __init__(self, tables: Dict[str, TableRevision], parent: Optional[QWidget] = None):
         super().__init__(parent)
         self.setWindowTitle("Export Tables")
         self.setWindowIcon(QIcon(resource_path(os.path.join("assets", "images", "crm-icon-high-seas.png"))))
@@ -134,6 +226,23 @@ class ExportDialog(QDialog):
             output_layout.addWidget(browse_button)
             layout.addLayout(output_layout)
 
+            # Compression
+            compression_layout = QHBoxLayout()
+            compression_layout.addWidget(QLabel("Compression:"))
+            self.compression_dropdown = QComboBox()
+            self.compression_dropdown.addItem("None", "")
+            available = engine.available_compressions()
+            for compression_extension, compression in engine.COMPRESSION_EXTENSIONS.items():
+                if compression in available:
+                    self.compression_dropdown.addItem(f"{compression} ({compression_extension})",
+                                                      compression_extension)
+            self.compression_dropdown.setToolTip("Compress CSV and text files while they are written. "
+                                                 "Excel files are always compressed.")
+            self.compression_dropdown.currentIndexChanged.connect(self.check_existing_files)
+            compression_layout.addWidget(self.compression_dropdown)
+            compression_layout.addStretch()
+            layout.addLayout(compression_layout)
+
             # Export Button
             self.export_button = QPushButton("Export")
             self.export_button.setToolTip("Export the selected tables to the specified output location.")
@@ -155,10 +264,12 @@ class ExportDialog(QDialog):
         if self.output_location:
             existing_files = os.listdir(self.output_location)
             show_update_label = False
+            # Coloring an item emits itemChanged, which would rename its table in update_table_data
+            self.table_list.blockSignals(True)
             for row in range(self.table_list.rowCount()):
                 spreadsheet_name = self.table_list.item(row, 1).text()
                 extension = self.table_list.item(row, 3).text()
-                file_name = f"{spreadsheet_name}{extension}"
+                file_name = self.output_file_name(spreadsheet_name, extension)
                 if file_name in existing_files:
                     for col in range(4):
                         self.table_list.item(row, col).setForeground(QColor(255, 0, 0))
@@ -169,6 +280,7 @@ class ExportDialog(QDialog):
                     for col in range(4):
                         self.table_list.item(row, col).setForeground(QColor(255, 255, 255))
                     self.table_list.item(row, 0).setToolTip("")
+            self.table_list.blockSignals(False)
             self.update_name_label.setVisible(show_update_label)
 
     def update_table_data(self, item):
@@ -196,7 +308,7 @@ class ExportDialog(QDialog):
 
         # Check if the table exists in the output folder
         if self.output_location:
-            file_name = f"{table_revision.spreadsheet_name}{table_revision.extension}"
+            file_name = self.output_file_name(table_revision.spreadsheet_name, table_revision.extension)
             file_path = os.path.join(self.output_location, file_name)
             if os.path.exists(file_path):
                 for col in range(4):
@@ -209,6 +321,15 @@ class ExportDialog(QDialog):
                     self.table_list.item(row, col).setForeground(QColor(255, 255, 255))
                 self.table_list.item(row, 0).setToolTip("")
 
+    def output_file_name(self, spreadsheet_name: str, extension: str) -> str:
+        file_name = f"{spreadsheet_name}{extension}"
+        compression_extension = self.compression_dropdown.currentData()
+        name, file_extension, _ = engine.split_extension(file_name)
+        if compression_extension and file_extension in (".csv", ".txt"):
+            # Replaces the compression of tables loaded from compressed files
+            file_name = f"{name}{file_extension}{compression_extension}"
+        return file_name
+
     def export_selected_tables(self):
         selected_rows = self.table_list.selectionModel().selectedRows()
         if not selected_rows:
@@ -228,7 +349,7 @@ class ExportDialog(QDialog):
             spreadsheet_name = self.table_list.item(row, 1).text()
             sheet_name = self.table_list.item(row, 2).text()
             extension = self.table_list.item(row, 3).text()
-            file_name = f"{spreadsheet_name}{extension}"
+            file_name = self.output_file_name(spreadsheet_name, extension)
             file_path = os.path.join(self.output_location, file_name)
             if os.path.exists(file_path):
                 if os.path.isfile(file_path) and sys.platform == 'win32':
@@ -259,50 +380,150 @@ class ExportDialog(QDialog):
                     file_path = os.path.join(self.output_location, file_name)
                     os.system(f'taskkill /F /IM "{os.path.basename(file_path)}"')
 
-        for file_name, sheet_data in file_data.items():
-            extension = os.path.splitext(file_name)[1]
-            file_path = os.path.join(self.output_location, file_name)
-
-            if extension == ".csv":
-                if len(sheet_data) > 1:
-                    QMessageBox.warning(self, "Multiple Sheets",
-                                        f"The file '{file_name}' contains multiple sheets. "
-                                        "Only the first sheet will be exported as CSV.")
-                sheet_name = next(iter(sheet_data))
-                sheet_data[sheet_name].revisions[sheet_data[sheet_name].current_revision].to_csv(file_path, index=False)
-            elif extension in [".xlsx", ".xls", ".xlsm"]:
-                if os.path.exists(file_path):
-                    # Create new file with _transformed appended to the name
-                    file_name, extension = os.path.splitext(file_path)
-                    with pd.ExcelWriter(f"{file_name}_transformed{extension}", engine='openpyxl') as writer:
-                        for sheet_name, table_revision in sheet_data.items():
-                            table_revision.revisions[table_revision.current_revision].to_excel(writer,
-                                                                                               sheet_name=sheet_name,
-                                                                                               index=False)
-                else:
-                    # Create new file
-                    with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                        for sheet_name, table_revision in sheet_data.items():
-                            table_revision.revisions[table_revision.current_revision].to_excel(writer,
-                                                                                               sheet_name=sheet_name,
-                                                                                               index=False)
-            elif extension == ".txt":
-                if len(sheet_data) > 1:
-                    QMessageBox.warning(self, "Multiple Sheets",
-                                        f"The file '{file_name}' contains multiple sheets. "
-                                        "Only the first sheet will be exported as TXT.")
-                sheet_name = next(iter(sheet_data))
-                sheet_data[sheet_name].revisions[sheet_data[sheet_name].current_revision].to_csv(file_path, sep="\t",
-                                                                                                 index=False)
-            else:
-                QMessageBox.warning(self, "Unsupported Extension",
-                                    f"The extension '{extension}' is not supported for export.")
-                continue
+        with performance_log.operation("Export"):
+            self.write_files(file_data)
 
         QMessageBox.information(self, "Export Completed", "The selected tables have been exported successfully.")
         self.parent().loading_dialog.hide()
         self.close()
 
+    def write_files(self, file_data: Dict[str, Dict[str, TableRevision]]):
+        for file_name, sheet_data in file_data.items():
+            file_path = os.path.join(self.output_location, file_name)
+            sheets = {sheet_name: table_revision.get_data() for sheet_name, table_revision in sheet_data.items()}
+            try:
+                warnings = engine.write_file(file_path, sheets)
+            except ValueError as e:
+                QMessageBox.warning(self, "Unsupported Extension", str(e))
+                continue
+            for warning in warnings:
+                QMessageBox.warning(self, "Multiple Sheets", warning)
+
+
+class PreviewModel(QAbstractTableModel):
+    """
+    A read-only model of the first rows of a table revision, for the previews of the merge and append dialogs.
+
+    Cells are only formatted when the view paints them, so previews of wide tables open instantly. Use
+    preview_model to get the shared model of a table's current revision.
+
+    Functions:
+    - __init__: Keeps a copy of the first rows of the data.
+    - rowCount: Returns the number of preview rows.
+    - columnCount: Returns the number of columns.
+    - data: Returns the text of a cell.
+    - headerData: Returns the column names and row numbers.
+    """
+
+    def __init__(self, data: pd.DataFrame, rows: int = PREVIEW_ROWS):
+        super().__init__()
+        # A copy, so the model does not keep the whole table alive
+        self.preview = data.iloc[:rows].copy()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.preview)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.preview.columns)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and index.isValid():
+            return str(self.preview.iat[index.row(), index.column()])
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return str(self.preview.columns[section])
+        return str(section + 1)
+
+
+def preview_model(table_revision: TableRevision) -> PreviewModel:
+    """
+    Returns the preview model of the current revision of a table. Models are built once per revision and shared
+    by all dialogs, so switching tables in a dialog reuses them.
+    """
+    revision = table_revision.revisions[table_revision.current_revision]
+    cached = _preview_models.pop(id(revision), None)
+    # The weak reference tells whether the id still belongs to the same revision
+    if cached is None or cached[0]() is not revision:
+        cached = (weakref.ref(revision), PreviewModel(table_revision.get_data()))
+    _preview_models[id(revision)] = cached
+    while len(_preview_models) > MAX_PREVIEW_MODELS:
+        del _preview_models[next(iter(_preview_models))]
+    return cached[1]
+
+
+class PreviewTableView(QTableView):
+    """
+    A table view showing the preview of a table, in which the user selects a column.
+
+    column_selected is emitted with the selected column, or -1 when no column is selected. It is emitted for
+    every model the view shows, so it only has to be connected once.
+
+    Functions:
+    - __init__: Sets up single column selection.
+    - set_table: Shows the preview of a table, or nothing.
+    - selectionChanged: Emits column_selected.
+    """
+    column_selected = pyqtSignal(int)
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.preview_model = None
+        self.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectColumns)
+        self.setHorizontalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+
+    def set_table(self, table_revision: Optional[TableRevision]):
+        # Keep a reference, the model may be dropped from the cache while it is shown
+        self.preview_model = preview_model(table_revision) if table_revision is not None else None
+        self.setModel(self.preview_model)
+        # Measuring every column of a wide table takes longer than showing it
+        if self.preview_model is not None and self.preview_model.columnCount() <= MAX_RESIZED_PREVIEW_COLUMNS:
+            self.resizeColumnsToContents()
+        self.column_selected.emit(-1)
+
+    def selectionChanged(self, selected, deselected):
+        super().selectionChanged(selected, deselected)
+        indexes = self.selectionModel().selectedIndexes()
+        self.column_selected.emit(indexes[0].column() if indexes else -1)
+
+
+class ColumnProfileToolTip(QObject):
+    """
+    Shows the profile of a column as the tooltip of its header section.
+
+    Profiles are only computed when the mouse rests on a header, and TableRevision caches them per revision.
+
+    Functions:
+    - __init__: Watches the tooltip events of the header; get_table returns the table it shows, if any.
+    - eventFilter: Shows the profile of the column under the mouse.
+    """
+
+    def __init__(self, header: QHeaderView, get_table: Callable[[], Optional[TableRevision]]):
+        super().__init__(header)
+        self.header = header
+        self.get_table = get_table
+        header.viewport().installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Type.ToolTip:
+            table_revision = self.get_table()
+            section = self.header.logicalIndexAt(event.pos())
+            if table_revision is not None and section >= 0:
+                columns = table_revision.get_data().columns
+                if section < len(columns):
+                    tooltip = format_profile(columns[section], table_revision.column_profile(columns[section]))
+                    formula = table_revision.formulas().get(columns[section])
+                    if formula is not None:
+                        tooltip += f"\nComputed: {formula}"
+                    QToolTip.showText(event.globalPos(), tooltip, self.header)
+                    return True
+        return super().eventFilter(watched, event)
+
 
 class PivotDialog(QDialog):
     """
@@ -313,11 +534,14 @@ class PivotDialog(QDialog):
 
     Functions:
     - __init__: Initializes the PivotDialog with the necessary components and layout.
+    - show_profile: Sets the profile of a values column as its tooltip in the dropdown.
     - get_values_column: Retrieves the selected values column from the dropdown menu.
     """
 
-    def __init__(self, data: pd.DataFrame, selected_column: str, parent: Optional[QWidget] = None):
+    def __init__(self, data: pd.DataFrame, selected_column: str, parent: Optional[QWidget] = None,
+                 table_revision: Optional[TableRevision] = None):
         super().__init__(parent)
+        self.table_revision = table_revision
         self.setWindowTitle("Pivot Table")
         self.setGeometry(100, 100, 400, 200)
 
@@ -341,7 +565,13 @@ class PivotDialog(QDialog):
 
         self.values_dropdown = QComboBox()
         self.values_dropdown.addItems(data.columns)
+        # Profiles are computed for the columns the user looks at, not for all columns up front
+        self.values_dropdown.highlighted.connect(self.show_profile)
+        self.values_dropdown.currentIndexChanged.connect(self.show_profile)
         layout.addWidget(self.values_dropdown)
+        if table_revision is not None:
+            explanation_label.setToolTip(format_profile(selected_column, table_revision.column_profile(selected_column)))
+            self.show_profile(self.values_dropdown.currentIndex())
 
         # Accept Button
         self.accept_button = QPushButton("Accept")
@@ -350,10 +580,492 @@ class PivotDialog(QDialog):
 
         self.setLayout(layout)
 
+    def show_profile(self, index: int):
+        if self.table_revision is None or index < 0:
+            return
+        column = self.table_revision.get_data().columns[index]
+        tooltip = format_profile(column, self.table_revision.column_profile(column))
+        self.values_dropdown.setItemData(index, tooltip, Qt.ItemDataRole.ToolTipRole)
+        if index == self.values_dropdown.currentIndex():
+            self.values_dropdown.setToolTip(tooltip)
+
     def get_values_column(self):
         return self.values_dropdown.currentText()
 
 
+class SortDialog(QDialog):
+    """
+    A dialog for sorting a table by one or more columns, each ascending or descending.
+
+    Rows with equal values in the first column are ordered by the second column, and so on.
+
+    Functions:
+    - __init__: Initializes the SortDialog with a sort key for each preselected column.
+    - add_key: Adds a sort key row.
+    - remove_key: Removes the last sort key row.
+    - get_sort_keys: Returns the selected columns and whether each is sorted ascending.
+    """
+
+    def __init__(self, columns: list, selected_columns: list, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setWindowTitle("Sort")
+        self.columns = list(columns)
+        self.keys = []
+
+        layout = QVBoxLayout()
+
+        header_label = QLabel("Sort Table")
+        header_label.setStyleSheet("font-size: 18px; font-weight: bold;")
+        layout.addWidget(header_label)
+
+        explanation_label = QLabel("Rows are sorted by the first column, then by the next for equal values.")
+        explanation_label.setWordWrap(True)
+        layout.addWidget(explanation_label)
+
+        self.keys_layout = QVBoxLayout()
+        layout.addLayout(self.keys_layout)
+        for column in selected_columns or self.columns[:1]:
+            self.add_key(self.columns.index(column))
+
+        key_buttons_layout = QHBoxLayout()
+        add_button = QPushButton("Add Column")
+        add_button.clicked.connect(lambda: self.add_key())
+        key_buttons_layout.addWidget(add_button)
+        remove_button = QPushButton("Remove Column")
+        remove_button.clicked.connect(self.remove_key)
+        key_buttons_layout.addWidget(remove_button)
+        layout.addLayout(key_buttons_layout)
+
+        self.accept_button = QPushButton("Sort")
+        self.accept_button.clicked.connect(self.accept)
+        layout.addWidget(self.accept_button)
+
+        self.setLayout(layout)
+
+    def add_key(self, column_index: int = 0):
+        key_layout = QHBoxLayout()
+        column_dropdown = QComboBox()
+        column_dropdown.addItems([str(column) for column in self.columns])
+        column_dropdown.setCurrentIndex(column_index)
+        key_layout.addWidget(column_dropdown)
+        direction_dropdown = QComboBox()
+        direction_dropdown.addItems(["Ascending", "Descending"])
+        key_layout.addWidget(direction_dropdown)
+        self.keys_layout.addLayout(key_layout)
+        self.keys.append((key_layout, column_dropdown, direction_dropdown))
+
+    def remove_key(self):
+        if len(self.keys) > 1:
+            key_layout, column_dropdown, direction_dropdown = self.keys.pop()
+            column_dropdown.deleteLater()
+            direction_dropdown.deleteLater()
+            self.keys_layout.removeItem(key_layout)
+
+    def get_sort_keys(self):
+        by, ascending = [], []
+        for _, column_dropdown, direction_dropdown in self.keys:
+            column = self.columns[column_dropdown.currentIndex()]
+            if column not in by:
+                by.append(column)
+                ascending.append(direction_dropdown.currentIndex() == 0)
+        return by, ascending
+
+
+class FindReplaceDialog(QDialog):
+    """
+    A dialog for finding text in a column, a table or all tables and replacing it.
+
+    The matches are counted in a background thread, which also prepares their replacement, so Replace All only
+    adds one revision per table with matches.
+
+    Functions:
+    - __init__: Initializes the FindReplaceDialog with the options of the filter buttons.
+    - options_changed: Discards the counted matches when the text, an option or the scope changes.
+    - count_matches: Counts the matches in a background thread.
+    - replace_all: Replaces the counted matches, counting them first if needed.
+    - search_done: Shows the number of matches, and replaces them if Replace All started the search.
+    - search_failed: Shows the error of the search.
+    """
+
+    def __init__(self, tables: TableStore, table_name: str, column: Optional[str], replace: Callable[[Dict], tuple],
+                 match_case: bool = False, whole_word: bool = False, starts_with: bool = False,
+                 parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.tables = tables
+        self.table_name = table_name
+        self.column = column
+        # Called with the results of a search, adds the replaced cells and returns (cells, tables, skipped tables)
+        self.replace = replace
+        self.results = None
+        self.worker = None
+        self.setWindowTitle("Find and Replace")
+
+        layout = QVBoxLayout()
+
+        header_label = QLabel("Find and Replace")
+        header_label.setStyleSheet("font-size: 18px; font-weight: bold;")
+        layout.addWidget(header_label)
+
+        explanation_label = QLabel("Cells are searched as they are shown. Replacing adds one revision to each table "
+                                   "with matches, which undo takes back at once.")
+        explanation_label.setWordWrap(True)
+        layout.addWidget(explanation_label)
+
+        grid = QGridLayout()
+        self.find_edit = QLineEdit()
+        grid.addWidget(QLabel("Find:"), 0, 0)
+        grid.addWidget(self.find_edit, 0, 1)
+        self.replace_edit = QLineEdit()
+        self.replace_edit.setToolTip("With a regular expression, \\1 or \\g<name> inserts a group of the match.")
+        grid.addWidget(QLabel("Replace with:"), 1, 0)
+        grid.addWidget(self.replace_edit, 1, 1)
+        self.scope_dropdown = QComboBox()
+        if column is not None:
+            self.scope_dropdown.addItem(f"Column {column} of {table_name}")
+        self.scope_dropdown.addItem(f"Table {table_name}")
+        self.scope_dropdown.addItem("All tables")
+        grid.addWidget(QLabel("Look in:"), 2, 0)
+        grid.addWidget(self.scope_dropdown, 2, 1)
+        layout.addLayout(grid)
+
+        self.match_case_check = QCheckBox("Match case (Cc)")
+        self.match_case_check.setChecked(match_case)
+        self.whole_word_check = QCheckBox("Entire cell (W)")
+        self.whole_word_check.setChecked(whole_word)
+        self.starts_with_check = QCheckBox("Starts with (Sw)")
+        self.starts_with_check.setChecked(starts_with)
+        self.regex_check = QCheckBox("Regular expression")
+        options_layout = QHBoxLayout()
+        for check in [self.match_case_check, self.whole_word_check, self.starts_with_check, self.regex_check]:
+            check.toggled.connect(self.options_changed)
+            options_layout.addWidget(check)
+        layout.addLayout(options_layout)
+        self.find_edit.textChanged.connect(self.options_changed)
+        self.replace_edit.textChanged.connect(self.options_changed)
+        self.scope_dropdown.currentIndexChanged.connect(self.options_changed)
+
+        self.status_label = QLabel("")
+        self.status_label.setWordWrap(True)
+        layout.addWidget(self.status_label)
+
+        buttons_layout = QHBoxLayout()
+        self.count_button = QPushButton("Count Matches")
+        self.count_button.clicked.connect(lambda: self.count_matches())
+        buttons_layout.addWidget(self.count_button)
+        self.replace_button = QPushButton("Replace All")
+        self.replace_button.clicked.connect(self.replace_all)
+        buttons_layout.addWidget(self.replace_button)
+        layout.addLayout(buttons_layout)
+
+        self.setLayout(layout)
+
+    def options_changed(self):
+        self.results = None
+        self.status_label.setText("")
+
+    def count_matches(self, then_replace: bool = False):
+        if not self.find_edit.text():
+            self.status_label.setText("Enter the text to find.")
+            return
+        options = {"match_case": self.match_case_check.isChecked(), "whole_word": self.whole_word_check.isChecked(),
+                   "starts_with": self.starts_with_check.isChecked(), "regex": self.regex_check.isChecked()}
+        try:
+            engine.find_pattern(self.find_edit.text(), **options)
+        except re.error as e:
+            self.status_label.setText(f"Invalid regular expression: {e}")
+            return
+
+        scope = self.scope_dropdown.currentText()
+        if scope == "All tables":
+            scope = {name: (table_revision, None) for name, table_revision in self.tables.items()}
+        else:
+            scope = {self.table_name: (self.tables[self.table_name], None if scope.startswith("Table ")
+                                       else [self.column])}
+        for table_revision, _ in scope.values():
+            # Cell edits not committed yet are searched as well
+            table_revision.commit_edits()
+
+        self.count_button.setEnabled(False)
+        self.replace_button.setEnabled(False)
+        self.status_label.setText("Counting matches...")
+        self.worker = FindReplaceWorker(scope, self.find_edit.text(), self.replace_edit.text(), options, parent=self)
+        self.worker.done.connect(lambda results, seconds: self.search_done(results, seconds, then_replace))
+        self.worker.failed.connect(self.search_failed)
+        self.worker.start()
+
+    def replace_all(self):
+        if self.results is None:
+            self.count_matches(then_replace=True)
+            return
+        cells, tables, skipped = self.replace(self.results)
+        self.results = None
+        status = f"Replaced {cells:,} cells in {tables} table(s)."
+        if skipped:
+            status += f" {skipped} table(s) changed since the matches were counted and were left alone."
+        self.status_label.setText(status)
+
+    def search_done(self, results: Dict, seconds: float, then_replace: bool):
+        self.count_button.setEnabled(True)
+        self.replace_button.setEnabled(True)
+        self.results = results
+        matches = sum(result[3] for result in results.values())
+        cells = sum(len(positions) for result in results.values() for positions, _ in result[2].values())
+        with performance_log.operation("Count Matches"):
+            performance_log.record_stage("find matches (background)", seconds, rows_out=matches,
+                                         stages=self.worker.stages)
+        if not matches:
+            self.status_label.setText("No matches.")
+        elif then_replace:
+            self.replace_all()
+        else:
+            self.status_label.setText(f"{matches:,} matches in {len(results)} table(s). Replacing them changes "
+                                      f"{cells:,} cells.")
+
+    def search_failed(self, message: str):
+        self.count_button.setEnabled(True)
+        self.replace_button.setEnabled(True)
+        self.status_label.setText(f"The search failed: {message}")
+
+    def done(self, result: int):
+        # The worker has to finish before the dialog and the worker with it are deleted. It stops at the next
+        # column once interrupted, so closing does not wait for the whole search.
+        if self.worker is not None:
+            self.worker.requestInterruption()
+            self.worker.wait()
+        super().done(result)
+
+
+class FormulaDialog(QDialog):
+    """
+    A dialog for entering the name and the expression of a computed column (see engine.compute_columns).
+
+    The expression is evaluated on the first rows of the table while it is typed, so mistakes show up before
+    the whole column is computed.
+
+    Functions:
+    - __init__: Initializes the FormulaDialog with the columns of the table and, when editing, the formula.
+    - insert_column: Inserts a reference to a column at the cursor of the expression.
+    - check_formula: Evaluates the formula on the first rows and shows the values or the error.
+    - accept: Accepts the dialog if the formula is valid.
+    - get_formula: Returns the name and the expression.
+    """
+
+    def __init__(self, table_revision: TableRevision, name: str = "", expression: str = "",
+                 parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.table_revision = table_revision
+        self.valid = False
+        self.setWindowTitle("Computed Column")
+
+        layout = QVBoxLayout()
+
+        header_label = QLabel("Computed Column")
+        header_label.setStyleSheet("font-size: 18px; font-weight: bold;")
+        layout.addWidget(header_label)
+
+        explanation_label = QLabel("The column is computed from the other columns of each row, e.g. "
+                                   "Price * `Units Sold` or (Total > 100) & (Region == 'West'). Names that are "
+                                   "not single words go in backticks. It is recalculated when the columns it "
+                                   "uses change.")
+        explanation_label.setWordWrap(True)
+        layout.addWidget(explanation_label)
+
+        layout.addWidget(QLabel("Column name:"))
+        self.name_edit = QLineEdit(name)
+        # An existing computed column is edited under its name
+        self.name_edit.setReadOnly(bool(expression))
+        layout.addWidget(self.name_edit)
+
+        layout.addWidget(QLabel("Expression:"))
+        self.expression_edit = QLineEdit(expression)
+        layout.addWidget(self.expression_edit)
+
+        columns_label = QLabel("Columns (double-click to insert):")
+        layout.addWidget(columns_label)
+        self.columns_list = QListWidget()
+        self.columns_list.addItems([str(column) for column in table_revision.data.columns])
+        self.columns_list.itemDoubleClicked.connect(self.insert_column)
+        layout.addWidget(self.columns_list)
+
+        self.result_label = QLabel()
+        self.result_label.setWordWrap(True)
+        layout.addWidget(self.result_label)
+
+        self.accept_button = QPushButton("Accept")
+        self.accept_button.clicked.connect(self.accept)
+        layout.addWidget(self.accept_button)
+
+        self.setLayout(layout)
+        self.name_edit.textChanged.connect(self.check_formula)
+        self.expression_edit.textChanged.connect(self.check_formula)
+        self.check_formula()
+
+    def insert_column(self, item):
+        name = item.text()
+        self.expression_edit.insert(name if re.fullmatch(r"[A-Za-z_]\w*", name) else f"`{name}`")
+        self.expression_edit.setFocus()
+
+    def check_formula(self):
+        name, expression = self.get_formula()
+        self.valid = False
+        if not name or not expression:
+            self.result_label.setStyleSheet("font-size: 10pt; color: #888;")
+            self.result_label.setText("Enter a column name and an expression.")
+            return
+        try:
+            engine.define_formula(self.table_revision.formulas(), name, expression)
+            values = engine.evaluate_formula(self.table_revision.data.iloc[:PREVIEW_ROWS], name, expression)
+        except Exception as e:
+            # Any error of the expression, e.g. a syntax error or an unknown column, is shown as it is typed
+            self.result_label.setStyleSheet("font-size: 10pt; color: #ff0000;")
+            self.result_label.setText(f"{type(e).__name__}: {e}")
+            return
+        self.valid = True
+        self.result_label.setStyleSheet("font-size: 10pt; color: #888;")
+        if not isinstance(values, pd.Series):
+            values = pd.Series([values])
+        self.result_label.setText(f"First values ({values.dtype}): {', '.join(map(format_value, values))}")
+
+    def accept(self):
+        if self.valid:
+            super().accept()
+
+    def get_formula(self):
+        return self.name_edit.text().strip(), self.expression_edit.text().strip()
+
+
+class ProjectionDialog(QDialog):
+    """
+    A dialog for choosing the part of a file to load: a sheet, the columns, a range of rows and a filter.
+
+    Only the header and the sheet dimensions of the file are read to fill it, see engine.inspect_file.
+
+    Functions:
+    - __init__: Initializes the ProjectionDialog with the sheets and columns of the file.
+    - update_sheet: Shows the columns and the row count of the selected sheet.
+    - set_all_checked: Checks or unchecks every column.
+    - accept: Checks that at least one column is selected before closing the dialog.
+    - get_projection: Returns the selection as a projection for engine.read_file.
+    """
+
+    def __init__(self, file_path: str, sheets: list, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setWindowTitle("Load Table")
+        self.sheets = sheets
+
+        layout = QVBoxLayout()
+
+        header_label = QLabel("Choose Columns and Rows")
+        header_label.setStyleSheet("font-size: 18px; font-weight: bold;")
+        layout.addWidget(header_label)
+
+        explanation_label = QLabel(f"Only the selected part of {os.path.basename(file_path)} is read.")
+        explanation_label.setWordWrap(True)
+        layout.addWidget(explanation_label)
+
+        self.sheet_dropdown = QComboBox()
+        self.sheet_dropdown.addItems([sheet_name for sheet_name, _, _ in sheets])
+        if len(sheets) > 1:
+            sheet_layout = QHBoxLayout()
+            # The sheets of a zip archive are its files
+            sheet_layout.addWidget(QLabel("File:" if engine.split_extension(file_path)[1] == ".zip" else "Sheet:"))
+            sheet_layout.addWidget(self.sheet_dropdown)
+            layout.addLayout(sheet_layout)
+
+        self.column_list = QListWidget()
+        layout.addWidget(self.column_list)
+        select_layout = QHBoxLayout()
+        select_all_button = QPushButton("Select All")
+        select_all_button.clicked.connect(lambda: self.set_all_checked(True))
+        select_layout.addWidget(select_all_button)
+        select_none_button = QPushButton("Select None")
+        select_none_button.clicked.connect(lambda: self.set_all_checked(False))
+        select_layout.addWidget(select_none_button)
+        layout.addLayout(select_layout)
+
+        rows_layout = QHBoxLayout()
+        rows_layout.addWidget(QLabel("First row:"))
+        self.first_row_input = QSpinBox()
+        self.first_row_input.setRange(1, 2 ** 31 - 1)
+        rows_layout.addWidget(self.first_row_input)
+        rows_layout.addWidget(QLabel("Rows:"))
+        self.rows_input = QSpinBox()
+        self.rows_input.setRange(0, 2 ** 31 - 1)
+        self.rows_input.setSpecialValueText("All")
+        rows_layout.addWidget(self.rows_input)
+        self.row_count_label = QLabel()
+        rows_layout.addWidget(self.row_count_label)
+        rows_layout.addStretch()
+        layout.addLayout(rows_layout)
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Keep rows where"))
+        self.filter_column_dropdown = QComboBox()
+        filter_layout.addWidget(self.filter_column_dropdown)
+        filter_layout.addWidget(QLabel("contains"))
+        self.filter_text_input = QLineEdit()
+        filter_layout.addWidget(self.filter_text_input)
+        layout.addLayout(filter_layout)
+        filter_options_layout = QHBoxLayout()
+        self.match_case_checkbox = QCheckBox("Match case")
+        filter_options_layout.addWidget(self.match_case_checkbox)
+        self.whole_word_checkbox = QCheckBox("Entire word")
+        filter_options_layout.addWidget(self.whole_word_checkbox)
+        self.starts_with_checkbox = QCheckBox("Starts with")
+        filter_options_layout.addWidget(self.starts_with_checkbox)
+        filter_options_layout.addStretch()
+        layout.addLayout(filter_options_layout)
+
+        self.load_button = QPushButton("Load")
+        self.load_button.clicked.connect(self.accept)
+        layout.addWidget(self.load_button)
+
+        self.setLayout(layout)
+
+        self.sheet_dropdown.currentIndexChanged.connect(self.update_sheet)
+        self.update_sheet(0)
+
+    def update_sheet(self, index: int):
+        _, columns, row_count = self.sheets[index]
+        self.column_list.clear()
+        for column in columns:
+            item = QListWidgetItem(str(column))
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Checked)
+            self.column_list.addItem(item)
+        self.filter_column_dropdown.clear()
+        self.filter_column_dropdown.addItems(["(no filter)"] + [str(column) for column in columns])
+        self.row_count_label.setText(f"of {row_count:,}" if row_count is not None else "")
+
+    def set_all_checked(self, checked: bool):
+        for row in range(self.column_list.count()):
+            self.column_list.item(row).setCheckState(Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked)
+
+    def accept(self):
+        if not any(self.column_list.item(row).checkState() == Qt.CheckState.Checked
+                   for row in range(self.column_list.count())):
+            QMessageBox.warning(self, "Error", "Please select at least one column.")
+            return
+        super().accept()
+
+    def get_projection(self) -> Dict:
+        sheet_name, columns, _ = self.sheets[self.sheet_dropdown.currentIndex()]
+        projection = {"sheet": sheet_name, "first_row": self.first_row_input.value() - 1}
+        selected = [column for row, column in enumerate(columns)
+                    if self.column_list.item(row).checkState() == Qt.CheckState.Checked]
+        if len(selected) < len(columns):
+            projection["columns"] = selected
+        if self.rows_input.value():
+            projection["rows"] = self.rows_input.value()
+        if self.filter_column_dropdown.currentIndex() > 0:
+            projection["filter"] = {"column": columns[self.filter_column_dropdown.currentIndex() - 1],
+                                    "text": self.filter_text_input.text(),
+                                    "match_case": self.match_case_checkbox.isChecked(),
+                                    "whole_word": self.whole_word_checkbox.isChecked(),
+                                    "starts_with": self.starts_with_checkbox.isChecked()}
+        return projection
+
+
 class MergeDialog(QDialog):
     """
     A dialog for merging tables in the Spreadsheet Application.
@@ -364,18 +1076,19 @@ class MergeDialog(QDialog):
 
     Functions:
     - __init__: Initializes the MergeDialog with the necessary components and layout.
-    - create_table_view: Creates a table view widget for displaying a preview of the selected table.
-    - update_table1_view: Updates the table view for the first selected table.
-    - update_table2_view: Updates the table view for the second selected table.
-    - update_table_view: Updates the table view with the given table revision data.
+    - update_table1_view: Shows the preview of the first selected table.
+    - update_table2_view: Shows the preview of the second selected table.
     - update_selected_column: Updates the selected column when the user selects a column in the table views.
+    - update_join_preview: Shows the estimated size and the first rows of the merge result.
     - show_join_info: Displays information about different join types in a scrollable dialog.
     - accept: Performs the merge operation when the user accepts the dialog.
     """
 
-    def __init__(self, tables: Dict[str, 'TableRevision'], selected_table: str, parent: Optional[QWidget] = None):
+    def __init__(self, tables: Dict[str, TableRevision], selected_table: str, parent: Optional[QWidget] = None):
         super().__init__(parent)
         self.merged_data = None
+        # (left key index, right key index, join sizes) of the last preview, reused when only the join type changes
+        self.join_sizes = None
         self.setWindowTitle("Merge Tables")
         self.setWindowIcon(QIcon(resource_path(os.path.join("assets", "images", "crm-icon-high-seas.png"))))
         self.setGeometry(100, 100, 800, 500)
@@ -409,7 +1122,10 @@ class MergeDialog(QDialog):
 
         # Table Views
         table_layout = QVBoxLayout()
-        self.table1_view = self.create_table_view(tables[selected_table])
+        self.table1_view = PreviewTableView()
+        self.table1_view.set_table(tables[selected_table])
+        self.table1_view.setToolTip("Select a column to merge on.")
+        self.table1_view.column_selected.connect(self.update_selected_column)
         table_layout.addWidget(self.table1_view)
         layout.addLayout(table_layout)
 
@@ -425,7 +1141,8 @@ class MergeDialog(QDialog):
 
         # Table Views
         table_layout = QVBoxLayout()
-        self.table2_view = QTableWidget()
+        self.table2_view = PreviewTableView()
+        self.table2_view.column_selected.connect(self.update_selected_column)
         table_layout.addWidget(self.table2_view)
         layout.addLayout(table_layout)
 
@@ -445,6 +1162,14 @@ class MergeDialog(QDialog):
 
         layout.addLayout(join_layout)
 
+        # Join Preview
+        self.join_preview_label = QLabel()
+        self.join_preview_label.setStyleSheet("font-size: 10pt; color: #888;")
+        layout.addWidget(self.join_preview_label)
+        self.join_preview_view = QTableView()
+        self.join_preview_view.setToolTip("The first rows of the merge result.")
+        layout.addWidget(self.join_preview_view)
+
         # Button
         self.merge_button = QPushButton("Merge")
         self.merge_button.setToolTip("Perform the merge operation.")
@@ -455,77 +1180,62 @@ class MergeDialog(QDialog):
 
         self.table1_dropdown.currentTextChanged.connect(self.update_table1_view)
         self.table2_dropdown.currentTextChanged.connect(self.update_table2_view)
+        self.join_dropdown.currentIndexChanged.connect(self.update_join_preview)
 
-    def create_table_view(self, table_revision):
-        data = table_revision.revisions[table_revision.current_revision]
-        table_view = QTableWidget()
-        table_view.setColumnCount(len(data.columns))
-        table_view.setRowCount(3)
-        table_view.setHorizontalHeaderLabels(data.columns)
-        table_view.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
-        table_view.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectColumns)
-        table_view.setToolTip("Select a column to merge on.")
-
-        for i in range(3):
-            for j in range(len(data.columns)):
-                item = QTableWidgetItem(str(data.iloc[i, j]))
-                table_view.setItem(i, j, item)
-
-        table_view.resizeColumnsToContents()
-        table_view.setHorizontalScrollMode(QTableWidget.ScrollMode.ScrollPerPixel)
-        table_view.setVerticalScrollMode(QTableWidget.ScrollMode.ScrollPerPixel)
-
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setWidget(table_view)
-
-        table_view.itemSelectionChanged.connect(self.update_selected_column)
-
-        return scroll_area
+        # Hovering a column header shows the profile of the column
+        self.table1_profile_tooltip = ColumnProfileToolTip(self.table1_view.horizontalHeader(),
+                                                           lambda: self.tables.get(self.table1_dropdown.currentText()))
+        self.table2_profile_tooltip = ColumnProfileToolTip(self.table2_view.horizontalHeader(),
+                                                           lambda: self.tables.get(self.table2_dropdown.currentText()))
+        self.update_join_preview()
 
     def update_table1_view(self, table_name):
-        table_revision = self.tables[table_name]
-        self.update_table_view(self.table1_view, table_revision)
+        self.table1_view.set_table(self.tables[table_name])
 
     def update_table2_view(self, table_name):
-        if table_name:
-            table_revision = self.tables[table_name]
-            self.update_table_view(self.table2_view, table_revision)
-        else:
-            self.table2_view.clear()
-            self.table2_view.setColumnCount(0)
-            self.table2_view.setRowCount(0)
+        self.table2_view.set_table(self.tables[table_name] if table_name else None)
 
-    def update_table_view(self, table_view, table_revision):
-        data = table_revision.revisions[table_revision.current_revision]
-
-        if isinstance(table_view, QScrollArea):
-            table_widget = table_view.widget()
+    def update_selected_column(self, column: int):
+        column = column if column >= 0 else None
+        if self.sender() is self.table1_view:
+            self.selected_column1 = column
         else:
-            table_widget = table_view
-
-        table_widget.setColumnCount(len(data.columns))
-        table_widget.setRowCount(3)
-        table_widget.setHorizontalHeaderLabels(data.columns)
+            self.selected_column2 = column
+        self.update_join_preview()
 
-        for i in range(3):
-            for j in range(len(data.columns)):
-                item = QTableWidgetItem(str(data.iloc[i, j]))
-                table_widget.setItem(i, j, item)
+    def update_join_preview(self):
+        table2_name = self.table2_dropdown.currentText()
+        if self.selected_column1 is None or self.selected_column2 is None or not table2_name:
+            self.join_preview_label.setText("Select a column in each table to preview the merge.")
+            self.join_preview_view.setModel(None)
+            return
 
-        table_widget.resizeColumnsToContents()
-        table_widget.itemSelectionChanged.connect(self.update_selected_column)
+        table1_revision = self.tables[self.table1_dropdown.currentText()]
+        table2_revision = self.tables[table2_name]
+        table1_data = table1_revision.get_data()
+        table2_data = table2_revision.get_data()
+        merge_column1 = table1_data.columns[self.selected_column1]
+        merge_column2 = table2_data.columns[self.selected_column2]
 
-    def update_selected_column(self):
-        sender = self.sender()
-        if sender == self.table1_view.widget():
-            selected_indexes = sender.selectedIndexes()
-            if selected_indexes:
-                self.selected_column1 = selected_indexes[0].column()
-        elif sender == self.table2_view:
-            selected_indexes = sender.selectedIndexes()
-            if selected_indexes:
-                self.selected_column2 = selected_indexes[0].column()
+        # The key indexes are cached by the revisions, so only the first preview of a column hashes it
+        left_index = table1_revision.key_index(merge_column1)
+        right_index = table2_revision.key_index(merge_column2)
+        if self.join_sizes is None or self.join_sizes[:2] != (left_index, right_index):
+            self.join_sizes = (left_index, right_index, engine.join_sizes(left_index, right_index))
+        preview = engine.join_preview(table1_data, table2_data, merge_column1, merge_column2,
+                                      self.join_dropdown.currentText().lower().split(" ")[0],
+                                      left_index, right_index, self.join_sizes[2])
+
+        approximately = "~" if preview["estimated"] else ""
+        self.join_preview_label.setText(
+            f"Result: {approximately}{preview['rows']:,} rows · "
+            f"{approximately}{preview['left_match_rate']:.1%} of table 1 rows match · "
+            f"{approximately}{preview['right_match_rate']:.1%} of table 2 rows match")
+        # Keep a reference, the view does not own its model
+        self.join_preview_model = PreviewModel(preview["preview"], rows=engine.JOIN_PREVIEW_ROWS)
+        self.join_preview_view.setModel(self.join_preview_model)
+        if self.join_preview_model.columnCount() <= MAX_RESIZED_PREVIEW_COLUMNS:
+            self.join_preview_view.resizeColumnsToContents()
 
     def show_join_info(self):
         info_dialog = QDialog(self)
@@ -634,23 +1344,21 @@ class MergeDialog(QDialog):
         table1_revision = self.tables[table1_name]
         table2_revision = self.tables[table2_name]
 
-        table1_data = table1_revision.revisions[table1_revision.current_revision]
-        table2_data = table2_revision.revisions[table2_revision.current_revision]
+        table1_data = table1_revision.get_data()
+        table2_data = table2_revision.get_data()
 
         if self.selected_column1 is None or self.selected_column2 is None:
             QMessageBox.warning(self, "Error", "Please select a column from each table.")
             return
 
-        self.parent().loading_dialog.show()
-
         merge_column1 = table1_data.columns[self.selected_column1]
         merge_column2 = table2_data.columns[self.selected_column2]
 
         join_type = self.join_dropdown.currentText().lower().split(" ")[0]
 
-        self.merged_data = pd.merge(table1_data, table2_data, left_on=merge_column1, right_on=merge_column2,
-                                    how=join_type)
-        self.parent().loading_dialog.hide()
+        # Recorded lazily, the merge runs in the background when the result is stored
+        self.merged_data = engine.PlanNode(table1_data, "merge", {"right": table2_data, "left_on": merge_column1,
+                                                                  "right_on": merge_column2, "how": join_type})
         super().accept()
 
 
@@ -664,16 +1372,14 @@ class AppendDialog(QDialog):
 
     Functions:
     - __init__: Initializes the AppendDialog with the necessary components and layout.
-    - create_table_view: Creates a table view widget for displaying a preview of the selected table.
-    - update_table1_view: Updates the table view for the first selected table.
-    - update_table2_view: Updates the table view for the second selected table.
-    - update_table_view: Updates the table view with the given table revision data.
+    - update_table1_view: Shows the preview of the first selected table.
+    - update_table2_view: Shows the preview of the second selected table.
     - update_selected_column: Updates the selected column when the user selects a column in the table views.
     - show_append_info: Displays information about different append directions in a scrollable dialog.
     - accept: Performs the append operation when the user accepts the dialog.
     """
 
-    def __init__(self, tables: Dict[str, 'TableRevision'], selected_table: str, parent: Optional[QWidget] = None):
+    def __init__(self, tables: Dict[str, TableRevision], selected_table: str, parent: Optional[QWidget] = None):
         super().__init__(parent)
         self.appended_data = None
         self.setWindowTitle("Append Tables")
@@ -709,7 +1415,9 @@ class AppendDialog(QDialog):
 
         # Table Views
         table_layout = QVBoxLayout()
-        self.table1_view = self.create_table_view(tables[selected_table])
+        self.table1_view = PreviewTableView()
+        self.table1_view.set_table(tables[selected_table])
+        self.table1_view.column_selected.connect(self.update_selected_column)
         table_layout.addWidget(self.table1_view)
         layout.addLayout(table_layout)
 
@@ -725,7 +1433,8 @@ class AppendDialog(QDialog):
 
         # Table Views
         table_layout = QVBoxLayout()
-        self.table2_view = QTableWidget()
+        self.table2_view = PreviewTableView()
+        self.table2_view.column_selected.connect(self.update_selected_column)
         table_layout.addWidget(self.table2_view)
         layout.addLayout(table_layout)
 
@@ -756,75 +1465,24 @@ class AppendDialog(QDialog):
         self.table1_dropdown.currentTextChanged.connect(self.update_table1_view)
         self.table2_dropdown.currentTextChanged.connect(self.update_table2_view)
 
-    def create_table_view(self, table_revision):
-        data = table_revision.revisions[table_revision.current_revision]
-        table_view = QTableWidget()
-        table_view.setColumnCount(len(data.columns))
-        table_view.setRowCount(3)
-        table_view.setHorizontalHeaderLabels(data.columns)
-        table_view.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
-        table_view.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectColumns)
-
-        for i in range(3):
-            for j in range(len(data.columns)):
-                item = QTableWidgetItem(str(data.iloc[i, j]))
-                table_view.setItem(i, j, item)
-
-        table_view.resizeColumnsToContents()
-        table_view.setHorizontalScrollMode(QTableWidget.ScrollMode.ScrollPerPixel)
-        table_view.setVerticalScrollMode(QTableWidget.ScrollMode.ScrollPerPixel)
-
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setWidget(table_view)
-
-        table_view.itemSelectionChanged.connect(self.update_selected_column)
-
-        return scroll_area
+        # Hovering a column header shows the profile of the column
+        self.table1_profile_tooltip = ColumnProfileToolTip(self.table1_view.horizontalHeader(),
+                                                           lambda: self.tables.get(self.table1_dropdown.currentText()))
+        self.table2_profile_tooltip = ColumnProfileToolTip(self.table2_view.horizontalHeader(),
+                                                           lambda: self.tables.get(self.table2_dropdown.currentText()))
 
     def update_table1_view(self, table_name):
-        table_revision = self.tables[table_name]
-        self.update_table_view(self.table1_view, table_revision)
+        self.table1_view.set_table(self.tables[table_name])
 
     def update_table2_view(self, table_name):
-        if table_name:
-            table_revision = self.tables[table_name]
-            self.update_table_view(self.table2_view, table_revision)
-        else:
-            self.table2_view.clear()
-            self.table2_view.setColumnCount(0)
-            self.table2_view.setRowCount(0)
-
-    def update_table_view(self, table_view, table_revision):
-        data = table_revision.revisions[table_revision.current_revision]
+        self.table2_view.set_table(self.tables[table_name] if table_name else None)
 
-        if isinstance(table_view, QScrollArea):
-            table_widget = table_view.widget()
+    def update_selected_column(self, column: int):
+        column = column if column >= 0 else None
+        if self.sender() is self.table1_view:
+            self.selected_column1 = column
         else:
-            table_widget = table_view
-
-        table_widget.setColumnCount(len(data.columns))
-        table_widget.setRowCount(3)
-        table_widget.setHorizontalHeaderLabels(data.columns)
-
-        for i in range(3):
-            for j in range(len(data.columns)):
-                item = QTableWidgetItem(str(data.iloc[i, j]))
-                table_widget.setItem(i, j, item)
-
-        table_widget.resizeColumnsToContents()
-        table_widget.itemSelectionChanged.connect(self.update_selected_column)
-
-    def update_selected_column(self):
-        sender = self.sender()
-        if sender == self.table1_view.widget():
-            selected_indexes = sender.selectedIndexes()
-            if selected_indexes:
-                self.selected_column1 = selected_indexes[0].column()
-        elif sender == self.table2_view:
-            selected_indexes = sender.selectedIndexes()
-            if selected_indexes:
-                self.selected_column2 = selected_indexes[0].column()
+            self.selected_column2 = column
 
     def show_append_info(self):
         info_dialog = QDialog(self)
@@ -893,106 +1551,922 @@ class AppendDialog(QDialog):
         table1_revision = self.tables[table1_name]
         table2_revision = self.tables[table2_name]
 
-        table1_data = table1_revision.revisions[table1_revision.current_revision]
-        table2_data = table2_revision.revisions[table2_revision.current_revision]
+        table1_data = table1_revision.get_data()
+        table2_data = table2_revision.get_data()
 
         append_direction = self.direction_dropdown.currentText().lower()
 
-        self.parent().loading_dialog.show()
-        if append_direction == "vertically":
-            self.appended_data = pd.concat([table1_data, table2_data], ignore_index=True)
-        else:
-            self.appended_data = pd.concat([table1_data, table2_data], axis=1)
-        self.parent().loading_dialog.hide()
+        self.appended_data = engine.PlanNode(table1_data, "append",
+                                             {"second": table2_data, "direction": append_direction})
 
         super().accept()
 
 
-class TableRevision:
+class CompareDialog(QDialog):
     """
-    Represents a revision of a table in the Spreadsheet Application.
-
-    The TableRevision class stores the data, revisions, and current revision of a table.
-    It provides methods to add a new revision, undo changes, and redo changes.
+    A dialog for choosing two versions of a table to compare: two revisions of a table, or two tables, and how
+    their rows are aligned.
 
     Functions:
-    - __init__: Initializes the TableRevision with the given data.
-    - add_revision: Adds a new revision to the table.
-    - undo: Undoes the last revision made to the table.
-    - redo: Redoes the last undone revision made to the table.
+    - __init__: Initializes the CompareDialog with the current table selected on both sides.
+    - update_revisions: Lists the revisions of the table selected on one side.
+    - update_alignments: Lists the ways to align rows: by position, by content or on a column both tables have.
+    - get_options: Returns the chosen tables, revisions and alignment.
     """
 
-    def __init__(self, data: pd.DataFrame):
-        self.data = data
-        self.revisions = [data]
-        self.current_revision = 0
-        self.spreadsheet_name = ""
-        self.sheet_name = ""
-        self.extension = ""
-
-    def add_revision(self, data):
-        if len(self.revisions) >= 10:
-            self.revisions.pop(0)
-        self.revisions.append(data)
-        self.current_revision = len(self.revisions) - 1
-
-    def undo(self):
-        if self.current_revision > 0:
-            self.current_revision -= 1
-            self.data = self.revisions[self.current_revision]
-            return 0
-        else:
-            return -1
+    def __init__(self, tables: TableStore, selected_table: str, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.tables = tables
+        self.setWindowTitle("Compare Tables")
 
-    def redo(self):
-        if self.current_revision < len(self.revisions) - 1:
-            self.current_revision += 1
-            self.data = self.revisions[self.current_revision]
-            return 0
-        else:
-            return -1
+        layout = QVBoxLayout()
+
+        header_label = QLabel("Compare Tables")
+        header_label.setStyleSheet("font-size: 18px; font-weight: bold;")
+        layout.addWidget(header_label)
 
+        explanation_label = QLabel("The rows added, removed or modified from the old to the new version are added as "
+                                   "a new table, and shown with the changed cells highlighted.")
+        explanation_label.setWordWrap(True)
+        layout.addWidget(explanation_label)
 
-class SpreadsheetApp(QMainWindow):
+        grid = QGridLayout()
+        self.table_dropdowns, self.revision_dropdowns = [], []
+        for row, label in enumerate(["Old:", "New:"]):
+            table_dropdown = QComboBox()
+            table_dropdown.addItems(list(tables))
+            table_dropdown.setCurrentText(selected_table)
+            revision_dropdown = QComboBox()
+            grid.addWidget(QLabel(label), row, 0)
+            grid.addWidget(table_dropdown, row, 1)
+            grid.addWidget(revision_dropdown, row, 2)
+            self.table_dropdowns.append(table_dropdown)
+            self.revision_dropdowns.append(revision_dropdown)
+            self.update_revisions(row)
+            table_dropdown.currentIndexChanged.connect(lambda index, side=row: self.update_revisions(side))
+        # By default the revision before the current one is compared with the current one
+        old_revision = self.revision_dropdowns[0]
+        old_revision.setCurrentIndex(max(old_revision.currentIndex() - 1, 0))
+
+        grid.addWidget(QLabel("Align rows by:"), 2, 0)
+        self.alignment_dropdown = QComboBox()
+        self.alignment_dropdown.setToolTip("Row position compares the n-th rows. Matching rows pairs up equal rows "
+                                           "wherever they are. A key column pairs up the rows with the same key.")
+        grid.addWidget(self.alignment_dropdown, 2, 1, 1, 2)
+        layout.addLayout(grid)
+        self.update_alignments()
+        for table_dropdown in self.table_dropdowns:
+            table_dropdown.currentIndexChanged.connect(self.update_alignments)
+
+        self.accept_button = QPushButton("Compare")
+        self.accept_button.clicked.connect(self.accept)
+        layout.addWidget(self.accept_button)
+
+        self.setLayout(layout)
+
+    def update_revisions(self, side: int):
+        table_revision = self.tables[self.table_dropdowns[side].currentText()]
+        revision_dropdown = self.revision_dropdowns[side]
+        revision_dropdown.clear()
+        for index in range(len(table_revision.revisions)):
+            label = "Original" if index == 0 else f"Revision {index}"
+            revision_dropdown.addItem(f"{label} (current)" if index == table_revision.current_revision else label)
+        revision_dropdown.setCurrentIndex(table_revision.current_revision)
+
+    def update_alignments(self):
+        alignment = self.alignment_dropdown.currentText()
+        old_columns, new_columns = (self.tables[dropdown.currentText()].data.columns
+                                    for dropdown in self.table_dropdowns)
+        self.alignment_dropdown.clear()
+        self.alignment_dropdown.addItems(["Row position", "Matching rows"])
+        self.alignment_dropdown.addItems([f"Key: {column}" for column in old_columns if column in new_columns])
+        self.alignment_dropdown.setCurrentText(alignment)
+
+    def get_options(self) -> Dict:
+        old_table, new_table = (dropdown.currentText() for dropdown in self.table_dropdowns)
+        old_columns = [column for column in self.tables[old_table].data.columns
+                       if column in self.tables[new_table].data.columns]
+        alignment = self.alignment_dropdown.currentIndex()
+        return {
+            "old": (old_table, self.revision_dropdowns[0].currentIndex()),
+            "new": (new_table, self.revision_dropdowns[1].currentIndex()),
+            "key": old_columns[alignment - 2] if alignment >= 2 else None,
+            "match_rows": alignment == 1,
+        }
+
+
+class DiffModel(QAbstractTableModel):
     """
-    Represents the main window of the Spreadsheet Application. It includes a file list
-    for managing tables, a table view for displaying data, and various tools for data
-    manipulation and visualization.
+    A read-only model of the result of engine.diff_tables: the rows are colored by their change, and the changed
+    cells of modified rows show their old and new values.
+
+    Cells are only formatted when the view paints them, so a diff of millions of rows opens instantly.
 
     Functions:
-    - __init__: Initializes the main window with a layout, headers, file list, table view, and tools.
-    - init_ui: Sets up the user interface components and layouts.
-    - init_menu: Creates the menu bar with file and operations menus.
-    - add_table: Adds a new table to the application from an Excel or CSV file.
-    - populate_table: Populates the table view with data from the selected table.
-    - show_file_context_menu: Displays a context menu for file operations.
-    - rename_table: Renames the selected table.
-    - delete_table: Deletes the selected table.
-    - rollback_table: Rolls back the selected table to its original state.
-    - move_table_up: Moves the selected table up in the file list.
-    - move_table_down: Moves the selected table down in the file list.
-    - rename_column: Renames the selected column in the table view.
-    - show_context_menu: Displays a context menu for table operations.
-    - delete_selected_rows: Deletes the selected rows from the table.
-    - delete_selected_columns: Deletes the selected columns from the table.
-    - insert_row_above: Inserts a new row above the selected row.
-    - insert_row_below: Inserts a new row below the selected row.
-    - insert_column_left: Inserts a new column to the left of the selected column.
-    - insert_column_right: Inserts a new column to the right of the selected column.
-    - show_table: Displays the selected table in the table view.
-    - merge_tables: Opens a dialog to merge two tables.
-    - append_tables: Opens a dialog to append tables.
-    - pivot_table: Performs a pivot operation on the selected table.
-    - undo_revision: Undoes the last revision made to the selected table.
-    - redo_revision: Redoes the last undone revision made to the selected table.
-    - updateButtonStyle: Updates the style of the filter buttons based on their state.
-    - filterTable: Filters the table based on the entered text and selected column.
-    - sort_column: Sorts the selected column in the table view.
+    - __init__: Keeps the diff and the old version of the table, which has the old values of changed cells.
+    - rowCount: Returns the number of changed rows.
+    - columnCount: Returns the number of columns of the diff table.
+    - data: Returns the text, color and tooltip of a cell.
+    - headerData: Returns the column names and row numbers.
     """
 
-    def __init__(self):
+    def __init__(self, diff: Dict, old: pd.DataFrame):
         super().__init__()
-        self.wButton = None
+        self.table = diff["table"]
+        self.old = old
+        self.old_rows = diff["old_rows"]
+        self.changed = diff["changed"]
+        self.change = self.table.iloc[:, 0].to_numpy()
+        self.first_data_column = len(engine.DIFF_COLUMNS)
+        self.old_columns = {position: old.columns.get_loc(column)
+                            for position, column in enumerate(self.table.columns[self.first_data_column:])
+                            if column in old.columns}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.table)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.table.columns)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        data_column = column - self.first_data_column
+        changed = data_column >= 0 and self.changed[row, data_column]
+        if role == Qt.ItemDataRole.DisplayRole:
+            value = str(self.table.iat[row, column])
+            return f"{self.old_value(row, data_column)} → {value}" if changed else value
+        if role == Qt.ItemDataRole.BackgroundRole:
+            return DIFF_COLORS["changed"] if changed else DIFF_COLORS.get(self.change[row])
+        if role == Qt.ItemDataRole.ToolTipRole and changed:
+            return f"Old: {self.old_value(row, data_column)}\nNew: {self.table.iat[row, column]}"
+        return None
+
+    def old_value(self, row: int, data_column: int) -> str:
+        return str(self.old.iat[self.old_rows[row], self.old_columns[data_column]])
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return str(self.table.columns[section])
+        return str(section + 1)
+
+
+class DiffDialog(QDialog):
+    """
+    A window showing the result of engine.diff_tables with the added, removed and modified rows highlighted.
+
+    Functions:
+    - __init__: Shows a summary of the diff and the diff table.
+    """
+
+    def __init__(self, diff: Dict, old: pd.DataFrame, title: str, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Diff: {title}")
+        self.resize(900, 600)
+
+        layout = QVBoxLayout()
+
+        summary = (f"Rows added: {format_count(diff['added'])}, removed: {format_count(diff['removed'])}, "
+                   f"modified: {format_count(diff['modified'])}, unchanged: {format_count(diff['unchanged'])}")
+        if diff["added_columns"]:
+            summary += f"\nColumns added: {', '.join(map(str, diff['added_columns']))}"
+        if diff["removed_columns"]:
+            summary += f"\nColumns removed: {', '.join(map(str, diff['removed_columns']))}"
+        summary_label = QLabel(summary)
+        summary_label.setWordWrap(True)
+        layout.addWidget(summary_label)
+
+        self.diff_model = DiffModel(diff, old)
+        self.diff_view = QTableView()
+        self.diff_view.setModel(self.diff_model)
+        self.diff_view.setHorizontalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.diff_view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        if self.diff_model.columnCount() <= MAX_RESIZED_PREVIEW_COLUMNS:
+            self.diff_view.resizeColumnsToContents()
+        layout.addWidget(self.diff_view)
+
+        self.setLayout(layout)
+
+
+class MemoryInspector(QWidget):
+    """
+    A panel showing the shape and memory footprint of every loaded table and its revisions.
+
+    Stats come from TableRevision.revision_stats, which caches them per revision, so refreshing
+    only measures revisions that were added since the last refresh.
+
+    Functions:
+    - __init__: Initializes the panel with a tree of tables/revisions and a totals label.
+    - refresh: Updates the tree in place from the given tables dictionary, adding and removing only the tables
+      and revisions that changed.
+    - set_texts: Sets the texts of an item that differ from the given ones.
+    """
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+
+        self.tree = QTreeWidget()
+        self.tree.setColumnCount(4)
+        self.tree.setHeaderLabels(["Table / Revision", "Rows", "Columns", "Memory"])
+        self.tree.setToolTip("Deep memory usage of each table and each revision in its undo history.")
+        layout.addWidget(self.tree)
+
+        self.totals_label = QLabel()
+        self.totals_label.setStyleSheet("font-size: 10pt; color: #888;")
+        layout.addWidget(self.totals_label)
+
+        self.refresh_button = QPushButton("Refresh")
+        layout.addWidget(self.refresh_button)
+
+    def refresh(self, tables: Dict[str, TableRevision]):
+        # The items are updated in place rather than rebuilt, so the selection, the expanded tables and the
+        # scroll position stay as they are
+        for position in reversed(range(self.tree.topLevelItemCount())):
+            if self.tree.topLevelItem(position).text(0) not in tables:
+                self.tree.takeTopLevelItem(position)
+        items = {self.tree.topLevelItem(position).text(0): self.tree.topLevelItem(position)
+                 for position in range(self.tree.topLevelItemCount())}
+
+        tables_total = 0
+        for position, (table_name, table_revision) in enumerate(tables.items()):
+            table_item = items.get(table_name)
+            if table_item is None:
+                table_item = QTreeWidgetItem([table_name])
+                self.tree.insertTopLevelItem(position, table_item)
+            current = table_revision.revision_stats()
+            table_memory = table_revision.memory_usage()
+            tables_total += table_memory
+            table_memory_text = format_bytes(table_memory) + (" (memory-mapped)" if table_revision.memory_mapped else "")
+            self.set_texts(table_item, [table_name, format_count(current["rows"]), format_count(current["columns"]),
+                                        table_memory_text])
+
+            revisions = len(table_revision.revisions)
+            while table_item.childCount() > revisions:
+                table_item.removeChild(table_item.child(table_item.childCount() - 1))
+            while table_item.childCount() < revisions:
+                table_item.addChild(QTreeWidgetItem())
+            for index in range(revisions):
+                stats = table_revision.revision_stats(index)
+                label = f"Revision {index}" + (" (current)" if index == table_revision.current_revision else "")
+                if table_revision.is_lazy(index):
+                    label += " (not evaluated)"
+                memory = format_bytes(stats["memory"])
+                if stats["mapped"]:
+                    memory += f" (+{format_bytes(stats['mapped'])} mapped)"
+                self.set_texts(table_item.child(index), [label, format_count(stats["rows"]),
+                                                         format_count(stats["columns"]), memory])
+
+        for col in range(1, 4):
+            self.tree.resizeColumnToContents(col)
+
+        totals = f"Tables: {format_bytes(tables_total)}"
+        rss = process_memory()
+        if rss is not None:
+            totals += f"    Process: {format_bytes(rss)}"
+        self.totals_label.setText(totals)
+
+    @staticmethod
+    def set_texts(item: QTreeWidgetItem, texts: list):
+        for column, text in enumerate(texts):
+            if item.text(column) != text:
+                item.setText(column, text)
+
+
+class ColumnStatsPanel(QWidget):
+    """
+    A panel with the profile of every column of the shown table: type, nulls, distinct values, min/max and the
+    most frequent values.
+
+    Profiles come from TableRevision.column_profile, which caches them per revision.
+
+    Functions:
+    - __init__: Initializes the panel with the statistics table and a label naming the table.
+    - refresh: Shows the profiles of the current revision of a table.
+    """
+
+    HEADERS = ["Column", "Type", "Nulls", "Distinct", "Min", "Max", "Top Values"]
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+
+        self.table_label = QLabel()
+        self.table_label.setStyleSheet("font-size: 10pt; color: #888;")
+        layout.addWidget(self.table_label)
+
+        self.stats_table = QTableWidget()
+        self.stats_table.setColumnCount(len(self.HEADERS))
+        self.stats_table.setHorizontalHeaderLabels(self.HEADERS)
+        self.stats_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.stats_table.setToolTip("~ marks counts estimated from a sample, for very long columns.")
+        layout.addWidget(self.stats_table)
+
+    def refresh(self, table_name: Optional[str], table_revision: Optional[TableRevision]):
+        self.stats_table.setRowCount(0)
+        if table_revision is None:
+            self.table_label.setText("No table shown.")
+            return
+
+        self.table_label.setText(f"{table_name}, revision {table_revision.current_revision}")
+        profiles = table_revision.profile()
+        self.stats_table.setRowCount(len(profiles))
+        for row, (column, profile) in enumerate(profiles.items()):
+            approximate = "~" if profile["estimated"] else ""
+            top_values = ", ".join(f"{format_value(value)} ({approximate}{count})" for value, count in profile["top"])
+            cells = [str(column), profile["dtype"], str(profile["nulls"]), f"{approximate}{profile['distinct']}",
+                     format_value(profile["min"]), format_value(profile["max"]), top_values]
+            for col, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                if col == 0:
+                    item.setToolTip(format_profile(column, profile))
+                self.stats_table.setItem(row, col, item)
+        self.stats_table.resizeColumnsToContents()
+
+
+class SearchPanel(QWidget):
+    """
+    A search box over the text cells of all loaded tables.
+
+    Every table has an engine.SearchIndex of its current revision, built in the background by SearchIndexWorker,
+    so hits are found as the query is typed. Double-clicking a hit shows its cell in the table view.
+
+    Functions:
+    - __init__: Initializes the panel with the search box, the status label and the hit list.
+    - search: Shows the hits of the query in every table whose current revision is indexed.
+    """
+
+    HEADERS = ["Table", "Row", "Column", "Text"]
+    # Table name, row position and column name of a double-clicked hit
+    cell_activated = pyqtSignal(str, int, object)
+
+    def __init__(self, tables: Dict[str, TableRevision], search_indexes: Dict[int, tuple],
+                 parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.tables = tables
+        # By id of the TableRevision: (TableRevision, revision, SearchIndex or None)
+        self.search_indexes = search_indexes
+        layout = QVBoxLayout(self)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Search all tables")
+        self.search_edit.setToolTip("Finds the text cells with words starting with every word of the search, "
+                                    "ignoring case.")
+        self.search_edit.textChanged.connect(self.search)
+        layout.addWidget(self.search_edit)
+
+        self.status_label = QLabel()
+        self.status_label.setStyleSheet("font-size: 10pt; color: #888;")
+        layout.addWidget(self.status_label)
+
+        self.hits_table = QTableWidget()
+        self.hits_table.setColumnCount(len(self.HEADERS))
+        self.hits_table.setHorizontalHeaderLabels(self.HEADERS)
+        self.hits_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.hits_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.hits_table.verticalHeader().hide()
+        self.hits_table.cellDoubleClicked.connect(
+            lambda row, column: self.cell_activated.emit(*self.hits_table.item(row, 0).data(Qt.ItemDataRole.UserRole)))
+        layout.addWidget(self.hits_table)
+
+    def search(self):
+        self.hits_table.setRowCount(0)
+        query = self.search_edit.text()
+        if not query.strip():
+            self.status_label.setText("")
+            return
+
+        start = time.perf_counter()
+        hits, total, pending = [], 0, 0
+        for name, table_revision in self.tables.items():
+            entry = self.search_indexes.get(id(table_revision))
+            if (entry is None or entry[0] is not table_revision
+                    or entry[1] is not table_revision.revisions[table_revision.current_revision]):
+                pending += 1
+                continue
+            if entry[2] is not None:
+                table_hits, table_total = entry[2].search(query, engine.SEARCH_MAX_HITS - len(hits))
+                hits.extend((name,) + hit for hit in table_hits)
+                total += table_total
+        milliseconds = (time.perf_counter() - start) * 1000
+
+        self.hits_table.setRowCount(len(hits))
+        for row, (name, data_row, column, text) in enumerate(hits):
+            # Row numbers as the table view shows them
+            for col, value in enumerate([name, str(data_row + 1), str(column), text]):
+                item = QTableWidgetItem(value)
+                if col == 0:
+                    item.setData(Qt.ItemDataRole.UserRole, (name, data_row, column))
+                self.hits_table.setItem(row, col, item)
+        self.hits_table.resizeColumnsToContents()
+
+        status = f"{total:,} hits in {milliseconds:.1f} ms"
+        if total > len(hits):
+            status += f", showing the first {len(hits):,}"
+        if pending:
+            status += f". {pending} table(s) are still being indexed"
+        self.status_label.setText(status + ".")
+
+
+class PerformanceLogPanel(QWidget):
+    """
+    A panel listing the timed operations recorded by the performance log.
+
+    Each operation expands into its stages (load, parse, merge, populate, ...) with their time, rows in/out
+    and the peak memory of the operation. Selecting an operation shows its cProfile capture, if one was taken.
+
+    Functions:
+    - __init__: Initializes the panel with the operation tree, options and buttons.
+    - add_record: Adds a finished operation to the tree.
+    - reload: Rebuilds the tree from the performance log.
+    - show_profile: Shows the cProfile output of the selected operation.
+    - export_json: Exports the performance log to a JSON file.
+    - clear: Clears the performance log and the tree.
+    """
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+
+        self.tree = QTreeWidget()
+        self.tree.setColumnCount(5)
+        self.tree.setHeaderLabels(["Operation / Stage", "Time (ms)", "Rows In", "Rows Out", "Peak Memory"])
+        self.tree.setToolTip("Operation totals exclude time spent waiting on dialogs.")
+        self.tree.currentItemChanged.connect(self.show_profile)
+        layout.addWidget(self.tree)
+
+        self.profile_text = QPlainTextEdit()
+        self.profile_text.setReadOnly(True)
+        self.profile_text.setPlaceholderText("Enable cProfile capture and select an operation to see its profile.")
+        self.profile_text.setFont(QFont("Courier New", 9))
+        layout.addWidget(self.profile_text)
+
+        options_layout = QHBoxLayout()
+        self.memory_checkbox = QCheckBox("Track peak memory")
+        self.memory_checkbox.setChecked(performance_log.track_memory)
+        self.memory_checkbox.setToolTip("Measure peak memory with tracemalloc. Tracing every allocation slows "
+                                        "operations down several times, so the timings are not comparable.")
+        self.memory_checkbox.toggled.connect(lambda checked: setattr(performance_log, "track_memory", checked))
+        options_layout.addWidget(self.memory_checkbox)
+
+        self.profile_checkbox = QCheckBox("Capture cProfile")
+        self.profile_checkbox.setChecked(performance_log.profile_enabled)
+        self.profile_checkbox.setToolTip("Run each following operation under cProfile.")
+        self.profile_checkbox.toggled.connect(lambda checked: setattr(performance_log, "profile_enabled", checked))
+        options_layout.addWidget(self.profile_checkbox)
+        options_layout.addStretch()
+        layout.addLayout(options_layout)
+
+        button_layout = QHBoxLayout()
+        export_button = QPushButton("Export JSON")
+        export_button.clicked.connect(self.export_json)
+        button_layout.addWidget(export_button)
+        clear_button = QPushButton("Clear")
+        clear_button.clicked.connect(self.clear)
+        button_layout.addWidget(clear_button)
+        layout.addLayout(button_layout)
+
+        self.records = {}
+        self.reload()
+        performance_log.add_listener(self.add_record)
+
+    def add_record(self, record: OperationRecord):
+        peak_memory = format_bytes(record.peak_memory) if record.peak_memory is not None else ""
+        operation_item = QTreeWidgetItem([
+            f"{record.started_at:%H:%M:%S} {record.name}" + (" (failed)" if record.error else ""),
+            f"{record.seconds * 1000:.1f}",
+            "" if record.rows_in is None else str(record.rows_in),
+            "" if record.rows_out is None else str(record.rows_out),
+            peak_memory,
+        ])
+
+        parents = [operation_item]
+        for stage in record.stages:
+            stage_item = QTreeWidgetItem([
+                stage.name,
+                f"{stage.seconds * 1000:.1f}",
+                "" if stage.rows_in is None else str(stage.rows_in),
+                "" if stage.rows_out is None else str(stage.rows_out),
+                "",
+            ])
+            del parents[stage.depth + 1:]
+            parents[-1].addChild(stage_item)
+            parents.append(stage_item)
+
+        self.records[id(operation_item)] = record
+        self.tree.insertTopLevelItem(0, operation_item)
+        for col in range(1, 5):
+            self.tree.resizeColumnToContents(col)
+
+    def reload(self):
+        self.tree.clear()
+        self.records = {}
+        for record in performance_log.records:
+            self.add_record(record)
+
+    def show_profile(self, current, _previous=None):
+        while current is not None and current.parent() is not None:
+            current = current.parent()
+        record = self.records.get(id(current)) if current is not None else None
+        self.profile_text.setPlainText((record.profile or "") if record else "")
+
+    def export_json(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Performance Log", "performance_log.json",
+                                                   "JSON files (*.json)")
+        if file_path:
+            performance_log.export_json(file_path)
+
+    def clear(self):
+        performance_log.clear()
+        self.reload()
+
+
+class QueryConsole(QWidget):
+    """
+    A SQL console over the loaded tables.
+
+    Every table is a relation named like its entry in the file list. The first page of the result is shown
+    right away and further pages are fetched on request, so large results do not have to be loaded to be seen.
+    "Save as Table" fetches the rest of the result and adds it as a new "Query" table.
+
+    Functions:
+    - __init__: Initializes the console with the table list, the query editor, the result preview and buttons.
+    - refresh_tables: Updates the list of relations from the loaded tables.
+    - insert_table_name: Inserts the quoted name of a table at the cursor of the editor.
+    - run_query: Runs the query and shows the first page of its result.
+    - load_more: Fetches and shows the next page of the result.
+    - save_as_table: Fetches the whole result and stores it as a new table.
+    """
+
+    def __init__(self, tables: Dict[str, TableRevision], store_table, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.tables = tables
+        self.store_table = store_table
+        self.result: Optional[engine.QueryResult] = None
+        self.pages = []
+
+        layout = QHBoxLayout(self)
+
+        self.table_list = QListWidget()
+        self.table_list.setToolTip("Double-click a table to insert its name into the query.")
+        self.table_list.itemDoubleClicked.connect(self.insert_table_name)
+        self.table_list.setMaximumWidth(200)
+        layout.addWidget(self.table_list)
+
+        query_layout = QVBoxLayout()
+        self.editor = QPlainTextEdit()
+        self.editor.setFont(QFont("Courier New", 10))
+        self.editor.setPlaceholderText('SELECT Region, SUM(Amount) FROM "sales - Sheet1" GROUP BY Region\n\n'
+                                       'Ctrl+Return runs the query.')
+        QShortcut(QKeySequence("Ctrl+Return"), self.editor, activated=self.run_query)
+        query_layout.addWidget(self.editor)
+
+        button_layout = QHBoxLayout()
+        run_button = QPushButton("Run")
+        run_button.clicked.connect(self.run_query)
+        button_layout.addWidget(run_button)
+        self.more_button = QPushButton("Load More")
+        self.more_button.clicked.connect(self.load_more)
+        button_layout.addWidget(self.more_button)
+        self.save_button = QPushButton("Save as Table")
+        self.save_button.clicked.connect(self.save_as_table)
+        button_layout.addWidget(self.save_button)
+        self.status_label = QLabel(f"Engine: {'DuckDB' if engine.duckdb is not None else 'SQLite'}")
+        button_layout.addWidget(self.status_label)
+        button_layout.addStretch()
+        query_layout.addLayout(button_layout)
+
+        self.preview = QTableWidget()
+        self.preview.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        query_layout.addWidget(self.preview)
+        layout.addLayout(query_layout)
+
+        self.more_button.setEnabled(False)
+        self.save_button.setEnabled(False)
+
+    def showEvent(self, event):
+        self.refresh_tables()
+        super().showEvent(event)
+
+    def refresh_tables(self):
+        self.table_list.clear()
+        for table_name, table_revision in self.tables.items():
+            item = QListWidgetItem(table_name)
+            if not table_revision.is_lazy():
+                data = table_revision.get_data()
+                item.setToolTip("\n".join(f"{column} ({dtype})" for column, dtype in zip(data.columns, data.dtypes)))
+            self.table_list.addItem(item)
+
+    def insert_table_name(self, item):
+        self.editor.insertPlainText('"' + item.text().replace('"', '""') + '"')
+        self.editor.setFocus()
+
+    def run_query(self):
+        sql = self.editor.toPlainText().strip()
+        if not sql:
+            return
+        if self.result is not None:
+            self.result.close()
+            self.result = None
+        self.refresh_tables()
+
+        try:
+            with performance_log.operation("SQL Query"):
+                self.result = engine.QueryResult(sql, self.tables)
+                page = self.result.fetch()
+        except Exception as e:
+            self.status_label.setText("Query failed")
+            QMessageBox.warning(self, "Query Error", str(e))
+            return
+
+        self.pages = [page]
+        self.preview.clear()
+        self.preview.setColumnCount(len(self.result.columns))
+        self.preview.setHorizontalHeaderLabels([str(column) for column in self.result.columns])
+        self.preview.setRowCount(0)
+        self.show_page(page)
+
+    def load_more(self):
+        if self.result is None or self.result.exhausted:
+            return
+        page = self.result.fetch()
+        self.pages.append(page)
+        self.show_page(page)
+
+    def show_page(self, page: pd.DataFrame):
+        start = self.preview.rowCount()
+        self.preview.setRowCount(start + len(page))
+        for i, row in enumerate(page.itertuples(index=False)):
+            for j, value in enumerate(row):
+                self.preview.setItem(start + i, j, QTableWidgetItem(str(value)))
+
+        more = not self.result.exhausted
+        self.status_label.setText(f"{self.result.engine_name}: {self.result.rows_fetched} rows"
+                                  + (" shown, more available" if more else ""))
+        self.more_button.setEnabled(more)
+        self.save_button.setEnabled(bool(self.result.columns))
+
+    def save_as_table(self):
+        if self.result is None:
+            return
+        with performance_log.operation("SQL Query as New"):
+            data = engine.concat_rows(self.pages + [self.result.fetch_all()], self.result.columns)
+            self.result.close()
+            self.result = None
+            self.pages = []
+            self.more_button.setEnabled(False)
+            self.save_button.setEnabled(False)
+            self.status_label.setText(f"Saved {len(data)} rows")
+            self.store_table(data)
+
+
+class EvaluateWorker(QThread):
+    """
+    Evaluates a recorded operation (engine.PlanNode) off the GUI thread, before it is stored or shown.
+
+    The result is kept on the node. done is emitted with the time the evaluation took, failed with the error
+    message.
+    """
+    done = pyqtSignal(float)
+    failed = pyqtSignal(str)
+
+    def __init__(self, node: 'engine.PlanNode', parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        # The stages the engine times while the worker runs, see PerformanceLog.collect
+        self.stages = []
+        self.node = node
+
+    def run(self):
+        with performance_log.collect(self.stages):
+            start = time.perf_counter()
+            try:
+                engine.materialize(self.node)
+            except Exception as e:
+                self.failed.emit(str(e))
+                return
+            self.done.emit(time.perf_counter() - start)
+
+
+class SortWorker(QThread):
+    """
+    Computes the permutation that sorts a table revision off the GUI thread.
+
+    The permutation is cached by the TableRevision, so adding the sorted revision afterwards is instant.
+    done is emitted with the time the sort took, failed with the error message.
+    """
+    done = pyqtSignal(float)
+    failed = pyqtSignal(str)
+
+    def __init__(self, table_revision: TableRevision, by: list, ascending: list, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        # The stages the engine times while the worker runs, see PerformanceLog.collect
+        self.stages = []
+        self.table_revision = table_revision
+        self.by = by
+        self.ascending = ascending
+        self.index = table_revision.current_revision
+
+    def run(self):
+        with performance_log.collect(self.stages):
+            start = time.perf_counter()
+            try:
+                self.table_revision.sort_order(self.by, self.ascending, self.index)
+            except Exception as e:
+                self.failed.emit(str(e))
+                return
+            self.done.emit(time.perf_counter() - start)
+
+
+class ViewTextsWorker(QThread):
+    """
+    Evaluates the current revision of a table and formats the text of all of its cells off the GUI thread, in the
+    order of the view sort, for showing all rows of a huge table. Only creating the items is left to the GUI
+    thread.
+
+    done is emitted with the cell texts by column (see cell_texts) and the time it took, failed with the error
+    message.
+    """
+    done = pyqtSignal(list, float)
+    failed = pyqtSignal(str)
+
+    def __init__(self, table_revision: TableRevision, view_sort: Optional[tuple], parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        # The stages the engine times while the worker runs, see PerformanceLog.collect
+        self.stages = []
+        self.table_revision = table_revision
+        # (column, ascending) or None, see SpreadsheetApp.view_rows
+        self.view_sort = view_sort
+        self.index = table_revision.current_revision
+
+    def run(self):
+        with performance_log.collect(self.stages):
+            start = time.perf_counter()
+            try:
+                data = self.table_revision.get_data(self.index)
+                rows = None
+                if self.view_sort is not None and self.view_sort[0] in data.columns:
+                    column, ascending = self.view_sort
+                    rows = self.table_revision.sort_order([column], [ascending], self.index)
+                texts = cell_texts(data, rows)
+            except Exception as e:
+                self.failed.emit(str(e))
+                return
+            self.done.emit(texts, time.perf_counter() - start)
+
+
+class FindReplaceWorker(QThread):
+    """
+    Finds the matches of a text in tables off the GUI thread, with the cells their replacement changes.
+
+    The revisions searched are the current ones when the worker is created. done is emitted with
+    {table name: (TableRevision, revision, cells, matches)} and the time the search took, failed with the error
+    message. cells are {column: (row positions, values)}, see engine.find_replace. Once interruption is requested
+    the search stops at the next column and neither is emitted.
+    """
+    done = pyqtSignal(dict, float)
+    failed = pyqtSignal(str)
+
+    def __init__(self, scope: Dict[str, tuple], text: str, replacement: str, options: Dict[str, bool],
+                 parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        # The stages the engine times while the worker runs, see PerformanceLog.collect
+        self.stages = []
+        # Table name to (TableRevision, columns to search or None for all columns)
+        self.scope = scope
+        self.text = text
+        self.replacement = replacement
+        # match_case, whole_word, starts_with and regex, see engine.find_pattern
+        self.options = options
+        self.indexes = {name: table_revision.current_revision for name, (table_revision, _) in scope.items()}
+
+    def run(self):
+        with performance_log.collect(self.stages):
+            start = time.perf_counter()
+            results = {}
+            try:
+                for name, (table_revision, columns) in self.scope.items():
+                    if self.isInterruptionRequested():
+                        return
+                    index = self.indexes[name]
+                    cells, matches = engine.find_replace(table_revision.get_data(index), self.text, self.replacement,
+                                                         columns, cancelled=self.isInterruptionRequested,
+                                                         **self.options)
+                    if matches:
+                        results[name] = (table_revision, table_revision.revisions[index], cells, matches)
+            except Exception as e:
+                self.failed.emit(str(e))
+                return
+            if not self.isInterruptionRequested():
+                self.done.emit(results, time.perf_counter() - start)
+
+
+class SearchIndexWorker(QThread):
+    """
+    Builds the engine.SearchIndex of the current revision of tables off the GUI thread, one table after the other.
+
+    indexed is emitted for each table with the TableRevision, the revision and its SearchIndex, or None if the
+    table could not be indexed. A table that got a new revision in the meantime is skipped.
+    """
+    indexed = pyqtSignal(object, object, object)
+
+    def __init__(self, tables: list, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        # (TableRevision, revision index, revision, SearchIndex of an earlier revision or None)
+        self.tables = [(table_revision, table_revision.current_revision,
+                        table_revision.revisions[table_revision.current_revision], previous)
+                       for table_revision, previous in tables]
+
+    def run(self):
+        for table_revision, index, revision, previous in self.tables:
+            if index >= len(table_revision.revisions) or table_revision.revisions[index] is not revision:
+                continue
+            try:
+                search_index = engine.SearchIndex(table_revision.get_data(index), previous)
+            except Exception:
+                search_index = None
+            self.indexed.emit(table_revision, revision, search_index)
+
+
+class SpreadsheetApp(QMainWindow):
+    """
+    Represents the main window of the Spreadsheet Application. It includes a file list
+    for managing tables, a table view for displaying data, and various tools for data
+    manipulation and visualization.
+
+    Functions:
+    - __init__: Initializes the main window with a layout, headers, file list, table view, and tools.
+    - init_ui: Sets up the user interface components and layouts.
+    - init_menu: Creates the menu bar with file and operations menus.
+    - add_table: Adds a new table to the application from an Excel or CSV file, optionally only some of its
+      columns and rows.
+    - load_file: Reads an Excel, CSV or text file into one table per sheet.
+    - populate_table: Populates the table view with data from the selected table.
+    - show_file_context_menu: Displays a context menu for file operations.
+    - rename_table: Renames the selected table.
+    - delete_table: Deletes the selected table.
+    - rollback_table: Rolls back the selected table to its original state.
+    - reload_table: Reloads the source file of a table, adding a revision only if its rows changed.
+    - toggle_memory_map: Memory-maps the selected table, or loads it back into memory.
+    - toggle_watch: Starts or stops adding the rows appended to the source file of the selected table.
+    - unwatch_file: Stops watching a file that no watched table is loaded from.
+    - source_changed: Schedules reading the watched tables of a file that changed.
+    - follow_sources: Appends the new rows of the changed files to their watched tables.
+    - move_table_up: Moves the selected table up in the file list.
+    - move_table_down: Moves the selected table down in the file list.
+    - rename_column: Renames the selected column in the table view.
+    - edit_cell: Buffers a cell edited in the table view in the edit journal of the table.
+    - show_context_menu: Displays a context menu for table operations.
+    - delete_selected_rows: Deletes the selected rows from the table.
+    - delete_selected_columns: Deletes the selected columns from the table.
+    - insert_row_above: Inserts a new row above the selected row.
+    - insert_row_below: Inserts a new row below the selected row.
+    - insert_column_left: Inserts a new column to the left of the selected column.
+    - insert_column_right: Inserts a new column to the right of the selected column.
+    - insert_computed_column / edit_formula: Inserts a column computed from an expression, or changes its expression.
+    - show_table: Displays the selected table in the table view, once its current revision is evaluated.
+    - display_table: Makes a table the shown table and fills the view with it.
+    - merge_tables: Opens a dialog to merge two tables.
+    - append_tables: Opens a dialog to append tables.
+    - pivot_table: Performs a pivot operation on the selected table.
+    - compare_tables: Compares two revisions of a table, or two tables, and shows the rows that changed.
+    - find_replace / apply_replacements: Finds and replaces text in a column, a table or all tables.
+    - store_result: Evaluates an operation result in the background, then stores it as a new revision or as a
+      new table.
+    - result_evaluated / result_failed: Stores the evaluated result, or reports why it could not be evaluated.
+    - add_result: Adds a result as a new revision of a table or as a new table and shows it.
+    - evaluate_revision: Evaluates a lazy current revision in the background before the view shows it.
+    - revision_evaluated / revision_failed: Shows the evaluated revision, or reports why it could not be evaluated.
+    - operation_running: Tells the user if an operation is still evaluated in the background.
+    - undo_revision: Undoes the last revision made to the selected table.
+    - redo_revision: Redoes the last undone revision made to the selected table.
+    - updateButtonStyle: Updates the style of the filter buttons based on their state.
+    - filterTable: Filters the table based on the entered text and selected column.
+    - filter_rows: Hides the rows that do not match the filter and returns the number of visible rows.
+    - sort_column_ascending / sort_column_descending: Sorts by the selected columns, from left to right.
+    - sort_columns: Opens a dialog to sort by several columns, each ascending or descending.
+    - sort_table: Sorts the current table in a background thread.
+    - apply_sort: Adds the sorted revision once the background sort is done.
+    - header_clicked / toggle_view_sort: Sorts the view by a column on Alt+clicks on its header, without a new
+      revision.
+    - reorder_view: Moves the rows of the view into the view order without creating their items again.
+    - view_rows: Returns the data rows the view shows: a sample of huge tables, in the view sort order.
+    - toggle_sampled_view: Switches a huge table between its sample and all of its rows, after a confirmation.
+    - show_all_rows: Fills the view with all rows of a huge table once a ViewTextsWorker formatted them.
+    - data_rows: Maps rows of the view to rows of the data.
+    - apply_view_sort / clear_view_sort: Commits the view sort as a revision, or shows the rows unsorted again.
+    - refresh_memory_info: Updates the memory tooltips in the file list and the memory inspector.
+    - refresh_column_stats: Shows the column profiles of the current table in the Column Statistics panel.
+    - update_search_indexes / store_search_index: Indexes the new revisions of the tables for the search.
+    - jump_to_cell: Shows the table and the cell of a search hit.
+    - closeEvent: Waits for the background workers (indexing, evaluation, formatting rows) before the window closes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.wButton = None
         self.ccButton = None
         self.swButton = None
         self.filterTextEditor = None
@@ -1000,13 +2474,42 @@ class SpreadsheetApp(QMainWindow):
         self.filterRowLayout = None
         self.table_view = None
         self.file_list = None
+        self.memory_inspector = None
+        self.memory_dock = None
+        self.column_stats_panel = None
+        self.column_stats_dock = None
+        self.performance_panel = None
+        self.performance_dock = None
+        self.search_panel = None
+        self.search_dock = None
         self.setWindowTitle("Spreadsheet Application")
         self.setWindowIcon(QIcon(resource_path(os.path.join("assets", "images", "crm-icon-high-seas.png"))))
         self.setGeometry(100, 100, 800, 600)
 
-        self.tables = {}
+        self.tables = TableStore()
         self.pressed_keys = set()
         self.current_showing_table = None
+        # Sort of the view only, as (column, ascending), and the data row shown in each view row
+        self.view_sort: Optional[tuple] = None
+        self.view_order: Optional[np.ndarray] = None
+        # Huge tables the user chose to see all rows of, instead of a sample
+        self.full_view_tables = set()
+        # Tables that follow their source file: rows appended to the file are appended to the table
+        self.watched_tables = set()
+        self.file_watcher = QFileSystemWatcher(self)
+        self.file_watcher.fileChanged.connect(self.source_changed)
+        self.changed_sources = set()
+        self.follow_timer = QTimer(self)
+        self.follow_timer.setSingleShot(True)
+        self.follow_timer.setInterval(FOLLOW_DELAY_MS)
+        self.follow_timer.timeout.connect(self.follow_sources)
+        # The search index of each table, by id of the TableRevision: (TableRevision, revision, SearchIndex)
+        self.search_indexes: Dict[int, tuple] = {}
+        self.search_index_worker: Optional[SearchIndexWorker] = None
+        self.search_index_timer = QTimer(self)
+        self.search_index_timer.setSingleShot(True)
+        self.search_index_timer.setInterval(SEARCH_INDEX_DELAY_MS)
+        self.search_index_timer.timeout.connect(self.update_search_indexes)
 
         self.loading_dialog = LoadingDialog(self)
 
@@ -1070,6 +2573,21 @@ class SpreadsheetApp(QMainWindow):
         table_view_label.setStyleSheet("font-size: 12pt; font-weight: bold;")
         table_view_layout.addWidget(table_view_label)
 
+        # Shown for tables with more than engine.SAMPLE_THRESHOLD_ROWS rows
+        self.sample_bar = QWidget()
+        sample_layout = QHBoxLayout(self.sample_bar)
+        sample_layout.setContentsMargins(0, 0, 0, 0)
+        self.sample_label = QLabel()
+        self.sample_label.setStyleSheet("font-weight: bold; color: #d08000;")
+        self.sample_label.setToolTip("Operations always run on all rows; only the view shows a sample.")
+        sample_layout.addWidget(self.sample_label)
+        sample_layout.addStretch()
+        self.sample_button = QPushButton()
+        self.sample_button.clicked.connect(self.toggle_sampled_view)
+        sample_layout.addWidget(self.sample_button)
+        self.sample_bar.hide()
+        table_view_layout.addWidget(self.sample_bar)
+
         self.table_view = QTableWidget()
         self.table_view.setColumnCount(0)
         self.table_view.setRowCount(0)
@@ -1077,10 +2595,22 @@ class SpreadsheetApp(QMainWindow):
         self.table_view.setHorizontalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
         self.table_view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
         self.table_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.table_view.setToolTip("Double-click a column header to rename it. Right-click for more options.")
+        self.table_view.setToolTip("Alt+click a column header to sort the view, double-click it to rename the column. "
+                                   "Double-click a cell to edit it. Right-click for more options.")
         self.table_view.customContextMenuRequested.connect(self.show_context_menu)
+        self.table_view.itemChanged.connect(self.edit_cell)
         self.table_view.horizontalHeader().setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked)
         self.table_view.horizontalHeader().sectionDoubleClicked.connect(self.rename_column)
+        # A header click sorts the view, unless it turns out to be the first click of a double-click
+        self.view_sort_timer = QTimer(self)
+        self.view_sort_timer.setSingleShot(True)
+        self.view_sort_timer.setInterval(QApplication.doubleClickInterval())
+        self.view_sort_timer.timeout.connect(self.toggle_view_sort)
+        self.view_sort_section = -1
+        self.table_view.horizontalHeader().sectionClicked.connect(self.header_clicked)
+        self.profile_tooltip = ColumnProfileToolTip(self.table_view.horizontalHeader(),
+                                                    lambda: self.tables.get(self.current_showing_table))
+        self.table_view.horizontalHeader().sectionDoubleClicked.connect(lambda _: self.view_sort_timer.stop())
         table_view_layout.addWidget(self.table_view)
         file_table_layout.addLayout(table_view_layout)
 
@@ -1133,6 +2663,56 @@ class SpreadsheetApp(QMainWindow):
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
 
+        # Memory Inspector
+        self.memory_inspector = MemoryInspector()
+        self.memory_inspector.refresh_button.clicked.connect(self.refresh_memory_info)
+        self.memory_dock = QDockWidget("Memory Inspector", self)
+        self.memory_dock.setWidget(self.memory_inspector)
+        self.memory_dock.visibilityChanged.connect(lambda visible: visible and self.refresh_memory_info())
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.memory_dock)
+        self.memory_dock.hide()
+
+        # Column Statistics
+        self.column_stats_panel = ColumnStatsPanel()
+        self.column_stats_dock = QDockWidget("Column Statistics", self)
+        self.column_stats_dock.setWidget(self.column_stats_panel)
+        self.column_stats_dock.visibilityChanged.connect(lambda visible: visible and self.refresh_column_stats())
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.column_stats_dock)
+        self.column_stats_dock.hide()
+
+        # Keep the process total live while the inspector is open; table stats are cached per revision
+        self.memory_timer = QTimer(self)
+        self.memory_timer.setInterval(2000)
+        self.memory_timer.timeout.connect(lambda: self.memory_dock.isVisible() and self.refresh_memory_info())
+        self.memory_timer.start()
+
+        # Performance Log
+        self.performance_panel = PerformanceLogPanel()
+        self.performance_dock = QDockWidget("Performance Log", self)
+        self.performance_dock.setWidget(self.performance_panel)
+        self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.performance_dock)
+        self.performance_dock.hide()
+
+        # SQL Console
+        self.query_console = QueryConsole(self.tables, lambda data: self.store_result(data, None, as_same=False))
+        self.query_dock = QDockWidget("SQL Console", self)
+        self.query_dock.setWidget(self.query_console)
+        self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.query_dock)
+        self.query_dock.hide()
+
+        # Search
+        self.search_panel = SearchPanel(self.tables, self.search_indexes)
+        self.search_panel.cell_activated.connect(self.jump_to_cell)
+        self.search_dock = QDockWidget("Search", self)
+        self.search_dock.setWidget(self.search_panel)
+        self.search_dock.visibilityChanged.connect(lambda visible: visible and self.search_panel.search_edit.setFocus())
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.search_dock)
+        self.search_dock.hide()
+
+        self.sort_worker: Optional[SortWorker] = None
+        self.evaluate_worker: Optional[EvaluateWorker] = None
+        self.view_texts_worker: Optional[ViewTextsWorker] = None
+
         self.init_menu()
 
     def init_menu(self):
@@ -1141,13 +2721,40 @@ class SpreadsheetApp(QMainWindow):
         file_menu = menubar.addMenu("File")
 
         add_table_action = QAction("Add Table", self)
-        add_table_action.triggered.connect(self.add_table)
+        add_table_action.triggered.connect(lambda: self.add_table())
         file_menu.addAction(add_table_action)
 
+        add_table_part_action = QAction("Add Table (Choose Columns and Rows)...", self)
+        add_table_part_action.triggered.connect(lambda: self.add_table(choose_part=True))
+        file_menu.addAction(add_table_part_action)
+
         export_action = QAction("Export Table(s)", self)
         export_action.triggered.connect(self.export_tables)
         file_menu.addAction(export_action)
 
+        file_menu.addSeparator()
+        memory_map_action = QAction("Memory-Map Large Tables", self)
+        memory_map_action.setCheckable(True)
+        memory_map_action.setToolTip(f"Keep tables over {format_bytes(engine.MEMORY_MAP_THRESHOLD_BYTES)} of numeric "
+                                     f"data in memory-mapped files instead of in memory.")
+        memory_map_action.toggled.connect(lambda checked: setattr(
+            engine, "memory_map_threshold", engine.MEMORY_MAP_THRESHOLD_BYTES if checked else None))
+        file_menu.addAction(memory_map_action)
+
+        csv_reader_menu = QMenu("CSV Reader", self)
+        csv_reader_group = QActionGroup(self)
+        for reader, label in engine.CSV_READER_NAMES.items():
+            csv_reader_action = QAction(label, self, checkable=True)
+            csv_reader_action.setChecked(reader == engine.csv_reader)
+            if reader in engine.available_csv_readers():
+                csv_reader_action.triggered.connect(lambda checked, name=reader: engine.set_csv_reader(name))
+            else:
+                csv_reader_action.setEnabled(False)
+                csv_reader_action.setText(f"{csv_reader_action.text()} (pip install {reader})")
+            csv_reader_group.addAction(csv_reader_action)
+            csv_reader_menu.addAction(csv_reader_action)
+        file_menu.addMenu(csv_reader_menu)
+
         operations_menu = menubar.addMenu("Operations")
 
         merge_menu = QMenu("Merge", self)
@@ -1186,6 +2793,148 @@ class SpreadsheetApp(QMainWindow):
         unpivot_menu.addAction(unpivot_as_new_action)
         operations_menu.addMenu(unpivot_menu)
 
+        sort_action = QAction("Sort...", self)
+        sort_action.triggered.connect(self.sort_columns)
+        operations_menu.addAction(sort_action)
+
+        apply_view_sort_action = QAction("Apply View Sort", self)
+        apply_view_sort_action.triggered.connect(self.apply_view_sort)
+        operations_menu.addAction(apply_view_sort_action)
+
+        compare_action = QAction("Compare Tables...", self)
+        compare_action.triggered.connect(self.compare_tables)
+        operations_menu.addAction(compare_action)
+
+        find_replace_action = QAction("Find and Replace...", self)
+        find_replace_action.setShortcut(QKeySequence("Ctrl+H"))
+        find_replace_action.triggered.connect(self.find_replace)
+        operations_menu.addAction(find_replace_action)
+
+        # Merge, pivot and sort can run on a multi-threaded engine when one is installed
+        backend_menu = QMenu("Execution Backend", self)
+        backend_group = QActionGroup(self)
+        for backend, label in backends.BACKEND_NAMES.items():
+            backend_action = QAction(label, self, checkable=True)
+            backend_action.setChecked(backend == engine.execution_backend)
+            if backend in backends.available_backends():
+                backend_action.triggered.connect(lambda checked, name=backend: engine.set_backend(name))
+            else:
+                backend_action.setEnabled(False)
+                backend_action.setText(f"{backend_action.text()} (pip install {backend})")
+            backend_group.addAction(backend_action)
+            backend_menu.addAction(backend_action)
+        operations_menu.addMenu(backend_menu)
+
+        view_menu = menubar.addMenu("View")
+        view_menu.addAction(self.memory_dock.toggleViewAction())
+        view_menu.addAction(self.column_stats_dock.toggleViewAction())
+        view_menu.addAction(self.performance_dock.toggleViewAction())
+        view_menu.addAction(self.query_dock.toggleViewAction())
+        search_action = self.search_dock.toggleViewAction()
+        search_action.setShortcut(QKeySequence("Ctrl+Shift+F"))
+        view_menu.addAction(search_action)
+
+    def refresh_memory_info(self):
+        """
+        Updates the per-table memory tooltips in the file list and, if it is open, the memory inspector.
+
+        Every change of the tables ends with this update, so it also schedules indexing their new revisions for
+        the search.
+        """
+        # Tooltip changes emit itemChanged, which is connected to rename_table
+        self.file_list.blockSignals(True)
+        for row in range(self.file_list.count()):
+            item = self.file_list.item(row)
+            table_revision = self.tables.get(item.text())
+            if table_revision is None:
+                continue
+            stats = table_revision.revision_stats()
+            tooltip = (f"Rows: {format_count(stats['rows'])}\n"
+                       f"Columns: {format_count(stats['columns'])}\n"
+                       f"Memory (current revision): {format_bytes(stats['memory'])}\n"
+                       f"Memory (all revisions): {format_bytes(table_revision.memory_usage())}")
+            if stats["mapped"]:
+                tooltip += f"\nMemory-mapped (current revision): {format_bytes(stats['mapped'])}"
+            if item.text() in self.watched_tables:
+                tooltip += f"\nWatching {table_revision.source_path}"
+            item.setToolTip(tooltip)
+        self.file_list.blockSignals(False)
+
+        if self.memory_dock.isVisible():
+            self.memory_inspector.refresh(self.tables)
+        self.search_index_timer.start()
+
+    def update_search_indexes(self):
+        """
+        Indexes the tables whose current revision has no search index yet in a background thread, one table after
+        the other. The index of the previous revision is passed along, so unchanged columns are not indexed again.
+        """
+        if self.search_index_worker is not None and self.search_index_worker.isRunning():
+            return  # Started again when the running worker is done
+        tables = {id(table_revision): table_revision for table_revision in self.tables.values()}
+        for key in [key for key in self.search_indexes if key not in tables]:
+            del self.search_indexes[key]
+
+        stale = []
+        for key, table_revision in tables.items():
+            entry = self.search_indexes.get(key)
+            if entry is None or entry[1] is not table_revision.revisions[table_revision.current_revision]:
+                stale.append((table_revision, entry[2] if entry is not None else None))
+        if not stale:
+            return
+        self.search_index_worker = SearchIndexWorker(stale, parent=self)
+        self.search_index_worker.indexed.connect(self.store_search_index)
+        # Tables may have changed while they were indexed
+        self.search_index_worker.finished.connect(self.search_index_timer.start)
+        self.search_index_worker.start()
+
+    def store_search_index(self, table_revision: TableRevision, revision, search_index):
+        self.search_indexes[id(table_revision)] = (table_revision, revision, search_index)
+        if self.search_dock.isVisible() and self.search_panel.search_edit.text().strip():
+            self.search_panel.search()
+
+    def jump_to_cell(self, table_name: str, row: int, column):
+        """
+        Shows a table and selects the cell of a search hit, by the row position in the data and the column name.
+        """
+        items = self.file_list.findItems(table_name, Qt.MatchFlag.MatchExactly)
+        if not items or table_name not in self.tables:
+            return
+        self.show_table(items[0])
+        data = self.tables[table_name].data
+        if column not in data.columns or row >= len(data):
+            return
+        view_row = row
+        if self.view_order is not None:
+            view_rows = np.flatnonzero(self.view_order == row)
+            if not len(view_rows):
+                QMessageBox.information(self, "Info", f"Row {row + 1} of {table_name} is not in the sample shown. "
+                                                      f"Show all rows to see it.")
+                return
+            view_row = int(view_rows[0])
+        column_index = data.columns.get_loc(column)
+        self.table_view.setRowHidden(view_row, False)
+        self.table_view.setCurrentCell(view_row, column_index)
+        self.table_view.scrollToItem(self.table_view.item(view_row, column_index),
+                                     QAbstractItemView.ScrollHint.PositionAtCenter)
+
+    def closeEvent(self, event):
+        # Tables are indexed after every change, the thread has to finish before the window is deleted
+        if self.search_index_worker is not None:
+            self.search_index_worker.wait()
+        if self.view_texts_worker is not None:
+            self.view_texts_worker.wait()
+        if self.evaluate_worker is not None:
+            self.evaluate_worker.wait()
+        super().closeEvent(event)
+
+    def refresh_column_stats(self):
+        if not self.column_stats_dock.isVisible():
+            return
+        table_name = self.file_list.currentItem().text() if self.file_list.currentItem() else None
+        with performance_log.operation("Column Statistics"):
+            self.column_stats_panel.refresh(table_name, self.tables.get(table_name))
+
     def updateButtonStyle(self):
         """
         Updates the style of the Sw and Cc buttons based on their checked state.
@@ -1211,85 +2960,83 @@ class SpreadsheetApp(QMainWindow):
         if column_index == -1:
             return  # Exit if no column is selected
 
-        for row in range(self.table_view.rowCount()):
-            item = self.table_view.item(row, column_index)
-            if item is None:
-                self.table_view.setRowHidden(row, True)
-                continue
-
-            cell_value = item.text()
-
-            # Adjust for case sensitivity based on Cc button
-            if not self.ccButton.isChecked():
-                filter_text = filter_text.lower()
-                cell_value = cell_value.lower()
-
-            # Adjust for "Entire Word" functionality based on W button
-            if self.wButton.isChecked():
-                match = cell_value == filter_text
-            # Adjust for "Starts With" functionality based on Sw button
-            elif self.swButton.isChecked():
-                match = cell_value.startswith(filter_text)
-            else:
-                match = filter_text in cell_value
+        if self.current_showing_table not in self.tables:
+            return
 
-            self.table_view.setRowHidden(row, not match)
+        data = self.tables[self.current_showing_table].get_data()
+        self.filter_rows(filter_text, column_index, data)
 
-    def add_table(self):
-        self.loading_dialog.show()
+    def filter_rows(self, filter_text: str, column_index: int, data: pd.DataFrame) -> int:
+        """
+        Hides the rows of the table view that do not match the filter text and returns the number of visible rows.
+        """
+        mask = engine.filter_mask(data.iloc[:, column_index], filter_text, match_case=self.ccButton.isChecked(),
+                                  whole_word=self.wButton.isChecked(), starts_with=self.swButton.isChecked())
+        visible = 0
+        for row, data_row in enumerate(self.data_rows(range(self.table_view.rowCount()))):
+            self.table_view.setRowHidden(row, not mask[data_row])
+            visible += bool(mask[data_row])
+        return visible
+
+    def add_table(self, choose_part: bool = False):
+        """
+        Loads a file chosen by the user. With choose_part, the user first picks the columns and rows to load in a
+        ProjectionDialog, and only those are read.
+        """
         options = QFileDialog.Option.ReadOnly
         file_path, _ = QFileDialog.getOpenFileName(self, "Add Table", "",
-                                                   "Excel files (*.xlsx *.xls *.xlsm);;CSV files (*.csv);;"
-                                                   "Text files (*.txt)",
+                                                   "Excel files (*.xlsx *.xls *.xlsm);;"
+                                                   f"CSV files (*.csv {compressed_patterns('.csv')});;"
+                                                   f"Text files (*.txt {compressed_patterns('.txt')});;"
+                                                   "Zip archives of CSV files (*.zip)",
                                                    options=options)
-        if file_path:
-            file_name = os.path.basename(file_path)
-            file_name_without_ext, extension = os.path.splitext(file_name)
-            if extension == ".txt":
-                data = pd.read_csv(file_path, sep="\t")
-                sheet_name = "Sheet1"
-            elif extension == ".csv":
-                data = pd.read_csv(file_path)
+        if not file_path:
+            return
+        projection = None
+        if choose_part:
+            dialog = ProjectionDialog(file_path, engine.inspect_file(file_path), parent=self)
+            if not dialog.exec():
+                return
+            projection = dialog.get_projection()
+
+        self.loading_dialog.show()
+        with performance_log.operation("Load Table"):
+            self.load_file(file_path, projection)
+        self.loading_dialog.hide()
+
+    def load_file(self, file_path: str, projection: Optional[Dict] = None):
+        file_name = os.path.basename(file_path)
+        file_name_without_ext, extension, _ = engine.split_extension(file_name)
+        # The size before reading: rows appended while the file is read are read again when the table is watched,
+        # rather than missed
+        source_offset = os.path.getsize(file_path) if engine.followable(file_path, projection) else None
+        sheets = engine.read_file(file_path, projection)
+        for sheet_name, data in sheets:
+            source_sheet = sheet_name
+            # The extensions as in the file name, so compressed tables are exported compressed again
+            spreadsheet_name, table_extension = file_name_without_ext, file_name[len(file_name_without_ext):]
+            if extension == ".zip":
+                # Every file of an archive becomes a table of its own
+                spreadsheet_name = engine.split_extension(sheet_name)[0]
+                table_extension = os.path.basename(sheet_name)[len(spreadsheet_name):]
+                table_name = f"{file_name_without_ext} - {spreadsheet_name}"
                 sheet_name = "Sheet1"
+            elif extension in engine.EXCEL_EXTENSIONS:
+                table_name = f"{file_name_without_ext} - {sheet_name}"
             else:
-                excel_file = pd.ExcelFile(file_path)
-                sheet_names = excel_file.sheet_names
-                for sheet_name in sheet_names:
-                    data = excel_file.parse(sheet_name)
-                    table_name = f"{file_name_without_ext} - {sheet_name}"
-
-                    if table_name in self.tables:
-                        pattern = rf"{table_name}\s*\((\d+)\)"
-                        max_number = 0
-                        for existing_table_name in self.tables:
-                            match = re.match(pattern, existing_table_name)
-                            if match:
-                                number = int(match.group(1))
-                                max_number = max(max_number, number)
-                        # Increment the number for the new table name
-                        if max_number == 0:
-                            table_name = f"{table_name} (1)"
-                        else:
-                            table_name = f"{table_name} ({max_number + 1})"
-
-                    self.tables[table_name] = TableRevision(data)
-                    self.tables[table_name].spreadsheet_name = file_name_without_ext
-                    self.tables[table_name].sheet_name = sheet_name
-                    self.tables[table_name].extension = extension if extension else ".xlsx"
-                    item = QListWidgetItem(table_name)
-                    self.file_list.addItem(item)
-                    self.file_list.setCurrentItem(item)
-                self.show_table(self.file_list.currentItem())
-                self.loading_dialog.hide()
-                return
-            table_name = file_name_without_ext
-            self.tables[table_name] = TableRevision(data)
-            self.tables[table_name].spreadsheet_name = file_name_without_ext
-            self.tables[table_name].sheet_name = sheet_name
-            self.tables[table_name].extension = extension if extension else ".xlsx"
-            self.file_list.addItem(table_name)
+                table_name = file_name_without_ext
+            table_name = self.tables.add_table(table_name, data, spreadsheet_name=spreadsheet_name,
+                                               sheet_name=sheet_name,
+                                               extension=table_extension if table_extension else ".xlsx")
+            table_revision = self.tables[table_name]
+            table_revision.source_path = file_path
+            table_revision.source_sheet = source_sheet
+            table_revision.source_projection = projection
+            table_revision.source_offset = source_offset
+            item = QListWidgetItem(table_name)
+            self.file_list.addItem(item)
+            self.file_list.setCurrentItem(item)
         self.show_table(self.file_list.currentItem())
-        self.loading_dialog.hide()
 
     def export_tables(self):
         if not self.tables:
@@ -1299,18 +3046,58 @@ class SpreadsheetApp(QMainWindow):
         dialog = ExportDialog(self.tables, parent=self)
         dialog.exec()
 
-    def populate_table(self, data):
+    def populate_table(self, data, texts: Optional[list] = None):
+        """
+        Fills the view with the rows of data it shows (see view_rows). texts are the cell texts of those rows by
+        column if they were already formatted, e.g. by a ViewTextsWorker.
+        """
         self.loading_dialog.show()
-        self.table_view.clear()
-        self.table_view.setColumnCount(len(data.columns))
-        self.table_view.setRowCount(len(data))
-        self.table_view.setHorizontalHeaderLabels([f"{col} ({dtype})" for col, dtype in zip(data.columns, data.dtypes)])
-
-        for i in range(len(data)):
-            for j in range(len(data.columns)):
-                item = QTableWidgetItem(str(data.iloc[i, j]))
-                self.table_view.setItem(i, j, item)
-
+        with performance_log.stage("populate", rows_in=len(data)) as stage:
+            # The view may show a sample of the rows, or the rows in another order than the data
+            self.view_order = self.view_rows(data)
+            rows = range(len(data)) if self.view_order is None else self.view_order
+
+            self.table_view.clear()
+            self.table_view.setColumnCount(len(data.columns))
+            self.table_view.setRowCount(len(rows))
+            table_revision = self.tables.get(self.current_showing_table)
+            formulas = table_revision.formulas() if table_revision is not None else {}
+            self.table_view.setHorizontalHeaderLabels([f"{col} ({dtype}, computed)" if col in formulas
+                                                       else f"{col} ({dtype})"
+                                                       for col, dtype in zip(data.columns, data.dtypes)])
+
+            header = self.table_view.horizontalHeader()
+            header.setSortIndicatorShown(self.view_sort is not None)
+            if self.view_sort is not None:
+                column, ascending = self.view_sort
+                header.setSortIndicator(data.columns.get_loc(column), Qt.SortOrder.AscendingOrder if ascending
+                                        else Qt.SortOrder.DescendingOrder)
+            if self.view_order is not None:
+                # Row numbers of the data, so the position of each row in the data stays visible
+                self.table_view.setVerticalHeaderLabels([str(row + 1) for row in self.view_order])
+
+            if len(data) > engine.SAMPLE_THRESHOLD_ROWS:
+                sampled = self.current_showing_table not in self.full_view_tables
+                self.sample_label.setText(f"Sampled: showing {len(rows):,} of {len(data):,} rows" if sampled
+                                          else f"Showing all {len(data):,} rows")
+                self.sample_button.setText("Show All Rows" if sampled else "Show Sample")
+                self.sample_bar.show()
+            else:
+                self.sample_bar.hide()
+
+            with performance_log.stage("create items", rows_in=len(rows)):
+                # Filling the view is not an edit of the cells
+                self.table_view.blockSignals(True)
+                if texts is None:
+                    texts = cell_texts(data, self.view_order)
+                for j, column_texts in enumerate(texts):
+                    for i, text in enumerate(column_texts):
+                        self.table_view.setItem(i, j, QTableWidgetItem(text))
+                self.table_view.blockSignals(False)
+            stage.rows_out = self.table_view.rowCount()
+
+        self.refresh_memory_info()
+        self.refresh_column_stats()
         self.loading_dialog.hide()
 
     def show_table(self, item):
@@ -1318,9 +3105,17 @@ class SpreadsheetApp(QMainWindow):
         table_revision = self.tables[table_name]
         if self.table_view.horizontalHeader().count() > 0 and table_name == self.current_showing_table:
             return  # Table is already displayed, no need to repopulate
-        self.populate_table(table_revision.data)
+        if self.operation_running():
+            return
+        self.evaluate_revision(table_revision, "Show Table", lambda: self.display_table(item))
+
+    def display_table(self, item):
+        table_name = item.text()
+        table_revision = self.tables[table_name]
+        self.view_sort = None
         self.file_list.setCurrentItem(item)
         self.current_showing_table = table_name
+        self.populate_table(table_revision.data)
 
     def show_file_context_menu(self, pos):
         item = self.file_list.itemAt(pos)
@@ -1329,6 +3124,15 @@ class SpreadsheetApp(QMainWindow):
             rename_action = menu.addAction("Rename Table")
             delete_action = menu.addAction("Delete Table")
             rollback_action = menu.addAction("Rollback to Original")
+            reload_action = menu.addAction("Reload from Source")
+            reload_action.setEnabled(bool(self.tables[item.text()].source_path))
+            memory_map_action = menu.addAction("Load into Memory" if self.tables[item.text()].memory_mapped
+                                               else "Memory-Map Table")
+            watch_action = menu.addAction("Stop Watching File" if item.text() in self.watched_tables
+                                          else "Watch File")
+            watch_action.setEnabled(self.tables[item.text()].source_offset is not None)
+            watch_action.setToolTip("Append the rows added to the end of the source file to the table as they "
+                                    "are written. Available for uncompressed CSV and text files.")
             move_up_action = menu.addAction("Move Table Up")
             move_down_action = menu.addAction("Move Table Down")
 
@@ -1340,6 +3144,12 @@ class SpreadsheetApp(QMainWindow):
                 self.delete_table(item)
             elif action == rollback_action:
                 self.rollback_table(item)
+            elif action == reload_action:
+                self.reload_table(item)
+            elif action == memory_map_action:
+                self.toggle_memory_map(item)
+            elif action == watch_action:
+                self.toggle_watch(item)
             elif action == move_up_action:
                 self.move_table_up(item)
             elif action == move_down_action:
@@ -1350,12 +3160,25 @@ class SpreadsheetApp(QMainWindow):
         new_name, ok = QInputDialog.getText(self, "Rename Table", "Enter new table name:", QLineEdit.EchoMode.Normal,
                                             old_name)
         if ok and new_name != old_name:
-            self.tables[new_name] = self.tables.pop(old_name)
+            self.tables.rename(old_name, new_name)
+            if self.current_showing_table == old_name:
+                self.current_showing_table = new_name
+            if old_name in self.full_view_tables:
+                self.full_view_tables.discard(old_name)
+                self.full_view_tables.add(new_name)
+            if old_name in self.watched_tables:
+                self.watched_tables.discard(old_name)
+                self.watched_tables.add(new_name)
             item.setText(new_name)
 
     def delete_table(self, item):
         table_name = item.text()
+        source_path = self.tables[table_name].source_path
         del self.tables[table_name]
+        self.full_view_tables.discard(table_name)
+        if table_name in self.watched_tables:
+            self.watched_tables.discard(table_name)
+            self.unwatch_file(source_path)
 
         current_row = self.file_list.row(item)
         self.file_list.takeItem(current_row)
@@ -1371,14 +3194,123 @@ class SpreadsheetApp(QMainWindow):
         else:
             self.table_view.setColumnCount(0)
             self.table_view.setRowCount(0)
+        self.refresh_memory_info()
 
     def rollback_table(self, item):
         table_name = item.text()
         table_revision = self.tables[table_name]
-        table_revision.current_revision = 0
-        table_revision.data = table_revision.revisions[0]
+        table_revision.rollback()
         self.populate_table(table_revision.data)
 
+    def reload_table(self, item):
+        """
+        Reads the source file of a table again and adds it as a new revision if rows were inserted, deleted or
+        changed, see TableRevision.reload_source. The rows are compared by their hashes.
+        """
+        table_name = item.text()
+        table_revision = self.tables[table_name]
+        self.loading_dialog.show()
+        try:
+            with performance_log.operation("Reload from Source"):
+                diff = table_revision.reload_source()
+        except (OSError, ValueError, KeyError) as e:
+            self.loading_dialog.hide()
+            QMessageBox.warning(self, "Error", f"Could not reload {table_revision.source_path}: {e}")
+            return
+        self.loading_dialog.hide()
+        changes = len(diff["inserted"]) + len(diff["deleted"]) + len(diff["changed_old"])
+        if changes and table_name == self.current_showing_table:
+            self.populate_table(table_revision.data)
+        else:
+            self.refresh_memory_info()
+        if not changes:
+            QMessageBox.information(self, "Reload from Source", f"No rows of {table_revision.source_path} changed.")
+            return
+        QMessageBox.information(self, "Reload from Source",
+                                f"Reloaded {table_revision.source_path}:\n"
+                                f"Rows inserted: {format_count(len(diff['inserted']))}\n"
+                                f"Rows deleted: {format_count(len(diff['deleted']))}\n"
+                                f"Rows changed: {format_count(len(diff['changed_old']))}\n"
+                                f"Rows unchanged: {format_count(diff['unchanged'])}")
+
+    def toggle_memory_map(self, item):
+        """
+        Moves the numeric, boolean and date columns of a table into memory-mapped files, or back into memory.
+        """
+        table_revision = self.tables[item.text()]
+        self.loading_dialog.show()
+        if table_revision.memory_mapped:
+            with performance_log.operation("Load into Memory"):
+                table_revision.load_into_memory()
+        else:
+            with performance_log.operation("Memory-Map Table"):
+                mapped = table_revision.memory_map()
+            if not mapped:
+                QMessageBox.information(self, "Info", "The table has no numeric, boolean or date columns to map. "
+                                                      "Its next revisions will be memory-mapped.")
+        self.loading_dialog.hide()
+        if self.current_showing_table == item.text():
+            # The data is the same, but the view has to read it from the new columns
+            self.populate_table(table_revision.get_data())
+        else:
+            self.refresh_memory_info()
+
+    def toggle_watch(self, item):
+        """
+        Starts or stops following the source file of a table. A followed table gets the rows appended to the file
+        as new revisions; only the new end of the file is read, see TableRevision.follow_source.
+        """
+        table_name = item.text()
+        table_revision = self.tables[table_name]
+        if table_name in self.watched_tables:
+            self.watched_tables.discard(table_name)
+            self.unwatch_file(table_revision.source_path)
+            self.refresh_memory_info()
+            return
+        if not os.path.exists(table_revision.source_path):
+            QMessageBox.warning(self, "Error", f"The file {table_revision.source_path} no longer exists.")
+            return
+        self.watched_tables.add(table_name)
+        if table_revision.source_path not in self.file_watcher.files():
+            self.file_watcher.addPath(table_revision.source_path)
+        # Rows written since the table was loaded
+        self.changed_sources.add(table_revision.source_path)
+        self.follow_timer.start()
+
+    def unwatch_file(self, file_path: str):
+        if not any(self.tables[table_name].source_path == file_path for table_name in self.watched_tables):
+            self.file_watcher.removePath(file_path)
+
+    def source_changed(self, file_path: str):
+        self.changed_sources.add(file_path)
+        self.follow_timer.start()
+
+    def follow_sources(self):
+        changed_sources, self.changed_sources = self.changed_sources, set()
+        for file_path in changed_sources:
+            # Files replaced by renaming another file over them are dropped from the watcher
+            if os.path.exists(file_path) and file_path not in self.file_watcher.files():
+                self.file_watcher.addPath(file_path)
+
+        refresh = False
+        with performance_log.operation("Read New Rows"):
+            for table_name in list(self.watched_tables):
+                table_revision = self.tables[table_name]
+                if table_revision.source_path not in changed_sources or not os.path.exists(table_revision.source_path):
+                    continue
+                try:
+                    added_rows = table_revision.follow_source()
+                except (OSError, ValueError) as e:
+                    self.watched_tables.discard(table_name)
+                    self.unwatch_file(table_revision.source_path)
+                    QMessageBox.warning(self, "Error", f"Stopped watching {table_revision.source_path}: {e}")
+                    continue
+                refresh = refresh or (added_rows > 0 and table_name == self.current_showing_table)
+        if refresh:
+            self.populate_table(self.tables[self.current_showing_table].data)
+        else:
+            self.refresh_memory_info()
+
     def move_table_up(self, item):
         current_row = self.file_list.row(item)
         if current_row > 0:
@@ -1400,17 +3332,34 @@ class SpreadsheetApp(QMainWindow):
     def rename_column(self, column_index):
         table_name = self.file_list.currentItem().text()
         table_revision = self.tables[table_name]
-        data = table_revision.revisions[table_revision.current_revision].copy()
+        data = table_revision.get_data()
         old_name = data.columns[column_index]
-        old_dtype = str(data.dtypes[column_index])
+        old_dtype = str(data.dtypes.iloc[column_index])
         new_name, ok = QInputDialog.getText(self, "Rename Column", "Enter new column name:", QLineEdit.EchoMode.Normal,
                                             old_name)
         if ok and new_name != old_name:
-            data.rename(columns={old_name: new_name}, inplace=True)
-            table_revision.add_revision(data)
-            self.populate_table(data)
+            table_revision.record("rename_column", old_name=old_name, new_name=new_name)
+            self.populate_table(table_revision.get_data())
             self.table_view.horizontalHeaderItem(column_index).setText(f"{new_name} ({old_dtype})")
 
+    def edit_cell(self, item):
+        """
+        Buffers the edited cell in the edit journal of the table. The edits become one revision when the table is
+        read or changed next (see TableRevision.commit_edits), so editing many cells does not copy the table.
+        """
+        table_revision = self.tables.get(self.current_showing_table)
+        if table_revision is None:
+            return
+        row = self.data_rows([item.row()])[0]
+        try:
+            table_revision.edit_cell(row, item.column(), item.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Edit Cell", str(e))
+        # Show the value as it is stored, or the previous value if the text was rejected
+        self.table_view.blockSignals(True)
+        item.setText(str(table_revision.cell(row, item.column())))
+        self.table_view.blockSignals(False)
+
     def show_context_menu(self, pos):
         menu = QMenu(self)
 
@@ -1423,8 +3372,15 @@ class SpreadsheetApp(QMainWindow):
             menu.addAction("Delete Selected Columns", self.delete_selected_columns)
             menu.addAction("Insert Column Left", self.insert_column_left)
             menu.addAction("Insert Column Right", self.insert_column_right)
+            menu.addAction("Insert Computed Column...", self.insert_computed_column)
+            if len(selected_columns) == 1 and self.selected_formula() is not None:
+                menu.addAction("Edit Formula...", self.edit_formula)
             menu.addAction("Sort Column (ascending)", self.sort_column_ascending)
             menu.addAction("Sort Column (descending)", self.sort_column_descending)
+            menu.addAction("Sort...", self.sort_columns)
+            if self.view_sort is not None:
+                menu.addAction("Apply View Sort", self.apply_view_sort)
+                menu.addAction("Clear View Sort", self.clear_view_sort)
         elif selected_rows:
             # One or more rows are selected
             menu.addAction("Delete Selected Rows", self.delete_selected_rows)
@@ -1439,9 +3395,14 @@ class SpreadsheetApp(QMainWindow):
             menu.addAction("Insert Row Below", self.insert_row_below)
             menu.addAction("Insert Column Left", self.insert_column_left)
             menu.addAction("Insert Column Right", self.insert_column_right)
+            menu.addAction("Insert Computed Column...", self.insert_computed_column)
             menu.addSeparator()
             menu.addAction("Sort Column (ascending)", self.sort_column_ascending)
             menu.addAction("Sort Column (descending)", self.sort_column_descending)
+            menu.addAction("Sort...", self.sort_columns)
+            if self.view_sort is not None:
+                menu.addAction("Apply View Sort", self.apply_view_sort)
+                menu.addAction("Clear View Sort", self.clear_view_sort)
 
         menu.exec(self.table_view.mapToGlobal(pos))
 
@@ -1450,46 +3411,37 @@ class SpreadsheetApp(QMainWindow):
         if selected_indexes:
             table_name = self.file_list.currentItem().text()
             table_revision = self.tables[table_name]
-            data = table_revision.revisions[table_revision.current_revision].copy()
-            rows_to_delete = set(index.row() for index in selected_indexes)
-            data.drop(data.index[list(rows_to_delete)], inplace=True)
-            table_revision.add_revision(data)
-            self.populate_table(data)
+            rows_to_delete = set(self.data_rows(index.row() for index in selected_indexes))
+            table_revision.record("delete_rows", positions=sorted(rows_to_delete))
+            self.populate_table(table_revision.get_data())
 
     def delete_selected_columns(self):
         selected_indexes = self.table_view.selectedIndexes()
         if selected_indexes:
             table_name = self.file_list.currentItem().text()
             table_revision = self.tables[table_name]
-            data = table_revision.revisions[table_revision.current_revision].copy()
+            data = table_revision.get_data()
             columns_to_delete = set(data.columns[index.column()] for index in selected_indexes)
-            data.drop(columns=list(columns_to_delete), inplace=True)
-            table_revision.add_revision(data)
-            self.populate_table(data)
+            table_revision.record("delete_columns", columns=list(columns_to_delete))
+            self.populate_table(table_revision.get_data())
 
     def insert_row_above(self):
         selected_indexes = self.table_view.selectedIndexes()
         if selected_indexes:
-            current_row = min(index.row() for index in selected_indexes)
+            current_row = min(self.data_rows(index.row() for index in selected_indexes))
             table_name = self.file_list.currentItem().text()
             table_revision = self.tables[table_name]
-            data = table_revision.revisions[table_revision.current_revision].copy()
-            new_row = pd.DataFrame({column: "" for column in data.columns}, index=[current_row])
-            data = pd.concat([data.iloc[:current_row], new_row, data.iloc[current_row:]], ignore_index=True)
-            table_revision.add_revision(data)
-            self.populate_table(data)
+            table_revision.record("insert_row", position=current_row)
+            self.populate_table(table_revision.get_data())
 
     def insert_row_below(self):
         selected_indexes = self.table_view.selectedIndexes()
         if selected_indexes:
-            current_row = max(index.row() for index in selected_indexes)
+            current_row = max(self.data_rows(index.row() for index in selected_indexes))
             table_name = self.file_list.currentItem().text()
             table_revision = self.tables[table_name]
-            data = table_revision.revisions[table_revision.current_revision].copy()
-            new_row = pd.DataFrame({column: "" for column in data.columns}, index=[current_row + 1])
-            data = pd.concat([data.iloc[:current_row + 1], new_row, data.iloc[current_row + 1:]], ignore_index=True)
-            table_revision.add_revision(data)
-            self.populate_table(data)
+            table_revision.record("insert_row", position=current_row + 1)
+            self.populate_table(table_revision.get_data())
 
     def insert_column_left(self):
         selected_indexes = self.table_view.selectedIndexes()
@@ -1497,11 +3449,9 @@ class SpreadsheetApp(QMainWindow):
             current_column = min(index.column() for index in selected_indexes)
             table_name = self.file_list.currentItem().text()
             table_revision = self.tables[table_name]
-            data = table_revision.revisions[table_revision.current_revision].copy()
             new_column_name = f"New Column {current_column}"
-            data.insert(current_column, new_column_name, "")
-            table_revision.add_revision(data)
-            self.populate_table(data)
+            table_revision.record("insert_column", position=current_column, name=new_column_name)
+            self.populate_table(table_revision.get_data())
 
     def insert_column_right(self):
         selected_indexes = self.table_view.selectedIndexes()
@@ -1509,11 +3459,54 @@ class SpreadsheetApp(QMainWindow):
             current_column = max(index.column() for index in selected_indexes)
             table_name = self.file_list.currentItem().text()
             table_revision = self.tables[table_name]
-            data = table_revision.revisions[table_revision.current_revision].copy()
             new_column_name = f"New Column {current_column + 1}"
-            data.insert(current_column + 1, new_column_name, "")
-            table_revision.add_revision(data)
-            self.populate_table(data)
+            table_revision.record("insert_column", position=current_column + 1, name=new_column_name)
+            self.populate_table(table_revision.get_data())
+
+    def insert_computed_column(self):
+        """
+        Inserts a column computed from an expression over the other columns, right of the selected columns or at
+        the end of the table.
+        """
+        if self.file_list.currentItem() is None:
+            return
+        table_revision = self.tables[self.file_list.currentItem().text()]
+        selected_indexes = self.table_view.selectedIndexes()
+        position = max(index.column() for index in selected_indexes) + 1 if selected_indexes else None
+        dialog = FormulaDialog(table_revision, self.unused_column_name(table_revision, "Computed"), parent=self)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            name, expression = dialog.get_formula()
+            with performance_log.operation("Insert Computed Column"):
+                table_revision.compute_column(name, expression, position)
+                self.populate_table(table_revision.get_data())
+
+    def edit_formula(self):
+        table_revision = self.tables[self.file_list.currentItem().text()]
+        name, expression = self.selected_formula()
+        dialog = FormulaDialog(table_revision, name, expression, parent=self)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            with performance_log.operation("Edit Formula"):
+                # The computed columns that use this one are recalculated with it
+                table_revision.compute_column(*dialog.get_formula())
+                self.populate_table(table_revision.get_data())
+
+    def selected_formula(self):
+        """ Returns the (name, expression) of the selected computed column, or None """
+        selected_indexes = self.table_view.selectedIndexes()
+        if not selected_indexes or self.file_list.currentItem() is None:
+            return None
+        table_revision = self.tables[self.file_list.currentItem().text()]
+        name = table_revision.data.columns[selected_indexes[0].column()]
+        expression = table_revision.formulas().get(name)
+        return None if expression is None else (name, expression)
+
+    @staticmethod
+    def unused_column_name(table_revision: TableRevision, prefix: str) -> str:
+        columns = set(table_revision.data.columns)
+        number = 1
+        while f"{prefix} {number}" in columns:
+            number += 1
+        return f"{prefix} {number}"
 
     def merge_tables(self, as_same=True):
         if len(self.tables) < 2:
@@ -1522,26 +3515,10 @@ class SpreadsheetApp(QMainWindow):
 
         selected_table = self.file_list.currentItem().text()
         dialog = MergeDialog(self.tables, selected_table, parent=self)  # Pass self as the parent
-        result = dialog.exec()
-
-        if result == QDialog.DialogCode.Accepted:
-            merged_data = dialog.merged_data
-            if as_same:
-                table_name = self.file_list.currentItem().text()
-                table_revision = self.tables[table_name]
-                table_revision.add_revision(merged_data)  # Add merged data as a new revision
-                self.populate_table(merged_data)
-                current_item = self.file_list.currentItem()
-                self.file_list.setCurrentItem(current_item)
-                self.show_table(current_item)
-            else:
-                new_table_name = self.generate_new_table_name("Query")
-                self.tables[new_table_name] = TableRevision(merged_data)
-                new_item = QListWidgetItem(new_table_name)
-                self.file_list.addItem(new_item)
-                # Select the new table in the file list and show it
-                self.file_list.setCurrentItem(new_item)
-                self.show_table(new_item)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            table_revision = self.tables[self.file_list.currentItem().text()] if as_same else None
+            self.store_result(dialog.merged_data, table_revision, as_same,
+                              "Merge as Same" if as_same else "Merge as New")
 
     def append_tables(self, as_same=True):
         if len(self.tables) < 2:
@@ -1550,26 +3527,10 @@ class SpreadsheetApp(QMainWindow):
 
         selected_table = self.file_list.currentItem().text()
         dialog = AppendDialog(self.tables, selected_table, parent=self)  # Pass self as the parent
-        result = dialog.exec()
-
-        if result == QDialog.DialogCode.Accepted:
-            appended_data = dialog.appended_data
-            if as_same:
-                table_name = self.file_list.currentItem().text()
-                table_revision = self.tables[table_name]
-                table_revision.add_revision(appended_data)  # Add appended data as a new revision
-                self.populate_table(appended_data)
-                current_item = self.file_list.currentItem()
-                self.file_list.setCurrentItem(current_item)
-                self.show_table(current_item)
-            else:
-                new_table_name = self.generate_new_table_name("Query")
-                self.tables[new_table_name] = TableRevision(appended_data)
-                new_item = QListWidgetItem(new_table_name)
-                self.file_list.addItem(new_item)
-                # Select the new table in the file list and show it
-                self.file_list.setCurrentItem(new_item)
-                self.show_table(new_item)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            table_revision = self.tables[self.file_list.currentItem().text()] if as_same else None
+            self.store_result(dialog.appended_data, table_revision, as_same,
+                              "Append as Same" if as_same else "Append as New")
 
     def pivot_table(self, as_same=True):
         if len(self.tables) == 0:
@@ -1586,9 +3547,9 @@ class SpreadsheetApp(QMainWindow):
 
         selected_table = self.file_list.currentItem().text()
         table_revision = self.tables[selected_table]
-        data = table_revision.revisions[table_revision.current_revision]
+        data = table_revision.get_data()
 
-        dialog = PivotDialog(data, selected_column, parent=self)
+        dialog = PivotDialog(data, selected_column, parent=self, table_revision=table_revision)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             values_column_with_dtype = dialog.get_values_column()
             values_column = values_column_with_dtype.split(" (")[0]  # Extract column name without data type
@@ -1597,33 +3558,184 @@ class SpreadsheetApp(QMainWindow):
                 QMessageBox.warning(self, "Error", "The values column cannot be the same as the selected column.")
                 return
 
-            self.loading_dialog.show()
-            # Perform the pivot operation
-            pivot_data = data.pivot_table(index=data.columns[0], columns=selected_column, values=values_column,
-                                          aggfunc="sum")
-            self.loading_dialog.hide()
+            # Record the pivot operation, it runs in the background when the result is stored
+            pivot_data = engine.PlanNode(data, "pivot", {"columns": selected_column, "values": values_column})
+            self.store_result(pivot_data, table_revision, as_same, "Pivot as Same" if as_same else "Pivot as New")
+
+    def store_result(self, result_data: Union[pd.DataFrame, 'engine.PlanNode'], table_revision: Optional['TableRevision'],
+                     as_same: bool, operation: str = "Store Result"):
+        """
+        Stores the result of an operation as a new revision of the given table, or as a new "Query" table.
+
+        A recorded operation (engine.PlanNode) is evaluated by an EvaluateWorker first, so it does not block the
+        GUI, and is only stored if it can be: a merge on keys of different types, for one, is reported instead of
+        becoming a revision that cannot be read.
+        """
+        if isinstance(result_data, pd.DataFrame):
+            self.add_result(result_data, table_revision, as_same)
+            return
+        if self.operation_running():
+            return
+        self.loading_dialog.show()
+        self.evaluate_worker = EvaluateWorker(result_data, parent=self)
+        self.evaluate_worker.done.connect(
+            lambda seconds: self.result_evaluated(result_data, table_revision, as_same, operation, seconds))
+        self.evaluate_worker.failed.connect(lambda message: self.result_failed(operation, message))
+        self.evaluate_worker.start()
+
+    def result_evaluated(self, result_data: 'engine.PlanNode', table_revision: Optional['TableRevision'],
+                         as_same: bool, operation: str, seconds: float):
+        self.loading_dialog.hide()
+        if as_same and table_revision not in self.tables.values():
+            return  # The table was deleted meanwhile
+        with performance_log.operation(operation):
+            performance_log.record_stage(f"{result_data.op} (background)", seconds, rows_out=len(result_data.result),
+                                         stages=self.evaluate_worker.stages)
+            self.add_result(result_data, table_revision, as_same)
+
+    def result_failed(self, operation: str, message: str):
+        self.loading_dialog.hide()
+        QMessageBox.warning(self, "Error", f"{operation} failed, nothing was changed: {message}")
+
+    def evaluate_revision(self, table_revision: TableRevision, operation: str, then: Callable[[], None]):
+        """
+        Calls then once the current revision of the table is evaluated. A lazy revision is evaluated by an
+        EvaluateWorker, as a long chain of recorded operations over a large table would freeze the GUI.
+        """
+        if not table_revision.is_lazy():
+            then()
+            return
+        node = table_revision.revisions[table_revision.current_revision]
+        self.loading_dialog.show()
+        self.evaluate_worker = EvaluateWorker(node, parent=self)
+        self.evaluate_worker.done.connect(
+            lambda seconds: self.revision_evaluated(table_revision, node, operation, then, seconds))
+        self.evaluate_worker.failed.connect(self.revision_failed)
+        self.evaluate_worker.start()
+
+    def revision_evaluated(self, table_revision: TableRevision, node: 'engine.PlanNode', operation: str,
+                           then: Callable[[], None], seconds: float):
+        self.loading_dialog.hide()
+        current = table_revision.revisions[table_revision.current_revision]
+        if table_revision not in self.tables.values() or current is not node:
+            return  # The table was deleted or changed meanwhile
+        with performance_log.operation(operation):
+            performance_log.record_stage(f"{node.op} (background)", seconds, rows_out=len(node.result),
+                                         stages=self.evaluate_worker.stages)
+            then()
+
+    def revision_failed(self, message: str):
+        self.loading_dialog.hide()
+        QMessageBox.warning(self, "Error", f"The revision could not be evaluated: {message}")
+
+    def operation_running(self) -> bool:
+        """ Returns True, and tells the user, while an EvaluateWorker is running """
+        if self.evaluate_worker is not None and self.evaluate_worker.isRunning():
+            QMessageBox.information(self, "Info", "An operation is already running.")
+            return True
+        return False
+
+    def add_result(self, result_data: Union[pd.DataFrame, 'engine.PlanNode'],
+                   table_revision: Optional['TableRevision'], as_same: bool):
+        if as_same:
+            table_revision.add_revision(result_data)  # Add result data as a new revision
+            if self.tables.get(self.current_showing_table) is table_revision:
+                # show_table does nothing for the table already on screen
+                self.populate_table(table_revision.get_data())
+            else:
+                self.refresh_memory_info()
+        else:
+            new_table_name = self.tables.add_table(self.generate_new_table_name("Query"), result_data)
+            new_item = QListWidgetItem(new_table_name)
+            self.file_list.addItem(new_item)
+            # Select the new table in the file list and show it, the result is evaluated already
+            self.file_list.setCurrentItem(new_item)
+            self.display_table(new_item)
+
+    def compare_tables(self):
+        """
+        Compares two revisions of a table, or two tables, adds the changed rows as a new "Diff" table and shows
+        them highlighted in a DiffDialog.
+        """
+        if not self.tables:
+            QMessageBox.warning(self, "Error", "No tables available to compare.")
+            return
+        current_item = self.file_list.currentItem()
+        dialog = CompareDialog(self.tables, current_item.text() if current_item else next(iter(self.tables)),
+                               parent=self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        options = dialog.get_options()
+        (old_table, old_index), (new_table, new_index) = options["old"], options["new"]
+        old_revision, new_revision = self.tables[old_table], self.tables[new_table]
+
+        self.loading_dialog.show()
+        with performance_log.operation("Compare Tables"):
+            old, new = old_revision.get_data(old_index), new_revision.get_data(new_index)
+            key = options["key"]
+            try:
+                # The key index of the old revision is cached with the revision, as for join previews
+                diff = engine.diff_tables(old, new, key=key, match_rows=options["match_rows"],
+                                          old_index=old_revision.key_index(key, old_index) if key is not None
+                                          else None)
+            except (TypeError, ValueError) as e:
+                self.loading_dialog.hide()
+                QMessageBox.warning(self, "Error", f"Could not compare the tables: {e}")
+                return
+            new_table_name = self.tables.add_table(self.generate_new_table_name("Diff"), diff["table"])
+            new_item = QListWidgetItem(new_table_name)
+            self.file_list.addItem(new_item)
+        self.loading_dialog.hide()
+        self.refresh_memory_info()
+
+        revisions = [dialog.revision_dropdowns[side].currentText() for side in (0, 1)]
+        title = (f"{old_table}, {revisions[0]} → {revisions[1]}" if old_table == new_table
+                 else f"{old_table} ({revisions[0]}) → {new_table} ({revisions[1]})")
+        self.diff_dialog = DiffDialog(diff, old, title, parent=self)
+        self.diff_dialog.show()
+
+    def find_replace(self):
+        """
+        Opens a FindReplaceDialog for the current table, with the selected column and the options of the filter
+        buttons.
+        """
+        if self.current_showing_table not in self.tables:
+            QMessageBox.warning(self, "Error", "No tables available to search.")
+            return
+        columns = self.tables[self.current_showing_table].data.columns
+        column_index = self.table_view.currentColumn()
+        dialog = FindReplaceDialog(self.tables, self.current_showing_table,
+                                   columns[column_index] if 0 <= column_index < len(columns) else None,
+                                   self.apply_replacements, self.ccButton.isChecked(), self.wButton.isChecked(),
+                                   self.swButton.isChecked(), parent=self)
+        dialog.exec()
 
-            if as_same:
-                table_revision.add_revision(pivot_data)  # Add pivot data as a new revision
-                self.populate_table(pivot_data)
-                current_item = self.file_list.currentItem()
-                self.file_list.setCurrentItem(current_item)
-                self.show_table(current_item)
+    def apply_replacements(self, results: Dict) -> tuple:
+        """
+        Adds the cells changed by a find and replace (see FindReplaceWorker) as one revision per table, and
+        returns the number of cells and tables changed and of the tables skipped because their current revision
+        is no longer the one that was searched.
+        """
+        cells = tables = skipped = 0
+        with performance_log.operation("Find and Replace"):
+            for name, (table_revision, revision, changed_cells, _) in results.items():
+                if not changed_cells:
+                    continue
+                if (self.tables.get(name) is not table_revision
+                        or table_revision.revisions[table_revision.current_revision] is not revision):
+                    skipped += 1
+                    continue
+                table_revision.record("set_cells", cells=changed_cells)
+                cells += sum(len(positions) for positions, _ in changed_cells.values())
+                tables += 1
+            if tables and self.current_showing_table in results:
+                self.populate_table(self.tables[self.current_showing_table].data)
             else:
-                new_table_name = self.generate_new_table_name("Query")
-                self.tables[new_table_name] = TableRevision(pivot_data)
-                new_item = QListWidgetItem(new_table_name)
-                self.file_list.addItem(new_item)
-                self.file_list.setCurrentItem(new_item)
-                self.show_table(new_item)
+                self.refresh_memory_info()
+        return cells, tables, skipped
 
     def generate_new_table_name(self, prefix):
-        i = 1
-        while True:
-            new_table_name = f"{prefix} {i}"
-            if new_table_name not in self.tables:
-                return new_table_name
-            i += 1
+        return self.tables.new_table_name(prefix)
 
     def unpivot_table(self, as_same=True):
         if len(self.tables) == 0:
@@ -1637,7 +3749,7 @@ class SpreadsheetApp(QMainWindow):
 
         selected_table = self.file_list.currentItem().text()
         table_revision = self.tables[selected_table]
-        data = table_revision.revisions[table_revision.current_revision]
+        data = table_revision.get_data()
 
         selected_columns = [index.column() for index in selected_indexes]
         unique_columns = list(set(selected_columns))
@@ -1646,41 +3758,24 @@ class SpreadsheetApp(QMainWindow):
             QMessageBox.warning(self, "Error", "Please select at least two unique columns to unpivot.")
             return
 
-        self.loading_dialog.show()
-
-        column_names = [data.columns[col].split(" (")[0] for col in
-                        unique_columns]  # Extract column names without data types
-
-        # Perform the unpivot operation
-        id_vars = [col for col in data.columns if col not in column_names]
-        unpivoted_data = data.melt(id_vars=id_vars, value_vars=column_names, var_name='Variable', value_name='Value')
+        column_names = [data.columns[col] for col in unique_columns]
 
-        self.loading_dialog.hide()
-
-        if as_same:
-            table_revision.add_revision(unpivoted_data)  # Add unpivoted data as a new revision
-            self.populate_table(unpivoted_data)
-            current_item = self.file_list.currentItem()
-            self.file_list.setCurrentItem(current_item)
-            self.show_table(current_item)
-        else:
-            new_table_name = self.generate_new_table_name("Query")
-            self.tables[new_table_name] = TableRevision(unpivoted_data)
-            new_item = QListWidgetItem(new_table_name)
-            self.file_list.addItem(new_item)
-            self.file_list.setCurrentItem(new_item)
-            self.show_table(new_item)
+        # Record the unpivot operation, it runs in the background when the result is stored
+        unpivoted_data = engine.PlanNode(data, "unpivot", {"value_vars": column_names})
+        self.store_result(unpivoted_data, table_revision, as_same, "Unpivot as Same" if as_same else "Unpivot as New")
 
     def undo_revision(self):
         if len(self.tables) < 1:
             QMessageBox.warning(self, "Error", "Nothing to undo.")
             return
 
+        if self.operation_running():
+            return
         table_name = self.file_list.currentItem().text()
         table_revision = self.tables[table_name]
         status = table_revision.undo()
         if status != -1:
-            self.populate_table(table_revision.data)
+            self.evaluate_revision(table_revision, "Undo", lambda: self.populate_table(table_revision.data))
         else:
             QMessageBox.warning(self, "Error", "Nothing to undo.")
 
@@ -1689,41 +3784,266 @@ class SpreadsheetApp(QMainWindow):
             QMessageBox.warning(self, "Error", "Nothing to redo.")
             return
 
+        if self.operation_running():
+            return
         table_name = self.file_list.currentItem().text()
         table_revision = self.tables[table_name]
         status = table_revision.redo()
         if status != -1:
-            self.populate_table(table_revision.data)
+            self.evaluate_revision(table_revision, "Redo", lambda: self.populate_table(table_revision.data))
         else:
             QMessageBox.warning(self, "Error", "Nothing to redo.")
 
     def sort_column_ascending(self):
+        self.sort_selected_columns(ascending=True)
+
+    def sort_column_descending(self):
+        self.sort_selected_columns(ascending=False)
+
+    def sort_selected_columns(self, ascending: bool):
         selected_indexes = self.table_view.selectedIndexes()
         if selected_indexes:
-            column_index = selected_indexes[0].column()
-            table_name = self.file_list.currentItem().text()
-            table_revision = self.tables[table_name]
-            data = table_revision.revisions[table_revision.current_revision].copy()
-            column_name = data.columns[column_index]
+            data = self.tables[self.file_list.currentItem().text()].get_data()
+            # Several selected columns sort from left to right
+            column_indexes = sorted(set(index.column() for index in selected_indexes))
+            self.sort_table([data.columns[column] for column in column_indexes], [ascending] * len(column_indexes))
+
+    def sort_columns(self):
+        if self.file_list.currentItem() is None:
+            QMessageBox.warning(self, "Error", "No table selected for sorting.")
+            return
+        data = self.tables[self.file_list.currentItem().text()].get_data()
+        column_indexes = sorted(set(index.column() for index in self.table_view.selectedIndexes()))
+        dialog = SortDialog(data.columns, [data.columns[column] for column in column_indexes], parent=self)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            self.sort_table(*dialog.get_sort_keys())
 
-            data.sort_values(by=column_name, ascending=True, inplace=True)
+    def sort_table(self, by: list, ascending: list):
+        """
+        Sorts the current table in a background thread. Only the row permutation is computed there; the sorted
+        revision is added by apply_sort when it is done.
+        """
+        if self.sort_worker is not None and self.sort_worker.isRunning():
+            QMessageBox.information(self, "Info", "A sort is already running.")
+            return
 
-            table_revision.add_revision(data)
-            self.populate_table(data)
+        table_name = self.file_list.currentItem().text()
+        table_revision = self.tables[table_name]
+        self.loading_dialog.show()
+        self.sort_worker = SortWorker(table_revision, by, ascending, parent=self)
+        self.sort_worker.done.connect(
+            lambda seconds: self.apply_sort(table_name, table_revision, by, ascending, seconds))
+        self.sort_worker.failed.connect(self.sort_failed)
+        self.sort_worker.start()
 
-    def sort_column_descending(self):
-        selected_indexes = self.table_view.selectedIndexes()
-        if selected_indexes:
-            column_index = selected_indexes[0].column()
-            table_name = self.file_list.currentItem().text()
-            table_revision = self.tables[table_name]
-            data = table_revision.revisions[table_revision.current_revision].copy()
-            column_name = data.columns[column_index]
+    def apply_sort(self, table_name: str, table_revision: TableRevision, by: list, ascending: list, seconds: float):
+        self.loading_dialog.hide()
+        if table_revision.current_revision != self.sort_worker.index or table_revision.pending_edits():
+            # The order was computed for a revision that is no longer current, sorting would use the wrong rows
+            QMessageBox.information(self, "Sort", "The table changed while it was being sorted, so the sort was "
+                                                  "not applied. Sort it again to sort the current rows.")
+            return
+        rows = len(table_revision.get_data())
+        keys = ", ".join(f"{column} {'ascending' if direction else 'descending'}"
+                         for column, direction in zip(by, ascending))
+        with performance_log.operation(f"Sort ({keys})"):
+            performance_log.record_stage("sort order (background)", seconds, rows_in=rows, rows_out=rows,
+                                         stages=self.sort_worker.stages)
+            table_revision.sort(by, ascending)
+            self.view_sort = None
+            if self.current_showing_table == table_name and self.tables.get(table_name) is table_revision:
+                self.populate_table(table_revision.get_data())
+            else:
+                self.refresh_memory_info()
 
-            data.sort_values(by=column_name, ascending=False, inplace=True)
+    def sort_failed(self, message: str):
+        self.loading_dialog.hide()
+        QMessageBox.warning(self, "Sort Error", f"The table could not be sorted: {message}")
+
+    def header_clicked(self, section: int):
+        # Plain clicks only select the column, the view is sorted by Alt+clicks
+        if not QApplication.keyboardModifiers() & Qt.KeyboardModifier.AltModifier:
+            return
+        self.view_sort_section = section
+        self.view_sort_timer.start()
+
+    def toggle_view_sort(self):
+        """
+        Sorts the view by the clicked column: ascending, then descending, then unsorted again. Only the order
+        of the rows in the view changes; the table gets no new revision until the sort is applied.
+        """
+        if self.current_showing_table not in self.tables or self.view_sort_section < 0:
+            return
+        table_revision = self.tables[self.current_showing_table]
+        # Committing cell edits may recalculate computed columns, whose items then have to be created again
+        repopulate = table_revision.pending_edits() > 0
+        data = table_revision.get_data()
+        column = data.columns[self.view_sort_section]
+        if self.view_sort is None or self.view_sort[0] != column:
+            self.view_sort = (column, True)
+        elif self.view_sort[1]:
+            self.view_sort = (column, False)
+        else:
+            self.view_sort = None
+
+        with performance_log.operation("View Sort" if self.view_sort else "Clear View Sort"):
+            if repopulate:
+                self.populate_table(data)
+            else:
+                self.reorder_view(data)
 
-            table_revision.add_revision(data)
+    def reorder_view(self, data: pd.DataFrame):
+        """
+        Shows the rows of the view in the order of view_rows. The view shows the same rows in another order, so
+        the items are moved rather than created again, and the selection, the current cell and the rows hidden by
+        the filter move with their rows.
+        """
+        old_order = self.view_order if self.view_order is not None else np.arange(self.table_view.rowCount())
+        new_order = self.view_rows(data)
+        rows = new_order if new_order is not None else np.arange(len(data))
+        if len(rows) != len(old_order) or len(data.columns) != self.table_view.columnCount():
             self.populate_table(data)
+            return
+
+        with performance_log.stage("reorder items", rows_in=len(rows)):
+            # The old view row of each new view row, and the new view row of each old one
+            old_sorted = np.argsort(old_order, kind="stable")
+            source = old_sorted[np.searchsorted(old_order[old_sorted], rows)]
+            target = np.empty(len(source), dtype=np.int64)
+            target[source] = np.arange(len(source))
+
+            selection_model = self.table_view.selectionModel()
+            selected_columns = {index.column() for index in selection_model.selectedColumns()}
+            selected_cells = [(index.row(), index.column()) for index in selection_model.selectedIndexes()
+                              if index.column() not in selected_columns]
+            current = self.table_view.currentIndex()
+            hidden = [row for row in range(len(source)) if self.table_view.isRowHidden(row)]
+
+            self.view_order = new_order
+            self.table_view.setUpdatesEnabled(False)
+            self.table_view.blockSignals(True)
+            for column in range(self.table_view.columnCount()):
+                items = [self.table_view.takeItem(row, column) for row in range(len(source))]
+                for row, old_row in enumerate(source):
+                    self.table_view.setItem(row, column, items[old_row])
+            self.table_view.blockSignals(False)
+            self.table_view.setVerticalHeaderLabels([str(row + 1) for row in rows])
+            for row in range(len(source)):
+                self.table_view.setRowHidden(row, False)
+            for row in hidden:
+                self.table_view.setRowHidden(int(target[row]), True)
+
+            model = self.table_view.model()
+            selection = QItemSelection()
+            for column in selected_columns:
+                selection.select(model.index(0, column), model.index(len(rows) - 1, column))
+            for row, column in selected_cells:
+                index = model.index(int(target[row]), column)
+                selection.select(index, index)
+            if current.isValid():
+                selection_model.setCurrentIndex(model.index(int(target[current.row()]), current.column()),
+                                                QItemSelectionModel.SelectionFlag.NoUpdate)
+            selection_model.select(selection, QItemSelectionModel.SelectionFlag.ClearAndSelect)
+
+            header = self.table_view.horizontalHeader()
+            header.setSortIndicatorShown(self.view_sort is not None)
+            if self.view_sort is not None:
+                column, ascending = self.view_sort
+                header.setSortIndicator(data.columns.get_loc(column), Qt.SortOrder.AscendingOrder if ascending
+                                        else Qt.SortOrder.DescendingOrder)
+            self.table_view.setUpdatesEnabled(True)
+
+    def view_rows(self, data: pd.DataFrame) -> Optional[np.ndarray]:
+        """
+        Returns the positions of the data rows the view shows, in view order, or None to show all rows as they
+        are. Tables with more than engine.SAMPLE_THRESHOLD_ROWS rows show a sample unless the user asked for all
+        rows, and the view sort orders the shown rows.
+        """
+        sample = None
+        if len(data) > engine.SAMPLE_THRESHOLD_ROWS and self.current_showing_table not in self.full_view_tables:
+            sample = engine.sample_positions(len(data), engine.SAMPLE_ROWS)
+
+        if self.view_sort is None or self.view_sort[0] not in data.columns:
+            self.view_sort = None
+            return sample
+        column, ascending = self.view_sort
+        if sample is not None:
+            return sample[engine.sort_order(data[column].iloc[sample], ascending)]
+        table_revision = self.tables.get(self.current_showing_table)
+        if table_revision is not None and table_revision.get_data() is data:
+            # Cached per revision, so switching back and forth between columns is free
+            return table_revision.sort_order([column], [ascending])
+        return engine.sort_order(data[column], ascending)
+
+    def toggle_sampled_view(self):
+        """
+        Switches a huge table between its sample and all of its rows. Showing all rows creates an item for every
+        cell, so it is confirmed first, and the revision is evaluated and its cell texts formatted off the GUI
+        thread by a ViewTextsWorker.
+        """
+        table_name = self.current_showing_table
+        if table_name not in self.tables:
+            return
+        table_revision = self.tables[table_name]
+        if table_name in self.full_view_tables:
+            self.full_view_tables.discard(table_name)
+            with performance_log.operation("Show Sample"):
+                self.populate_table(table_revision.get_data())
+            return
+        if self.view_texts_worker is not None and self.view_texts_worker.isRunning():
+            return
+
+        stats = table_revision.revision_stats()
+        size = ("all rows" if stats["rows"] is None
+                else f"all {stats['rows']:,} rows, {stats['rows'] * stats['columns']:,} cells")
+        answer = QMessageBox.question(self, "Show All Rows",
+                                      f"Showing {size} in the table view takes a long time and a lot of memory. "
+                                      f"Show them anyway?")
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+        self.full_view_tables.add(table_name)
+        self.loading_dialog.show()
+        self.view_texts_worker = ViewTextsWorker(table_revision, self.view_sort, parent=self)
+        self.view_texts_worker.done.connect(
+            lambda texts, seconds, worker=self.view_texts_worker: self.show_all_rows(worker, texts, seconds))
+        self.view_texts_worker.failed.connect(lambda message: self.show_all_rows_failed(table_name, message))
+        self.view_texts_worker.start()
+
+    def show_all_rows(self, worker: 'ViewTextsWorker', texts: list, seconds: float):
+        self.loading_dialog.hide()
+        table_revision = worker.table_revision
+        if self.tables.get(self.current_showing_table) is not table_revision:
+            return  # Another table is shown now, it shows all rows when it is shown again
+        with performance_log.operation("Show All Rows"):
+            rows = len(texts[0]) if texts else 0
+            performance_log.record_stage("cell texts (background)", seconds, rows_in=rows, rows_out=rows,
+                                         stages=worker.stages)
+            if table_revision.current_revision != worker.index or self.view_sort != worker.view_sort:
+                # The table or the view sort changed meanwhile, the texts are not the ones of the view
+                texts = None
+            self.populate_table(table_revision.get_data(), texts)
+
+    def show_all_rows_failed(self, table_name: str, message: str):
+        self.loading_dialog.hide()
+        self.full_view_tables.discard(table_name)
+        QMessageBox.warning(self, "Show All Rows", f"The rows could not be shown: {message}")
+
+    def data_rows(self, rows) -> list:
+        if self.view_order is None:
+            return list(rows)
+        return [int(self.view_order[row]) for row in rows]
+
+    def apply_view_sort(self):
+        if self.view_sort is None:
+            return
+        column, ascending = self.view_sort
+        # The order is already cached, so the sorted revision is added right away
+        self.sort_table([column], [ascending])
+
+    def clear_view_sort(self):
+        if self.view_sort is not None and self.current_showing_table in self.tables:
+            self.view_sort = None
+            self.populate_table(self.tables[self.current_showing_table].get_data())
 
 
 def load_stylesheet() -> str:
@@ -1748,6 +4068,14 @@ def load_stylesheet() -> str:
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # The batch runner uses worker processes, also in the frozen build
+
+    if "--pipeline" in sys.argv[1:]:
+        # Headless batch mode, e.g. "app.py --pipeline weekly.json"
+        import pipeline
+
+        sys.exit(pipeline.main(sys.argv[1:]))
+
     app = QApplication(sys.argv)
     app.setFont(QFont("Arial", 10))
     stylesheet = load_stylesheet()
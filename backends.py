@@ -0,0 +1,220 @@
+"""
+Optional multi-threaded backends for the heavy operations of the engine.
+
+pandas runs merge, pivot_table, melt and sort_values on a single core. When Polars or DuckDB is installed, the
+engine can hand the expensive part of these operations to them instead:
+
+- merge: the hash join of the key columns, which gives the row positions of both sides. The result is then
+  assembled by pandas, so the columns, suffixes and dtypes are the same as with pd.merge.
+- sort: the ordering of the key column, which is applied with a single take.
+- pivot: the group-by aggregation. Only the aggregated rows go back to pandas to be unstacked.
+
+append and unpivot always run on pandas: they are plain copies, and converting the whole table to and from a
+columnar engine costs more than the copy itself.
+
+Every function here returns the same result as the pandas implementation in engine.py. Data a backend cannot
+handle (e.g. a column of mixed types) raises, and the engine then falls back to pandas.
+"""
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Backend names and their display names
+BACKEND_NAMES = {"pandas": "pandas", "polars": "Polars", "duckdb": "DuckDB"}
+AGGREGATIONS = ["sum", "mean", "min", "max", "count"]
+
+# pandas join types to Polars join types and the row order pandas produces for them
+POLARS_JOINS = {"inner": "inner", "left": "left", "right": "right", "outer": "full"}
+POLARS_JOIN_ORDER = {"inner": "left", "left": "left", "right": "right", "outer": "left_right"}
+DUCKDB_JOINS = {"inner": "INNER", "left": "LEFT", "right": "RIGHT", "outer": "FULL OUTER"}
+
+
+def available_backends() -> List[str]:
+    backends = ["pandas"]
+    if pl is not None:
+        backends.append("polars")
+    if duckdb is not None:
+        backends.append("duckdb")
+    return backends
+
+
+def get_operation(backend: str, op: str) -> Optional[Callable]:
+    """
+    Returns the backend's implementation of an engine operation, or None if pandas should run it.
+    """
+    return OPERATIONS.get(backend, {}).get(op)
+
+
+def assemble_merge(left: pd.DataFrame, right: pd.DataFrame, left_on: str, right_on: str,
+                   left_positions: np.ndarray, right_positions: np.ndarray) -> pd.DataFrame:
+    """
+    Builds the merged table from the matched row positions of both sides (-1 where a side has no match),
+    with the same columns and suffixes as pd.merge.
+    """
+    left_part = _take_positions(left, left_positions)
+    right_part = _take_positions(right, right_positions)
+
+    if left_on == right_on:
+        # pandas keeps a single key column, filled from the right side for rows only the right side has. The
+        # key is taken from both source columns, as the left part has NaN there and is no longer an int column.
+        missing = left_positions < 0
+        if missing.any():
+            keys = pd.concat([left[left_on], right[right_on]], ignore_index=True)
+            positions = np.where(missing, right_positions + len(left), left_positions)
+            left_part[left_on] = keys.take(positions).reset_index(drop=True)
+        right_part = right_part.drop(columns=[right_on])
+
+    overlap = set(left_part.columns) & set(right_part.columns)
+    left_part = left_part.rename(columns={column: f"{column}_x" for column in overlap})
+    right_part = right_part.rename(columns={column: f"{column}_y" for column in overlap})
+    return pd.concat([left_part, right_part], axis=1, copy=False)
+
+
+def _take_positions(data: pd.DataFrame, positions: np.ndarray) -> pd.DataFrame:
+    data = data.reset_index(drop=True)
+    if (positions >= 0).all():
+        return data.iloc[positions].reset_index(drop=True)
+    # -1 is not in the RangeIndex, so reindex fills those rows with missing values
+    return data.reindex(positions).reset_index(drop=True)
+
+
+def unstack_aggregate(aggregated: pd.DataFrame, index: str, columns: str, values: str) -> pd.DataFrame:
+    """
+    Turns (index, columns, values) aggregate rows into the table pivot_table would return.
+    """
+    return aggregated.set_index([index, columns])[values].unstack(columns)
+
+
+# Polars
+
+def _polars_keys(key: pd.Series, position: str):
+    return pl.DataFrame([pl.from_pandas(key.reset_index(drop=True)).alias("key")]).with_row_index(position)
+
+
+def polars_merge(left: pd.DataFrame, right: pd.DataFrame, left_on: str, right_on: str,
+                 how: str = "inner") -> pd.DataFrame:
+    joined = _polars_keys(left[left_on], "left").join(
+        _polars_keys(right[right_on], "right"), on="key", how=POLARS_JOINS[how], coalesce=True, nulls_equal=True,
+        maintain_order=POLARS_JOIN_ORDER[how])
+    if how == "outer":
+        joined = joined.sort("key", nulls_last=True, maintain_order=True)
+    return assemble_merge(left, right, left_on, right_on,
+                          joined["left"].fill_null(-1).to_numpy().astype(np.int64),
+                          joined["right"].fill_null(-1).to_numpy().astype(np.int64))
+
+
+def polars_pivot(data: pd.DataFrame, columns: str, values: str, index: str, aggfunc: str = "sum") -> pd.DataFrame:
+    if aggfunc not in AGGREGATIONS:
+        raise NotImplementedError(f"Aggregation {aggfunc!r} is not supported by Polars.")
+    frame = pl.from_pandas(data[list(dict.fromkeys([index, columns, values]))])
+    aggregation = getattr(pl.col(values), aggfunc)()
+    if aggfunc == "count":
+        # Polars counts are UInt32, pandas counts int64
+        aggregation = aggregation.cast(pl.Int64)
+    aggregated = (frame.lazy()
+                  .drop_nulls([index, columns])
+                  .group_by([index, columns])
+                  .agg(aggregation)
+                  .collect())
+    return unstack_aggregate(aggregated.to_pandas(), index, columns, values)
+
+
+def polars_sort_order(keys: pd.DataFrame, ascending: List[bool]) -> np.ndarray:
+    names = [f"key{position}" for position in range(keys.shape[1])]
+    frame = pl.DataFrame([pl.from_pandas(keys.iloc[:, position].reset_index(drop=True)).alias(name)
+                          for position, name in enumerate(names)]).with_row_index("position")
+    ordered = frame.sort(names, descending=[not direction for direction in ascending], nulls_last=True,
+                         maintain_order=True)
+    return ordered["position"].to_numpy().astype(np.int64)
+
+
+# DuckDB
+
+def _duckdb_values(column: pd.Series) -> np.ndarray:
+    # Missing values become NULL; DuckDB would otherwise treat NaN as a value larger than any other
+    return column.to_numpy(dtype=object, na_value=None) if column.hasnans else column.to_numpy()
+
+
+def _duckdb_keys(key: pd.Series) -> pd.DataFrame:
+    return pd.DataFrame({"key": _duckdb_values(key), "position": np.arange(len(key))})
+
+
+def duckdb_merge(left: pd.DataFrame, right: pd.DataFrame, left_on: str, right_on: str,
+                 how: str = "inner") -> pd.DataFrame:
+    order = {
+        "inner": "l.position, r.position",
+        "left": "l.position, r.position",
+        "right": "r.position, l.position",
+        "outer": "COALESCE(l.key, r.key) NULLS LAST, l.position NULLS LAST, r.position",
+    }[how]
+    connection = duckdb.connect()
+    try:
+        connection.register("left_keys", _duckdb_keys(left[left_on]))
+        connection.register("right_keys", _duckdb_keys(right[right_on]))
+        positions = connection.execute(
+            f"SELECT COALESCE(l.position, -1) AS left_position, COALESCE(r.position, -1) AS right_position "
+            f"FROM left_keys l {DUCKDB_JOINS[how]} JOIN right_keys r ON l.key IS NOT DISTINCT FROM r.key "
+            f"ORDER BY {order}").fetchnumpy()
+    finally:
+        connection.close()
+    return assemble_merge(left, right, left_on, right_on, np.asarray(positions["left_position"], dtype=np.int64),
+                          np.asarray(positions["right_position"], dtype=np.int64))
+
+
+def duckdb_pivot(data: pd.DataFrame, columns: str, values: str, index: str, aggfunc: str = "sum") -> pd.DataFrame:
+    if aggfunc not in AGGREGATIONS:
+        raise NotImplementedError(f"Aggregation {aggfunc!r} is not supported by DuckDB.")
+    # pandas skips NaN values, and the sum of a group without values is 0
+    value = "NULLIF(v, 'NaN'::DOUBLE)" if pd.api.types.is_float_dtype(data[values]) else "v"
+    aggregate = {"mean": f"avg({value})", "sum": f"COALESCE(sum({value}), 0)"}.get(aggfunc, f"{aggfunc}({value})")
+    frame = pd.DataFrame({"i": _duckdb_values(data[index]), "c": _duckdb_values(data[columns]),
+                          "v": data[values].to_numpy()})
+    connection = duckdb.connect()
+    try:
+        connection.register("data", frame)
+        aggregated = connection.execute(
+            f"SELECT i, c, {aggregate} AS v FROM data WHERE i IS NOT NULL AND c IS NOT NULL GROUP BY i, c").df()
+    finally:
+        connection.close()
+    aggregated.columns = [index, columns, values]
+    return unstack_aggregate(aggregated, index, columns, values)
+
+
+def duckdb_sort_order(keys: pd.DataFrame, ascending: List[bool]) -> np.ndarray:
+    frame = pd.DataFrame({f"key{position}": _duckdb_values(keys.iloc[:, position])
+                          for position in range(keys.shape[1])})
+    frame["position"] = np.arange(len(frame))
+    order = ", ".join(f"key{position} {'ASC' if direction else 'DESC'} NULLS LAST"
+                      for position, direction in enumerate(ascending))
+    connection = duckdb.connect()
+    try:
+        connection.register("keys", frame)
+        positions = connection.execute(f"SELECT position FROM keys ORDER BY {order}, position").fetchnumpy()["position"]
+    finally:
+        connection.close()
+    return np.asarray(positions, dtype=np.int64)
+
+
+OPERATIONS: Dict[str, Dict[str, Callable]] = {
+    "polars": {
+        "merge": polars_merge,
+        "pivot": polars_pivot,
+        "sort_order": polars_sort_order,
+    },
+    "duckdb": {
+        "merge": duckdb_merge,
+        "pivot": duckdb_pivot,
+        "sort_order": duckdb_sort_order,
+    },
+}
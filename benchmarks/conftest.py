@@ -0,0 +1,19 @@
+"""
+Options of the pytest-benchmark suite in test_operations.py: the table sizes and the execution backends each
+benchmark is run with.
+"""
+from run_benchmarks import SIZES
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("spreadsheet benchmarks")
+    group.addoption("--sizes", default="10k", help=f"Comma separated row counts: {', '.join(SIZES)}")
+    group.addoption("--backends", default="pandas", help="Comma separated execution backends to compare")
+
+
+def pytest_generate_tests(metafunc):
+    if "rows" in metafunc.fixturenames:
+        sizes = metafunc.config.getoption("sizes").split(",")
+        metafunc.parametrize("rows", [SIZES[size] if size in SIZES else int(size) for size in sizes], ids=sizes)
+    if "backend" in metafunc.fixturenames:
+        metafunc.parametrize("backend", metafunc.config.getoption("backends").split(","))
@@ -0,0 +1,332 @@
+"""
+Headless benchmarks for the data operations of the Spreadsheet Application.
+
+Each benchmark runs the engine function behind the GUI action named in its description on synthetic tables
+of 10k, 1M or 10M rows. Time is the best of several runs; peak memory is measured in a
+separate run under tracemalloc so it does not distort the timings. The populate and filter benchmarks drive the
+real table view through Qt's offscreen platform, so they only run at sizes a table widget can hold.
+
+With --backends, every benchmark is run once per execution backend (see backends.py) so pandas can be compared
+with Polars and DuckDB on the same data.
+
+Usage:
+    python benchmarks/run_benchmarks.py --sizes 10k,1M
+    python benchmarks/run_benchmarks.py --sizes 10k --json results.json
+    python benchmarks/run_benchmarks.py --sizes 10k --compare results.json
+    python benchmarks/run_benchmarks.py --sizes 1M --backends pandas,polars,duckdb --only merge,pivot,sort_string
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from statistics import median
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import backends
+import engine
+from instrumentation import performance_log
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000, "10M": 10_000_000}
+
+# Largest table the Qt table widget benchmarks are run on
+MAX_WIDGET_ROWS = 10_000
+
+
+def make_table(rows: int, seed: int = 0) -> pd.DataFrame:
+    """ Generate a sales-like table with integer keys, low-cardinality strings, floats and dates """
+    rng = np.random.default_rng(seed)
+    categories = np.array([f"Category {i}" for i in range(50)], dtype=object)
+    regions = np.array(["North", "South", "East", "West", "Central", "Export", "Online", "Retail", "Partner", "Other"],
+                       dtype=object)
+    return pd.DataFrame({
+        "ID": np.arange(rows),
+        "Key": rng.integers(0, max(rows // 10, 1), rows),
+        "Category": categories[rng.integers(0, len(categories), rows)],
+        "Region": regions[rng.integers(0, len(regions), rows)],
+        "Amount": rng.random(rows) * 1000,
+        "Quantity": rng.integers(1, 100, rows),
+        "Date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"),
+    })
+
+
+def make_lookup(rows: int, seed: int = 1) -> pd.DataFrame:
+    """ Generate a lookup table with one row per Key of make_table(rows) """
+    rng = np.random.default_rng(seed)
+    keys = max(rows // 10, 1)
+    return pd.DataFrame({
+        "Key": np.arange(keys),
+        "Name": [f"Customer {i}" for i in range(keys)],
+        "Score": rng.random(keys),
+    })
+
+
+class Benchmark:
+    """
+    A single benchmarked operation.
+
+    setup receives the row count and returns the arguments for run; run returns the number of output rows.
+    """
+
+    def __init__(self, name: str, description: str, setup: Callable[[int], tuple], run: Callable[..., int],
+                 max_rows: Optional[int] = None):
+        self.name = name
+        self.description = description
+        self.setup = setup
+        self.run = run
+        self.max_rows = max_rows
+
+
+def merge_setup(rows):
+    return make_table(rows), make_lookup(rows)
+
+
+def merge_run(left, right):
+    # MergeDialog.accept
+    return len(engine.merge(left, right, "Key", "Key", how="left"))
+
+
+def append_vertical_run(first, second):
+    # AppendDialog.accept, "Vertically"
+    return len(engine.append(first, second, "vertically"))
+
+
+def append_horizontal_run(first, second):
+    # AppendDialog.accept, "Horizontally"
+    return len(engine.append(first, second, "horizontally"))
+
+
+def pivot_run(data):
+    # SpreadsheetApp.pivot_table
+    return len(engine.pivot(data, "Region", "Amount"))
+
+
+def pivot_category_run(data):
+    # SpreadsheetApp.pivot_table with a grouping column as the first column
+    return len(engine.pivot(data, "Region", "Amount", index="Category"))
+
+
+def unpivot_run(data):
+    # SpreadsheetApp.unpivot_table
+    return len(engine.unpivot(data, ["Amount", "Quantity"]))
+
+
+def sort_run(data, column):
+    # SpreadsheetApp.sort_column_ascending / sort_column_descending
+    return len(engine.sort(data, column, ascending=True))
+
+
+def filter_run(data, column, text):
+    # SpreadsheetApp.filterTable
+    return int(engine.filter_mask(data[column], text).sum())
+
+
+# rename, delete a column, sort and delete rows, as recorded by the table view's context menu actions
+CHAIN = [
+    ("rename_column", {"old_name": "Amount", "new_name": "Total"}),
+    ("delete_columns", {"columns": ["Date"]}),
+    ("sort", {"by": "Total", "ascending": False}),
+    ("delete_rows", {"positions": list(range(0, 1000, 10))}),
+    ("sort", {"by": "Quantity", "ascending": True}),
+]
+
+
+def chain_eager_run(data):
+    # Every operation materialized in turn, as before operations were recorded lazily
+    for op, params in CHAIN:
+        data = engine.OPERATIONS[op](data, **params)
+    return len(data)
+
+
+def chain_fused_run(data):
+    # TableRevision.record for each operation, evaluated once when the grid asks for the data
+    table_revision = engine.TableRevision(data)
+    for op, params in CHAIN:
+        table_revision.record(op, **params)
+    return len(table_revision.get_data())
+
+
+def export_run(data, extension):
+    # ExportDialog.export_selected_tables
+    with tempfile.TemporaryDirectory() as directory:
+        engine.write_file(os.path.join(directory, f"export{extension}"), {"Sheet1": data})
+    return len(data)
+
+
+_qt_application = None
+_spreadsheet_app = None
+
+
+def spreadsheet_app():
+    """ Create the main window once, on the offscreen platform, for the widget benchmarks """
+    global _qt_application, _spreadsheet_app
+    if _spreadsheet_app is None:
+        from PyQt6.QtWidgets import QApplication
+        from app import SpreadsheetApp
+
+        _qt_application = QApplication.instance() or QApplication(sys.argv)
+        _spreadsheet_app = SpreadsheetApp()
+    return _spreadsheet_app
+
+
+def populate_setup(rows):
+    return spreadsheet_app(), make_table(rows)
+
+
+def populate_run(window, data):
+    # SpreadsheetApp.populate_table
+    window.populate_table(data)
+    return window.table_view.rowCount()
+
+
+def filter_view_setup(rows):
+    window = spreadsheet_app()
+    data = make_table(rows)
+    window.populate_table(data)
+    return window, "category 1", data
+
+
+def filter_view_run(window, text, data):
+    # SpreadsheetApp.filterTable, including hiding the rows of the table view
+    return window.filter_rows(text, 2, data)
+
+
+BENCHMARKS = [
+    Benchmark("merge", "Left join on an integer key (MergeDialog.accept)", merge_setup, merge_run),
+    Benchmark("append_vertical", "Stack two tables (AppendDialog.accept)",
+              lambda rows: (make_table(rows), make_table(rows, seed=2)), append_vertical_run),
+    Benchmark("append_horizontal", "Side by side (AppendDialog.accept)",
+              lambda rows: (make_table(rows), make_lookup(rows * 10)), append_horizontal_run),
+    Benchmark("pivot", "Pivot on the first (unique) column (pivot_table)",
+              lambda rows: (make_table(rows),), pivot_run),
+    Benchmark("pivot_grouped", "Pivot on a low-cardinality first column (pivot_table)",
+              lambda rows: (make_table(rows),), pivot_category_run),
+    Benchmark("unpivot", "Melt two value columns (unpivot_table)", lambda rows: (make_table(rows),), unpivot_run),
+    Benchmark("sort_numeric", "Sort by a float column (sort_column_ascending)",
+              lambda rows: (make_table(rows), "Amount"), sort_run),
+    Benchmark("sort_string", "Sort by a string column (sort_column_ascending)",
+              lambda rows: (make_table(rows), "Category"), sort_run),
+    Benchmark("filter", "Match a string column against the filter text (filterTable)",
+              lambda rows: (make_table(rows), "Category", "category 1"), filter_run),
+    Benchmark("chain_eager", "Rename, delete, sort twice, one operation at a time",
+              lambda rows: (make_table(rows),), chain_eager_run),
+    Benchmark("chain_fused", "The same chain recorded lazily and evaluated fused (TableRevision.record)",
+              lambda rows: (make_table(rows),), chain_fused_run),
+    Benchmark("export_csv", "Write a CSV file (ExportDialog.export_selected_tables)",
+              lambda rows: (make_table(rows), ".csv"), export_run),
+    Benchmark("export_xlsx", "Write an Excel file (ExportDialog.export_selected_tables)",
+              lambda rows: (make_table(rows), ".xlsx"), export_run, max_rows=100_000),
+    Benchmark("populate", "Fill the table view (populate_table)", populate_setup, populate_run,
+              max_rows=MAX_WIDGET_ROWS),
+    Benchmark("filter_view", "Filter and hide rows of the table view (filterTable)", filter_view_setup,
+              filter_view_run, max_rows=MAX_WIDGET_ROWS),
+]
+
+
+def run_benchmark(benchmark: Benchmark, rows: int, repeat: int, backend: str = "pandas") -> Dict:
+    engine.set_backend(backend)
+    args = benchmark.setup(rows)
+
+    timings = []
+    rows_out = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows_out = benchmark.run(*args)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    benchmark.run(*args)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    best = min(timings)
+    return {
+        "benchmark": benchmark.name,
+        "backend": backend,
+        "rows": rows,
+        "rows_out": rows_out,
+        "best_seconds": best,
+        "median_seconds": median(timings),
+        "rows_per_second": rows / best if best > 0 else float("inf"),
+        "peak_memory": peak_memory,
+    }
+
+
+def compare_results(results: List[Dict], baseline_path: str, threshold: float) -> List[str]:
+    """ Return a message for each result that is slower, or uses more memory, than the baseline by threshold """
+    with open(baseline_path) as file:
+        baseline = {(result["benchmark"], result.get("backend", "pandas"), result["rows"]): result
+                    for result in json.load(file)}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get((result["benchmark"], result["backend"], result["rows"]))
+        if previous is None:
+            continue
+        for key in ("best_seconds", "peak_memory"):
+            if previous[key] and result[key] > previous[key] * (1 + threshold):
+                regressions.append(f"{result['benchmark']} ({result['backend']}) @ {result['rows']} rows: {key} "
+                                   f"{previous[key]:.4g} -> {result[key]:.4g}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    # The benchmark measures peak memory itself; tracemalloc.reset_peak in the performance log would interfere
+    performance_log.track_memory = False
+
+    parser = argparse.ArgumentParser(description="Benchmark the Spreadsheet Application data operations.")
+    parser.add_argument("--sizes", default="10k,1M", help=f"Comma separated row counts: {', '.join(SIZES)}")
+    parser.add_argument("--only", default="", help="Comma separated benchmark names to run (default: all)")
+    parser.add_argument("--backends", default="pandas",
+                        help=f"Comma separated execution backends to compare (available: "
+                             f"{', '.join(backends.available_backends())})")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark (best is reported)")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare against a previous --json file and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown for --compare (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    sizes = [SIZES[size] if size in SIZES else int(size) for size in args.sizes.split(",")]
+    only = set(filter(None, args.only.split(",")))
+    backend_names = args.backends.split(",")
+    unavailable = [name for name in backend_names if name not in backends.available_backends()]
+    if unavailable:
+        parser.error(f"backend(s) not installed: {', '.join(unavailable)}")
+
+    results = []
+    print(f"{'benchmark':<20}{'backend':<9}{'rows':>12}{'rows out':>12}{'best (s)':>12}{'rows/s':>14}{'peak memory':>16}")
+    for rows in sizes:
+        for benchmark in BENCHMARKS:
+            if only and benchmark.name not in only:
+                continue
+            if benchmark.max_rows is not None and rows > benchmark.max_rows:
+                continue
+            for backend in backend_names:
+                result = run_benchmark(benchmark, rows, args.repeat, backend)
+                results.append(result)
+                print(f"{result['benchmark']:<20}{backend:<9}{rows:>12,}{result['rows_out']:>12,}"
+                      f"{result['best_seconds']:>12.4f}{result['rows_per_second']:>14,.0f}"
+                      f"{result['peak_memory'] / 1024 ** 2:>13.1f} MB")
+
+    if args.json_path:
+        with open(args.json_path, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
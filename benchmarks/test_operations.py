@@ -0,0 +1,48 @@
+"""
+The benchmarks of run_benchmarks.py as a pytest-benchmark suite, run without a display on Qt's offscreen platform.
+
+pytest-benchmark keeps the timings of each run and fails on a slowdown compared with a saved run. Throughput and
+peak memory, measured in a separate run under tracemalloc, are stored with each result as extra_info.
+
+Usage:
+    pytest benchmarks --sizes 10k,1M --benchmark-autosave
+    pytest benchmarks --sizes 10k,1M --benchmark-compare --benchmark-compare-fail=min:20%
+    pytest benchmarks --sizes 1M --backends pandas,polars,duckdb -k "merge or pivot or sort_string"
+"""
+import tracemalloc
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import backends
+import engine
+from instrumentation import performance_log
+from run_benchmarks import BENCHMARKS
+
+ROUNDS = 3
+
+
+@pytest.mark.parametrize("operation", BENCHMARKS, ids=lambda operation: operation.name)
+def test_operation(benchmark, operation, rows, backend):
+    if operation.max_rows is not None and rows > operation.max_rows:
+        pytest.skip(f"{operation.name} runs on at most {operation.max_rows:,} rows")
+    if backend not in backends.available_backends():
+        pytest.skip(f"backend {backend} is not installed")
+    # Peak memory is measured here; tracemalloc.reset_peak in the performance log would interfere
+    performance_log.track_memory = False
+    engine.set_backend(backend)
+    try:
+        args = operation.setup(rows)
+        rows_out = benchmark.pedantic(operation.run, args=args, rounds=ROUNDS)
+
+        tracemalloc.start()
+        operation.run(*args)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        engine.set_backend("pandas")
+
+    best = benchmark.stats.stats.min
+    benchmark.extra_info.update(rows=rows, rows_out=rows_out, peak_memory=peak_memory,
+                                rows_per_second=rows / best if best > 0 else float("inf"))
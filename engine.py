@@ -0,0 +1,2370 @@
+"""
+The data engine of the Spreadsheet Application.
+
+Everything in this module works on pandas DataFrames only and never touches Qt, so the same operations can be
+run by the GUI, from scripts, in worker processes and in the benchmarks. The operation functions are plain
+module-level functions that take and return DataFrames, which keeps them picklable for process pools.
+
+Operations can also be recorded lazily as PlanNodes. A chain of nodes is only evaluated when its data is needed,
+and consecutive row/column operations (rename, delete, sort, filter) are fused into a single pass over the data.
+
+Large tables can be memory-mapped (TableRevision.memory_map): their numeric, boolean and datetime columns then
+live in files in a workspace directory and the OS pages them in when they are read.
+"""
+import atexit
+import bz2
+import contextlib
+import gzip
+import io
+import lzma
+import mmap
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+import backends
+from instrumentation import performance_log
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.csv
+except ImportError:
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EXCEL_EXTENSIONS = [".xlsx", ".xls", ".xlsm"]
+# Extensions of compressed CSV and text files ("feed.csv.gz") and their compression
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+JOIN_TYPES = ["inner", "left", "right", "outer"]
+APPEND_DIRECTIONS = ["vertically", "horizontally"]
+
+# Runs the heavy part of merge, pivot and sort, see backends.py and set_backend
+execution_backend = "pandas"
+
+# Reads CSV and text files, see set_csv_reader. "pyarrow" reads them on all cores into Arrow-backed columns
+csv_reader = "pandas"
+CSV_READER_NAMES = {"pandas": "pandas", "pyarrow": "Arrow (multi-threaded)"}
+
+# Rows read at a time when a file is loaded with a filter, see read_file
+PROJECTION_CHUNK_ROWS = 500_000
+
+# Column types inferred by the Arrow CSV reader, by absolute file path
+_csv_schemas: Dict[str, "pyarrow.Schema"] = {}
+
+# Lazy revisions that keep their evaluated data, per table, besides the original revision
+MAX_MATERIALIZED_REVISIONS = 2
+
+# Sort permutations kept per table, each takes 8 bytes per row
+MAX_SORT_ORDERS = 8
+
+# Columns with more values than this get an estimated distinct count and the top values of a sample
+PROFILE_EXACT_ROWS = 1_000_000
+PROFILE_SAMPLE_ROWS = 100_000
+PROFILE_TOP_VALUES = 5
+
+# Tables with more rows than this are shown as a random sample of SAMPLE_ROWS rows
+SAMPLE_THRESHOLD_ROWS = 10_000_000
+SAMPLE_ROWS = 10_000
+
+# Rows sampled from a table for the rows of a join preview, and the joined rows it shows
+JOIN_PREVIEW_SAMPLE = 1_000
+JOIN_PREVIEW_ROWS = 20
+# Distinct left keys up to which join sizes are exact; past that, the most frequent keys are counted exactly and
+# a sample of the others is scaled up
+JOIN_SIZE_EXACT_KEYS = 1_000_000
+JOIN_SIZE_FREQUENT_KEYS = 10_000
+
+# The columns diff_tables puts before the data columns of a diff
+DIFF_COLUMNS = ["Change", "Old Row", "New Row", "Changed Columns"]
+
+# The values columns of each type hold, for the messages of cells that do not parse, see parse_cell
+CELL_TYPES = {"bool": "True/False values", "number": "numbers", "date": "dates"}
+
+# Hits a SearchIndex returns at most for one search
+SEARCH_MAX_HITS = 1_000
+
+# When set, TableStore.add_table memory-maps tables whose mappable columns take more bytes than this
+memory_map_threshold: Optional[int] = None
+MEMORY_MAP_THRESHOLD_BYTES = 256 * 1024 ** 2
+
+# Directory of the memory-mapped column files of this process, created on first use
+_workspace_dir: Optional[str] = None
+
+
+class PlanNode:
+    """
+    A recorded operation on top of a parent, which is a DataFrame or another PlanNode.
+
+    The operation is not run when the node is created. materialize() evaluates the chain of nodes from the
+    nearest parent that has data, and keeps the result on the node until it is released.
+
+    Functions:
+    - __init__: Records the operation name and its parameters on top of the parent.
+    - pin: Keeps the evaluated result permanently and lets go of the parent chain.
+    """
+
+    def __init__(self, parent: Union[pd.DataFrame, 'PlanNode'], op: str, params: Dict):
+        if op not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{op}'.")
+        self.parent = parent
+        self.op = op
+        self.params = params
+        self.result: Optional[pd.DataFrame] = None
+
+    def pin(self):
+        materialize(self)
+        self.parent = None
+
+    def __repr__(self):
+        return f"PlanNode({self.op}, {self.params})"
+
+
+class TableRevision:
+    """
+    Represents a revision of a table in the Spreadsheet Application.
+
+    The TableRevision class stores the data, revisions, and current revision of a table.
+    It provides methods to add a new revision, undo changes, and redo changes.
+
+    A revision is either a DataFrame or a PlanNode recorded with record(). Only the original revision and the
+    most recently used lazy revisions keep their data; other lazy revisions are evaluated again from their
+    nearest ancestor with data when they are needed.
+
+    Functions:
+    - __init__: Initializes the TableRevision with the given data.
+    - data: The DataFrame of the current revision.
+    - get_data: Returns the DataFrame of a revision, the current one by default, evaluating it if it is lazy.
+    - record: Records an operation as a new lazy revision.
+    - add_revision: Adds a new revision (a DataFrame or a PlanNode) to the table.
+    - undo: Undoes the last revision made to the table.
+    - redo: Redoes the last undone revision made to the table.
+    - rollback: Goes back to the original revision of the table.
+    - is_lazy: Returns whether a revision still has to be evaluated.
+    - sort_order: Returns the cached permutation that sorts a revision by one or more columns.
+    - sort: Adds a sorted revision that stores only the row permutation.
+    - column_profile: Returns the cached profile (dtype, nulls, distinct, min/max, top values) of a column.
+    - profile: Returns the profiles of all columns of a revision.
+    - key_index: Returns the cached KeyIndex of a column, used by join previews.
+    - formulas: Returns the expressions of the computed columns of a revision.
+    - compute_column: Adds or changes a computed column, with the computed columns that depend on it.
+    - edit_cell: Buffers an edit of a cell of the current revision in the edit journal.
+    - cell: Returns the value of a cell of the current revision, with the buffered edits.
+    - commit_edits: Adds the edits in the journal as one revision.
+    - memory_map: Moves the columns of the revisions holding data into memory-mapped files.
+    - load_into_memory: Reads memory-mapped revisions back into memory.
+    - revision_stats: Returns the rows, columns, deep memory usage and memory-mapped bytes of a revision.
+    - memory_usage: Returns the deep memory usage of all revisions held by the table.
+    - follow_source: Appends the rows added to the end of the source file since it was read as a new revision.
+    - reload_source: Reads the source file again and adds it as a new revision if its rows changed, with the diff.
+    """
+
+    def __init__(self, data: Union[pd.DataFrame, PlanNode]):
+        self.revisions = [data]
+        self.current_revision = 0
+        # New revisions with data are memory-mapped as well once memory_map() was called
+        self.memory_mapped = False
+        self.spreadsheet_name = ""
+        self.sheet_name = ""
+        self.extension = ""
+        # The file the table was loaded from and the projection it was loaded with, see read_file. source_offset
+        # is the byte offset up to which the file was read, for files that can be followed (followable)
+        self.source_path = ""
+        self.source_sheet = ""
+        self.source_projection: Optional[Dict] = None
+        self.source_offset: Optional[int] = None
+        # Row hashes of the data last read from the source file, see reload_source. Until they are needed, that
+        # data is the original revision and the rows followed since, whose hashes are kept in _followed_hashes
+        self.source_hashes: Optional[np.ndarray] = None
+        self._followed_hashes: List[np.ndarray] = []
+        # Stats are keyed by the id of the revision's DataFrame. Revisions are never modified in place,
+        # so an entry stays valid until the revision is dropped from the history or its data is released.
+        self._stats_cache = {}
+        # Lazy revisions holding evaluated data, least recently used first
+        self._materialized: List[PlanNode] = []
+        # Workers read revisions off the GUI thread: evaluating or releasing a revision, and changing the history,
+        # hold the lock so a revision is not released while another thread evaluates or reads it
+        self._lock = threading.RLock()
+        # Sort ranks by revision and column, and sort permutations by (revision, columns, directions). Both are
+        # keyed by the id of the entry in self.revisions, which stays alive as long as it is in the history.
+        self._sort_ranks: Dict[int, Dict] = {}
+        self._sort_orders: Dict[tuple, np.ndarray] = {}
+        # Column profiles by revision and column, keyed like the sort ranks. Evaluating a released revision
+        # again gives the same data, so profiles are kept until the revision leaves the history.
+        self._profiles: Dict[int, Dict] = {}
+        self._key_indexes: Dict[int, Dict] = {}
+        # The expressions of the computed columns by revision, keyed like the sort ranks. Each revision has its
+        # own, so undo also undoes a change of an expression.
+        self._formulas: Dict[int, Dict[str, str]] = {}
+        # Edited cell values of the current revision by column and row position, not yet in a revision. Reading
+        # the current revision or changing the history commits them first, see commit_edits.
+        self._edits: Dict[str, Dict[int, object]] = {}
+
+    @property
+    def data(self) -> pd.DataFrame:
+        return self.get_data()
+
+    def get_data(self, index: Optional[int] = None) -> pd.DataFrame:
+        if index is None:
+            self.commit_edits()
+            index = self.current_revision
+        with self._lock:
+            revision = self.revisions[index]
+            if isinstance(revision, pd.DataFrame):
+                return revision
+
+            if index == 0:
+                revision.pin()
+            else:
+                materialize(revision)
+                if revision in self._materialized:
+                    self._materialized.remove(revision)
+                self._materialized.append(revision)
+                while len(self._materialized) > MAX_MATERIALIZED_REVISIONS:
+                    self._release(self._materialized.pop(0))
+            return revision.result
+
+    def record(self, op: str, **params):
+        """
+        Adds an operation as a new lazy revision on top of the current one. Nothing is computed until
+        the data of the revision is requested.
+
+        Computed columns that depend on the columns the operation changes are recalculated in the same revision,
+        see update_formulas.
+        """
+        self.commit_edits()
+        formulas, recalculated = update_formulas(self.formulas(), op, params)
+        node = PlanNode(self.revisions[self.current_revision], op, params)
+        if recalculated:
+            node = PlanNode(node, "compute_columns", {"formulas": [], "recalculated": recalculated})
+        self.add_revision(node)
+        self._set_formulas(formulas)
+
+    def add_revision(self, data):
+        self.commit_edits()
+        with self._lock:
+            # Read before the oldest revision is dropped, which shifts the current index
+            formulas = self.formulas()
+            if len(self.revisions) >= 10:
+                dropped = self.revisions.pop(0)
+                if self.source_path and self.source_hashes is None:
+                    # The original revision is what was read from the source file, the diff of the next reload needs it
+                    self.source_hashes = self._read_hashes(materialize(dropped))
+                # Stats are cached by the data, which for a PlanNode is its result
+                self._stats_cache.pop(id(dropped if isinstance(dropped, pd.DataFrame) else dropped.result), None)
+                if isinstance(dropped, PlanNode):
+                    self._release(dropped)
+                self._sort_ranks.pop(id(dropped), None)
+                self._profiles.pop(id(dropped), None)
+                self._key_indexes.pop(id(dropped), None)
+                self._formulas.pop(id(dropped), None)
+                for key in [key for key in self._sort_orders if key[0] == id(dropped)]:
+                    del self._sort_orders[key]
+                # The oldest revision is the new original: evaluate it once so the chain before it can be freed
+                if isinstance(self.revisions[0], PlanNode):
+                    if self.revisions[0] in self._materialized:
+                        self._materialized.remove(self.revisions[0])
+                    self.revisions[0].pin()
+                    if self.memory_mapped:
+                        self._map_revision(0)
+            if self.memory_mapped and isinstance(data, pd.DataFrame):
+                data = memory_map(data)
+            self.revisions.append(data)
+            self.current_revision = len(self.revisions) - 1
+            self._set_formulas(formulas)
+
+    def _release(self, revision: PlanNode):
+        with self._lock:
+            if revision.result is not None and revision.parent is not None:
+                self._stats_cache.pop(id(revision.result), None)
+                revision.result = None
+
+    def sort_order(self, by: List, ascending: List[bool], index: Optional[int] = None) -> np.ndarray:
+        """
+        Returns the permutation that sorts a revision by the columns. Permutations and the per-column ranks they
+        are computed from are cached, so sorting the same revision again, in any direction, is cheap.
+        """
+        if index is None:
+            self.commit_edits()
+            index = self.current_revision
+        revision = self.revisions[index]
+        key = (id(revision), tuple(by), tuple(ascending))
+        if key not in self._sort_orders:
+            data = self.get_data(index)
+            ranks = self._sort_ranks.setdefault(id(revision), {})
+            order = sort_order(data[by], ascending, ranks=ranks)
+            with self._lock:
+                self._sort_orders[key] = order
+                while len(self._sort_orders) > MAX_SORT_ORDERS:
+                    del self._sort_orders[next(iter(self._sort_orders))]
+        return self._sort_orders[key]
+
+    def sort(self, by: Union[str, List], ascending: Union[bool, List[bool]] = True):
+        """
+        Adds a sorted revision, which only stores the permutation of the rows of the current revision.
+        """
+        self.commit_edits()
+        by, ascending = sort_keys(by, ascending)
+        parent = self.revisions[self.current_revision]
+        order = self.sort_order(by, ascending)
+        self.record("sort", by=by, ascending=ascending, order=order)
+        # Sorting only moves rows, so the ranks of the parent carry over and a following sort is cheap as well
+        self._sort_ranks[id(self.revisions[self.current_revision])] = {
+            name: (codes[order], count) for name, (codes, count) in self._sort_ranks.get(id(parent), {}).items()}
+
+    def column_profile(self, column, index: Optional[int] = None) -> Dict:
+        if index is None:
+            self.commit_edits()
+            index = self.current_revision
+        profiles = self._profiles.setdefault(id(self.revisions[index]), {})
+        if column not in profiles:
+            data = self.get_data(index)
+            with performance_log.stage(f"profile {column}", rows_in=len(data)):
+                profiles[column] = profile_column(data[column])
+        return profiles[column]
+
+    def profile(self, index: Optional[int] = None) -> Dict:
+        return {column: self.column_profile(column, index) for column in self.get_data(index).columns}
+
+    def key_index(self, column, index: Optional[int] = None) -> 'KeyIndex':
+        if index is None:
+            self.commit_edits()
+            index = self.current_revision
+        key_indexes = self._key_indexes.setdefault(id(self.revisions[index]), {})
+        if column not in key_indexes:
+            data = self.get_data(index)
+            with performance_log.stage(f"key index {column}", rows_in=len(data)):
+                key_indexes[column] = KeyIndex(data[column])
+        return key_indexes[column]
+
+    def formulas(self, index: Optional[int] = None) -> Dict[str, str]:
+        """
+        Returns the expressions of the computed columns of a revision, by column, in the order they are computed.
+        """
+        return self._formulas.get(id(self.revisions[self.current_revision if index is None else index]), {})
+
+    def _set_formulas(self, formulas: Dict[str, str]):
+        revision = self.revisions[self.current_revision]
+        if formulas:
+            self._formulas[id(revision)] = formulas
+        else:
+            self._formulas.pop(id(revision), None)
+
+    def compute_column(self, name: str, expression: str, position: Optional[int] = None):
+        """
+        Makes name a column computed from the expression (see compute_columns) and adds it as a new lazy
+        revision. A new column is inserted at position, at the end by default. The computed columns that depend
+        on name are recalculated as well. Raises ValueError if the expression depends on name itself, and
+        pandas' UndefinedVariableError if it uses a column the table does not have.
+        """
+        self.commit_edits()
+        formulas = define_formula(self.formulas(), name, expression)
+        # Checked on the first row, so that a formula that cannot be evaluated is not added
+        evaluate_formula(self.get_data().head(1), name, expression)
+        self.add_revision(PlanNode(self.revisions[self.current_revision], "compute_columns",
+                                   {"formulas": [(name, expression)], "position": position,
+                                    "recalculated": dependent_formulas(formulas, [name])}))
+        self._set_formulas(formulas)
+
+    def edit_cell(self, row: int, column: int, text: str):
+        """
+        Buffers the text entered in a cell of the current revision, by row and column position, in the edit
+        journal, converted to the type of the column (see parse_cell). The data is not changed until the edits
+        are committed. Raises ValueError if the text is not a value of that type, or if the column is computed
+        from a formula, which would overwrite the edit when it is recalculated.
+        """
+        data = self.get_data(self.current_revision)
+        name = data.columns[column]
+        if name in self.formulas():
+            raise ValueError(f"{name} is computed from {self.formulas()[name]}. Edit the formula, or the columns "
+                             f"it is computed from, instead.")
+        self._edits.setdefault(name, {})[row] = parse_cell(data.iloc[:, column], text)
+
+    def cell(self, row: int, column: int):
+        data = self.get_data(self.current_revision)
+        return self._edits.get(data.columns[column], {}).get(row, data.iloc[row, column])
+
+    def pending_edits(self) -> int:
+        return sum(len(rows) for rows in self._edits.values())
+
+    def commit_edits(self) -> int:
+        """
+        Adds the edits in the journal as one revision, which only stores the edited positions and values of each
+        column (see set_cells), and returns the number of edited cells.
+        """
+        if not self._edits:
+            return 0
+        edits, self._edits = self._edits, {}
+        self.record("set_cells", cells={name: (np.fromiter(rows, dtype=np.int64, count=len(rows)),
+                                               list(rows.values())) for name, rows in edits.items()})
+        return sum(len(rows) for rows in edits.values())
+
+    def undo(self):
+        self.commit_edits()
+        if self.current_revision > 0:
+            self.current_revision -= 1
+            return 0
+        else:
+            return -1
+
+    def redo(self):
+        self.commit_edits()
+        if self.current_revision < len(self.revisions) - 1:
+            self.current_revision += 1
+            return 0
+        else:
+            return -1
+
+    def rollback(self):
+        self.commit_edits()
+        self.current_revision = 0
+
+    def is_lazy(self, index: Optional[int] = None) -> bool:
+        """
+        Returns True if the revision is a recorded operation whose data has not been evaluated (or was released).
+        """
+        revision = self.revisions[self.current_revision if index is None else index]
+        return isinstance(revision, PlanNode) and revision.result is None
+
+    def memory_map(self, directory: Optional[str] = None) -> int:
+        """
+        Moves the mappable columns of every revision holding data (the original, and lazy revisions that were
+        pinned) into memory-mapped files, and maps later revisions as well. Returns the number of bytes mapped.
+        """
+        self.memory_mapped = True
+        return sum(self._map_revision(index, directory) for index in range(len(self.revisions)))
+
+    def load_into_memory(self):
+        self.memory_mapped = False
+        for index, revision in enumerate(self.revisions):
+            data = revision if isinstance(revision, pd.DataFrame) else revision.result
+            if data is not None and mapped_bytes(data):
+                self._replace_data(index, data.copy())
+
+    def _map_revision(self, index: int, directory: Optional[str] = None) -> int:
+        revision = self.revisions[index]
+        # Evaluated lazy revisions that still have a parent are released again later, so they are not mapped
+        if isinstance(revision, PlanNode) and (revision.result is None or revision.parent is not None):
+            return 0
+        data = revision if isinstance(revision, pd.DataFrame) else revision.result
+        if mapped_bytes(data):
+            return 0
+        mapped = memory_map(data, directory)
+        self._replace_data(index, mapped)
+        return mapped_bytes(mapped)
+
+    def _replace_data(self, index: int, data: pd.DataFrame):
+        # The data is the same, so the cached stats, ranks and profiles carry over to the new entry
+        revision = self.revisions[index]
+        old_data = revision if isinstance(revision, pd.DataFrame) else revision.result
+        self._stats_cache.pop(id(old_data), None)
+        # The id of a DataFrame freed earlier may be reused by the new one
+        self._stats_cache.pop(id(data), None)
+        if isinstance(revision, pd.DataFrame):
+            for cache in (self._sort_ranks, self._profiles, self._key_indexes, self._formulas):
+                if id(revision) in cache:
+                    cache[id(data)] = cache.pop(id(revision))
+            for key in [key for key in self._sort_orders if key[0] == id(revision)]:
+                self._sort_orders[(id(data),) + key[1:]] = self._sort_orders.pop(key)
+            # Lazy revisions recorded on top of the old DataFrame would keep it in memory
+            for other in self.revisions:
+                if isinstance(other, PlanNode) and other.parent is revision:
+                    other.parent = data
+            self.revisions[index] = data
+        else:
+            revision.result = data
+
+    def follow_source(self) -> int:
+        """
+        Reads the rows added to the end of the source file since source_offset and appends them to the current
+        revision as a new lazy revision. Only the new bytes are parsed. Returns the number of rows added.
+
+        A file that is now smaller than source_offset was replaced rather than appended to; it is then reloaded
+        with reload_source, which adds a revision only if rows changed.
+        """
+        if os.path.getsize(self.source_path) < self.source_offset:
+            return self.reload_source()["rows"]
+        with performance_log.stage("read new rows") as stage:
+            rows, self.source_offset = read_new_rows(self.source_path, self.source_offset, self.get_data(0).dtypes,
+                                                     self.source_projection)
+            stage.rows_out = len(rows)
+        if len(rows):
+            self.record("append", second=rows, direction="vertically")
+            if self.source_hashes is None:
+                self._followed_hashes.append(row_hashes(rows))
+            else:
+                self.source_hashes = np.concatenate([self.source_hashes, row_hashes(rows)])
+        return len(rows)
+
+    def reload_source(self) -> Dict:
+        """
+        Reads the source file again, with the sheet and projection it was loaded with, and compares its rows with
+        the rows read from it before by their hashes (see diff_rows). If rows were inserted, deleted or changed, the
+        new data is added as a revision. Returns the diff, with the number of rows of the file as "rows".
+
+        The first reload hashes the original revision; the hashes of the new data are kept for the next one.
+        """
+        if self.source_offset is not None:
+            self.source_offset = os.path.getsize(self.source_path)
+        with performance_log.stage(f"reload ({csv_reader})") as stage:
+            data = read_source(self.source_path, self.source_sheet, self.source_projection)
+            stage.rows_out = len(data)
+        if self.source_hashes is None:
+            self.source_hashes = self._read_hashes(self.get_data(0))
+        new_hashes = self._read_hashes(data)
+        with performance_log.stage("diff rows", rows_in=len(data)):
+            diff = diff_rows(self.source_hashes, new_hashes)
+        self.source_hashes = new_hashes
+        if len(diff["deleted"]) or len(diff["inserted"]) or len(diff["changed_old"]):
+            formulas = self.formulas()
+            if formulas:
+                # The file does not have the computed columns
+                data = PlanNode(data, "compute_columns", {"formulas": [], "recalculated": list(formulas.items())})
+            self.add_revision(data)
+        diff["rows"] = len(data)
+        return diff
+
+    def _read_hashes(self, data: pd.DataFrame) -> np.ndarray:
+        # The hashes of data read from the source file and of the rows followed after it
+        with performance_log.stage("row hashes", rows_in=len(data)):
+            hashes = np.concatenate([row_hashes(data)] + self._followed_hashes)
+        self._followed_hashes = []
+        return hashes
+
+    def revision_stats(self, index: Optional[int] = None) -> Dict[str, Optional[int]]:
+        """
+        Returns the rows, columns and deep memory of a revision, and the bytes of its memory-mapped columns,
+        which are not part of the memory. A lazy revision has no rows or columns yet and takes no memory.
+        """
+        if index is None:
+            index = self.current_revision
+        if self.is_lazy(index):
+            return {"rows": None, "columns": None, "memory": 0, "mapped": 0}
+        revision = self.revisions[index]
+        data = revision if isinstance(revision, pd.DataFrame) else revision.result
+        stats = self._stats_cache.get(id(data))
+        if stats is None:
+            mapped = mapped_bytes(data)
+            stats = {
+                "rows": len(data),
+                "columns": len(data.columns),
+                "memory": int(data.memory_usage(deep=True).sum()) - mapped,
+                "mapped": mapped,
+            }
+            self._stats_cache[id(data)] = stats
+        return stats
+
+    def memory_usage(self) -> int:
+        seen = set()
+        total = 0
+        for index, revision in enumerate(self.revisions):
+            if id(revision) not in seen:
+                seen.add(id(revision))
+                total += self.revision_stats(index)["memory"]
+        return total
+
+
+class KeyIndex:
+    """
+    A hash index of a key column: the distinct values, and the row positions of each value grouped together.
+
+    Building it takes one factorize and one sort of the column; after that, finding the rows of any set of keys
+    takes one hash lookup per key. Missing values are a key of their own, as they are for merge.
+
+    Functions:
+    - __init__: Groups the row positions of the column by value.
+    - lookup: Returns the position of each key among the distinct values, or -1 for keys not in the column.
+    - counts: Returns the number of rows with each key.
+    - rows: Returns the row positions with the value at a lookup position.
+    """
+
+    def __init__(self, keys: pd.Series):
+        codes, uniques = pd.factorize(keys, use_na_sentinel=False)
+        self.values = pd.Index(uniques)
+        self.order = np.argsort(codes, kind="stable")
+        self.row_counts = np.bincount(codes, minlength=len(uniques))
+        self.starts = np.cumsum(self.row_counts) - self.row_counts
+
+    def lookup(self, keys: pd.Series) -> np.ndarray:
+        return self.values.get_indexer(keys)
+
+    def counts(self, keys: pd.Series) -> np.ndarray:
+        codes = self.lookup(keys)
+        return np.where(codes >= 0, self.row_counts[codes], 0) if len(self.row_counts) else np.zeros(len(keys), int)
+
+    def rows(self, code: int) -> np.ndarray:
+        return self.order[self.starts[code]:self.starts[code] + self.row_counts[code]]
+
+
+class SearchIndex:
+    """
+    An inverted index of the words in the text columns of a table, for searching all loaded tables at once.
+
+    Each column is indexed on its own: its distinct values with the rows of each value grouped together, as in
+    KeyIndex, and the sorted lowercase words of the distinct values with the values each word is in. A search
+    finds the words starting with each term by binary search, so it takes milliseconds however long the table is.
+    Columns that hold the same data as in the index of the previous revision are taken over from it, so indexing
+    a new revision only indexes the columns it changed.
+
+    Functions:
+    - __init__: Indexes the text columns of data, taking over unchanged columns from a previous index.
+    - search: Returns the cells whose text has words starting with every term of a query.
+    """
+
+    def __init__(self, data: pd.DataFrame, previous: Optional['SearchIndex'] = None):
+        self.columns: Dict[str, Dict] = {}
+        for name in data.columns:
+            column = data[name]
+            if not pd.api.types.is_string_dtype(column.dtype):
+                continue
+            # The NumPy array itself where there is one: its memory identifies the column
+            values = column.to_numpy() if isinstance(column.dtype, np.dtype) else column.array
+            reused = previous.columns.get(name) if previous is not None else None
+            if reused is not None and _same_values(reused["values"], values):
+                self.columns[name] = reused
+            else:
+                self.columns[name] = _index_words(values)
+
+    def search(self, query: str, limit: int = SEARCH_MAX_HITS) -> Tuple[List[Tuple[int, str, str]], int]:
+        """
+        Returns up to limit (row, column, text) hits, by row, and the number of all hits. A cell is a hit when
+        every word of the query is the start of a word of its text, ignoring case.
+        """
+        terms = re.findall(r"\w+", query.lower())
+        hits, total = [], 0
+        if not terms:
+            return hits, total
+        for name, index in self.columns.items():
+            found = None
+            for term in terms:
+                first, last = np.searchsorted(index["words"], [term, term + "\U0010ffff"])
+                values = index["word_values"][index["word_starts"][first]:index["word_starts"][last]]
+                found = np.unique(values) if found is None else np.intersect1d(found, values)
+                if not len(found):
+                    break
+            counts = index["row_counts"][found]
+            total += int(counts.sum())
+            if len(hits) >= limit:
+                continue
+            # Only the rows of as many values as are needed to fill the hits are collected
+            needed = np.searchsorted(np.cumsum(counts), limit - len(hits)) + 1
+            for value in found[:needed]:
+                rows = index["order"][index["starts"][value]:index["starts"][value] + index["row_counts"][value]]
+                text = str(index["values"][rows[0]])
+                hits.extend((int(row), name, text) for row in rows[:limit - len(hits)])
+        return sorted(hits, key=lambda hit: hit[0]), total
+
+
+def _index_words(values) -> Dict:
+    # The word index of one column, see SearchIndex. Missing values have no words.
+    codes, uniques = pd.factorize(values)
+    texts = pd.Series(uniques, dtype=object).astype(str).str.lower()
+    words = texts.str.findall(r"\w+").explode().dropna()
+    pairs = pd.DataFrame({"word": words.to_numpy(dtype=object), "value": words.index.to_numpy()}).drop_duplicates()
+    word_codes, unique_words = pd.factorize(pairs["word"], sort=True)
+    word_order = np.argsort(word_codes, kind="stable")
+    present = codes >= 0
+    row_counts = np.bincount(codes[present], minlength=len(uniques))
+    order = np.argsort(codes, kind="stable")[len(codes) - int(present.sum()):]
+    return {
+        # Kept to recognize the column in the next revision, and for the text of the hits
+        "values": values,
+        "words": np.asarray(unique_words, dtype=object),
+        "word_values": pairs["value"].to_numpy()[word_order],
+        "word_starts": np.append(0, np.cumsum(np.bincount(word_codes, minlength=len(unique_words)))),
+        "order": order.astype(np.int32) if len(order) < 2 ** 31 else order,
+        "row_counts": row_counts,
+        "starts": np.cumsum(row_counts) - row_counts,
+    }
+
+
+def _same_values(old, new) -> bool:
+    # Revisions never modify data in place, so a column whose values live in the same memory is unchanged
+    if old is new:
+        return True
+    if not (isinstance(old, np.ndarray) and isinstance(new, np.ndarray)):
+        return False
+    return (old.dtype == new.dtype and old.shape == new.shape and old.strides == new.strides
+            and old.__array_interface__["data"][0] == new.__array_interface__["data"][0])
+
+
+class TableStore(dict):
+    """
+    The tables of a workspace, by name, in the order they were added.
+
+    TableStore is a dict of table name to TableRevision, so it can be used anywhere the tables dictionary was
+    used before, with helpers for naming and adding tables.
+
+    Functions:
+    - add_table: Adds data as a new TableRevision under a unique name and returns the name. Tables larger than
+      memory_map_threshold are memory-mapped.
+    - unique_name: Returns the given name, or the name with the next free " (n)" suffix if it is taken.
+    - new_table_name: Returns the first free "<prefix> n" name, e.g. "Query 1".
+    - rename: Renames a table, keeping its position.
+    """
+
+    def add_table(self, name: str, data: Union[pd.DataFrame, PlanNode], spreadsheet_name: str = "",
+                  sheet_name: str = "", extension: str = "") -> str:
+        name = self.unique_name(name)
+        if isinstance(data, PlanNode) and data.result is not None:
+            # The original revision keeps only its data, an evaluated result does not need its parents
+            data = data.result
+        table_revision = TableRevision(data)
+        table_revision.spreadsheet_name = spreadsheet_name
+        table_revision.sheet_name = sheet_name
+        table_revision.extension = extension
+        # The size of a result that is not evaluated yet is not known
+        if (memory_map_threshold is not None and isinstance(data, pd.DataFrame)
+                and mappable_bytes(data) > memory_map_threshold):
+            table_revision.memory_map()
+        self[name] = table_revision
+        return name
+
+    def unique_name(self, name: str) -> str:
+        if name not in self:
+            return name
+        pattern = rf"{re.escape(name)}\s*\((\d+)\)"
+        max_number = 0
+        for existing_table_name in self:
+            match = re.match(pattern, existing_table_name)
+            if match:
+                max_number = max(max_number, int(match.group(1)))
+        # Increment the number for the new table name
+        return f"{name} ({max_number + 1})"
+
+    def new_table_name(self, prefix: str) -> str:
+        i = 1
+        while True:
+            new_table_name = f"{prefix} {i}"
+            if new_table_name not in self:
+                return new_table_name
+            i += 1
+
+    def rename(self, old_name: str, new_name: str):
+        items = [(new_name if name == old_name else name, table_revision) for name, table_revision in self.items()]
+        self.clear()
+        self.update(items)
+
+
+def workspace_dir() -> str:
+    """
+    Returns the directory for the memory-mapped files of this process, which is removed when the process exits.
+    """
+    global _workspace_dir
+    if _workspace_dir is None:
+        _workspace_dir = tempfile.mkdtemp(prefix="spreadsheet-app-")
+        atexit.register(shutil.rmtree, _workspace_dir, ignore_errors=True)
+    return _workspace_dir
+
+
+def _mappable(column: pd.Series) -> bool:
+    # Fixed width numpy columns; object and extension columns (text, categories, ...) stay in memory
+    return isinstance(column.dtype, np.dtype) and column.dtype.kind in "biufcmM"
+
+
+def mappable_bytes(data: pd.DataFrame) -> int:
+    return sum(data.iloc[:, position].nbytes for position in range(data.shape[1])
+               if _mappable(data.iloc[:, position]))
+
+
+def _is_mapped(values: np.ndarray) -> bool:
+    # Copies of a memory map are np.memmap instances too, only arrays over an mmap buffer are file backed
+    while values is not None:
+        if isinstance(values, mmap.mmap):
+            return True
+        values = getattr(values, "base", None)
+    return False
+
+
+def mapped_bytes(data: pd.DataFrame) -> int:
+    return sum(data.iloc[:, position].nbytes for position in range(data.shape[1])
+               if _mappable(data.iloc[:, position]) and _is_mapped(data.iloc[:, position].to_numpy()))
+
+
+def memory_map(data: pd.DataFrame, directory: Optional[str] = None) -> pd.DataFrame:
+    """
+    Returns data with its numeric, boolean and datetime columns in read-only memory-mapped .npy files in
+    directory (the workspace directory by default). Other columns are shared with data.
+
+    The files are deleted right after they are mapped, so their disk space is freed with the last DataFrame
+    using them. Where open files cannot be deleted (Windows) they are removed with the workspace directory.
+    """
+    directory = directory or workspace_dir()
+    os.makedirs(directory, exist_ok=True)
+    with performance_log.stage("memory map", rows_in=len(data)) as stage:
+        columns = {}
+        for position in range(data.shape[1]):
+            column = data.iloc[:, position]
+            values = column.to_numpy()
+            if _mappable(column) and not _is_mapped(values):
+                handle, path = tempfile.mkstemp(suffix=".npy", dir=directory)
+                os.close(handle)
+                np.save(path, values)
+                values = np.load(path, mmap_mode="r")
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            columns[position] = values
+        # copy=False keeps each column in its own block, so the memory maps are not copied into one array
+        mapped = pd.DataFrame(columns, index=data.index, copy=False)
+        mapped.columns = data.columns
+        stage.rows_out = len(mapped)
+    return mapped
+
+
+def inspect_file(file_path: str) -> List[Tuple[str, List, Optional[int]]]:
+    """
+    Returns (sheet name, column names, row count) per sheet of a file, reading only its header row and, for
+    Excel files, the sheet dimensions. The row count is None when only reading the rows would give it (CSV and
+    text files, and Excel files without stored dimensions).
+    """
+    extension = split_extension(file_path)[1]
+    with performance_log.stage("inspect"):
+        if extension == ".zip":
+            return [(member, _read_header(file_path, _separator(member), member), None)
+                    for member in archive_members(file_path)]
+        if extension in (".csv", ".txt"):
+            return [("Sheet1", _read_header(file_path, _separator(file_path)), None)]
+        if extension not in (".xlsx", ".xlsm") or openpyxl is None:
+            excel_file = pd.ExcelFile(file_path)
+            return [(sheet_name, list(excel_file.parse(sheet_name, nrows=0).columns), None)
+                    for sheet_name in excel_file.sheet_names]
+
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            return [(sheet.title, _header_names(next(sheet.iter_rows(max_row=1, values_only=True), ())),
+                     sheet.max_row - 1 if sheet.max_row else None)
+                    for sheet in workbook.worksheets]
+        finally:
+            workbook.close()
+
+
+def read_file(file_path: str, projection: Optional[Dict] = None) -> List[Tuple[str, pd.DataFrame]]:
+    """
+    Reads an Excel, CSV or tab separated text file and returns a (sheet name, data) pair per sheet.
+
+    A projection reads only part of the file:
+
+    - sheet: the sheet to read from an Excel file, the first one by default
+    - columns: the columns to keep, in this order
+    - first_row, rows: the range of data rows to read (0-based, all rows after first_row by default)
+    - filter: filter_rows options ({"column": ..., "text": ..., "match_case": ...}); only matching rows of the
+      range are kept
+
+    The projection is pushed into the readers, so memory use and load time scale with what is kept. With a
+    filter, the rows are read PROJECTION_CHUNK_ROWS at a time.
+
+    Compressed CSV and text files (see COMPRESSION_EXTENSIONS) are decompressed while they are parsed. Zip
+    archives are read with read_archive.
+    """
+    extension = split_extension(file_path)[1]
+    if extension == ".zip":
+        return read_archive(file_path, projection)
+    if extension in (".csv", ".txt"):
+        with performance_log.stage(f"load ({csv_reader})") as stage:
+            data = _read_csv(file_path, _separator(file_path), projection)
+            stage.rows_out = len(data)
+        return [("Sheet1", data)]
+
+    if projection is not None:
+        with performance_log.stage("load") as stage:
+            if extension in (".xlsx", ".xlsm") and openpyxl is not None:
+                sheet_name, data = _read_excel_projected(file_path, projection)
+            else:
+                sheet_name = projection.get("sheet") or pd.ExcelFile(file_path).sheet_names[0]
+                first_row = projection.get("first_row", 0)
+                data = _project(pd.read_excel(file_path, sheet_name=sheet_name, usecols=_read_columns(projection),
+                                              skiprows=range(1, first_row + 1), nrows=projection.get("rows")),
+                                projection)
+            stage.rows_out = len(data)
+        return [(sheet_name, data)]
+
+    with performance_log.stage("load"):
+        excel_file = pd.ExcelFile(file_path)
+    sheets = []
+    for sheet_name in excel_file.sheet_names:
+        with performance_log.stage(f"parse {sheet_name}") as stage:
+            data = excel_file.parse(sheet_name)
+            stage.rows_out = len(data)
+        sheets.append((sheet_name, data))
+    return sheets
+
+
+def read_archive(file_path: str, projection: Optional[Dict] = None,
+                 workers: Optional[int] = None) -> List[Tuple[str, pd.DataFrame]]:
+    """
+    Reads the CSV and text files of a zip archive and returns a (file name in the archive, data) pair per file.
+
+    The files are read in parallel threads, each decompressing its file while it parses it; zlib and the Arrow
+    reader run without the GIL. A projection reads only the file named by its "sheet", see read_file.
+    """
+    members = archive_members(file_path)
+    if projection is not None:
+        members = [projection.get("sheet") or members[0]]
+    with performance_log.stage(f"load {os.path.basename(file_path)} ({csv_reader})") as stage:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            tables = list(executor.map(lambda member: _read_csv(file_path, _separator(member), projection, member),
+                                       members))
+        stage.rows_out = sum(len(data) for data in tables)
+    return list(zip(members, tables))
+
+
+def archive_members(file_path: str) -> List[str]:
+    """ Returns the names of the CSV and text files in a zip archive """
+    with zipfile.ZipFile(file_path) as archive:
+        return [info.filename for info in archive.infolist()
+                if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+                and os.path.splitext(info.filename)[1].lower() in (".csv", ".txt")]
+
+
+def split_extension(file_path: str) -> Tuple[str, str, Optional[str]]:
+    """
+    Splits a file name into its name without extensions, its lower case format extension and its compression,
+    e.g. "feed.csv.gz" into ("feed", ".csv", "gzip").
+    """
+    name, extension = os.path.splitext(os.path.basename(file_path))
+    compression = COMPRESSION_EXTENSIONS.get(extension.lower())
+    if compression is not None:
+        name, extension = os.path.splitext(name)
+    return name, extension.lower(), compression
+
+
+def available_compressions() -> List[str]:
+    return ["gzip", "bz2", "xz"] + (["zstd"] if zstandard is not None or pyarrow is not None else [])
+
+
+def open_input(file_path: str, member: Optional[str] = None):
+    """
+    Opens a file for reading in binary mode. Compressed files are decompressed as they are read, and member
+    opens a file in a zip archive instead.
+    """
+    if member is not None:
+        # The member stays readable after the archive is closed
+        with zipfile.ZipFile(file_path) as archive:
+            return archive.open(member)
+    compression = split_extension(file_path)[2]
+    if compression == "zstd":
+        return _zstd_stream(file_path, "rb")
+    return {"gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}.get(compression, open)(file_path, "rb")
+
+
+def open_output(file_path: str):
+    """ Opens a file for writing in binary mode, compressing what is written when its extension says so """
+    compression = split_extension(file_path)[2]
+    if compression == "gzip":
+        # The default level 9 is several times slower than 6 for a few percent smaller files
+        return gzip.open(file_path, "wb", compresslevel=6)
+    if compression == "zstd":
+        return _zstd_stream(file_path, "wb")
+    return {"bz2": bz2.open, "xz": lzma.open}.get(compression, open)(file_path, "wb")
+
+
+def _zstd_stream(file_path: str, mode: str):
+    if zstandard is not None:
+        return zstandard.open(file_path, mode)
+    if pyarrow is not None:
+        return pyarrow.input_stream(file_path, "zstd") if mode == "rb" else pyarrow.output_stream(file_path, "zstd")
+    raise ValueError("Zstandard (.zst) files need the zstandard or pyarrow package (pip install zstandard).")
+
+
+@contextlib.contextmanager
+def _csv_input(file_path: str, member: Optional[str] = None, decompresses: Iterable[str] = ()):
+    # Readers parse a path faster than a Python file object, so they get the path of plain files and of the
+    # compressed files they decompress themselves
+    if member is None and split_extension(file_path)[2] in (None, *decompresses):
+        yield file_path
+    else:
+        with open_input(file_path, member) as file:
+            yield file
+
+
+def _arrow_input(file_path: str, member: Optional[str] = None):
+    return _csv_input(file_path, member, decompresses=("gzip", "bz2", "zstd"))
+
+
+def _separator(file_name: str) -> str:
+    return "\t" if split_extension(file_name)[1] == ".txt" else ","
+
+
+def followable(file_path: str, projection: Optional[Dict] = None) -> bool:
+    """
+    Returns whether rows appended to a file can be read on their own, see TableRevision.follow_source: true for
+    uncompressed CSV and text files that were not limited to a number of rows.
+    """
+    _, extension, compression = split_extension(file_path)
+    return extension in (".csv", ".txt") and compression is None and (projection or {}).get("rows") is None
+
+
+def read_new_rows(file_path: str, offset: int, dtypes: Optional[pd.Series] = None,
+                  projection: Optional[Dict] = None) -> Tuple[pd.DataFrame, int]:
+    """
+    Parses the complete lines of a CSV or text file after the byte offset, with the columns of its header row,
+    and returns them with the offset of the end of the last complete line. A line that is still being written
+    is left for the next read.
+
+    dtypes are the column types of the rows read before: text columns stay text, so the new rows concatenate to
+    the same types as a full read would give. The filter and columns of a projection are applied to the rows.
+    """
+    separator = _separator(file_path)
+    header = _read_header(file_path, separator)
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        tail = file.read()
+    end = tail.rfind(b"\n") + 1
+    if not tail[:end].strip():
+        return pd.DataFrame(columns=(projection or {}).get("columns") or header), offset + end
+
+    if csv_reader == "pyarrow":
+        table = pyarrow.csv.read_csv(io.BytesIO(tail[:end]), read_options=pyarrow.csv.ReadOptions(column_names=header),
+                                     parse_options=pyarrow.csv.ParseOptions(delimiter=separator),
+                                     convert_options=pyarrow.csv.ConvertOptions(
+                                         column_types=_csv_schemas.get(_schema_key(file_path))))
+        rows = table.to_pandas(types_mapper=pd.ArrowDtype)
+    else:
+        text_columns = {column: str for column, dtype in (dtypes if dtypes is not None else {}).items()
+                        if column in header and dtype == object}
+        rows = pd.read_csv(io.BytesIO(tail[:end]), sep=separator, header=None, names=header, dtype=text_columns)
+    return (_project(rows, projection).reset_index(drop=True) if projection else rows), offset + end
+
+
+def read_source(file_path: str, sheet: str = "", projection: Optional[Dict] = None) -> pd.DataFrame:
+    """
+    Reads one sheet of a file, or one file of a zip archive, with the projection it was loaded with. CSV and text
+    files have a single sheet.
+    """
+    if split_extension(file_path)[1] not in (".csv", ".txt"):
+        projection = dict(projection or {}, sheet=sheet)
+    return read_file(file_path, projection)[0][1]
+
+
+def _read_header(file_path: str, separator: str, member: Optional[str] = None) -> List:
+    with _csv_input(file_path, member) as source:
+        return list(pd.read_csv(source, sep=separator, nrows=0).columns)
+
+
+def _read_csv(file_path: str, separator: str, projection: Optional[Dict] = None,
+              member: Optional[str] = None) -> pd.DataFrame:
+    # A CSV or text file, or a file in a zip archive, read with the selected reader
+    if csv_reader == "pyarrow":
+        if projection is not None:
+            return _read_csv_arrow_projected(file_path, separator, projection, member)
+        return read_csv_arrow(file_path, separator, member)
+    if projection is not None:
+        return _read_csv_projected(file_path, separator, projection, member)
+    with _csv_input(file_path, member) as source:
+        return pd.read_csv(source, sep=separator)
+
+
+def _header_names(header: Iterable) -> List:
+    # Column names as pandas gives them: "Unnamed: <position>" for empty cells, ".<n>" suffixes for duplicates
+    names = []
+    for position, name in enumerate(header):
+        name = f"Unnamed: {position}" if name is None else name
+        duplicate, suffix = name, 1
+        while duplicate in names:
+            duplicate, suffix = f"{name}.{suffix}", suffix + 1
+        names.append(duplicate)
+    return names
+
+
+def _read_columns(projection: Dict) -> Optional[List]:
+    # The columns a projection reads: the kept ones and the filter column
+    if not projection.get("columns"):
+        return None
+    columns = list(projection["columns"])
+    if projection.get("filter") and projection["filter"]["column"] not in columns:
+        columns.append(projection["filter"]["column"])
+    return columns
+
+
+def _project(data: pd.DataFrame, projection: Dict) -> pd.DataFrame:
+    # Applies the filter and the column selection of a projection to rows that were read
+    if projection.get("filter"):
+        options = dict(projection["filter"])
+        data = data[filter_mask(data[options.pop("column")], **options)]
+    if projection.get("columns"):
+        data = data[list(projection["columns"])]
+    return data
+
+
+def _concat_chunks(chunks: List[pd.DataFrame], columns: List) -> pd.DataFrame:
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0].reset_index(drop=True)
+
+
+def _read_csv_projected(file_path: str, separator: str, projection: Dict,
+                        member: Optional[str] = None) -> pd.DataFrame:
+    header = _read_header(file_path, separator, member)
+    # Skipping the header with the rows before the range and naming the columns keeps the parser in C; a list of
+    # rows to skip would be a set of up to all row numbers
+    with _csv_input(file_path, member) as source:
+        reader = pd.read_csv(source, sep=separator, header=None, names=header,
+                             skiprows=projection.get("first_row", 0) + 1, nrows=projection.get("rows"),
+                             usecols=_read_columns(projection),
+                             chunksize=PROJECTION_CHUNK_ROWS if projection.get("filter") else None)
+        if not projection.get("filter"):
+            return _project(reader, projection)
+        with reader:
+            return _concat_chunks([_project(chunk, projection) for chunk in reader],
+                                  projection.get("columns") or header)
+
+
+def _read_csv_arrow_projected(file_path: str, separator: str, projection: Dict,
+                              member: Optional[str] = None) -> pd.DataFrame:
+    read_options = pyarrow.csv.ReadOptions(skip_rows_after_names=projection.get("first_row", 0))
+    parse_options = pyarrow.csv.ParseOptions(delimiter=separator)
+    convert_options = pyarrow.csv.ConvertOptions(include_columns=_read_columns(projection) or [],
+                                                 column_types=_csv_schemas.get(_schema_key(file_path, member)))
+    remaining = projection.get("rows")
+    chunks = []
+    try:
+        # The streaming reader stops at the end of the range, but infers the types from its first block only
+        with _arrow_input(file_path, member) as source, pyarrow.csv.open_csv(
+                source, read_options=read_options, parse_options=parse_options,
+                convert_options=convert_options) as reader:
+            for batch in reader:
+                if remaining is not None:
+                    batch = batch.slice(0, remaining)
+                    remaining -= batch.num_rows
+                chunks.append(_project(batch.to_pandas(types_mapper=pd.ArrowDtype), projection))
+                if remaining == 0:
+                    break
+            columns = reader.schema.names
+    except pyarrow.ArrowInvalid:
+        # A value later in the file does not fit those types: read the whole range with types inferred from all of it
+        with _arrow_input(file_path, member) as source:
+            table = pyarrow.csv.read_csv(source, read_options=read_options, parse_options=parse_options,
+                                         convert_options=convert_options)
+        if projection.get("rows") is not None:
+            table = table.slice(0, projection["rows"])
+        return _project(table.to_pandas(types_mapper=pd.ArrowDtype), projection).reset_index(drop=True)
+    return _concat_chunks(chunks, projection.get("columns") or columns)
+
+
+def _read_excel_projected(file_path: str, projection: Dict) -> Tuple[str, pd.DataFrame]:
+    # openpyxl's read-only mode streams the rows of the range, and only the cells between the first and the last
+    # column that is read
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[projection.get("sheet") or workbook.sheetnames[0]]
+        header = _header_names(next(sheet.iter_rows(max_row=1, values_only=True), ()))
+        positions = [header.index(column) for column in _read_columns(projection) or header]
+        min_col, max_col = min(positions) + 1, max(positions) + 1
+        min_row = projection.get("first_row", 0) + 2
+        max_row = min_row + projection["rows"] - 1 if projection.get("rows") is not None else None
+
+        chunks, rows = [], []
+        for values in sheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col,
+                                      values_only=True):
+            rows.append(values)
+            if len(rows) == PROJECTION_CHUNK_ROWS:
+                chunks.append(_excel_chunk(rows, header[min_col - 1:max_col], projection))
+                rows = []
+        # Like pandas, leave out the empty rows at the end of the sheet
+        while rows and all(value is None for value in rows[-1]):
+            rows.pop()
+        if rows:
+            chunks.append(_excel_chunk(rows, header[min_col - 1:max_col], projection))
+        return sheet.title, _concat_chunks(chunks, projection.get("columns") or header)
+    finally:
+        workbook.close()
+
+
+def _excel_chunk(rows: List[tuple], columns: List, projection: Dict) -> pd.DataFrame:
+    data = pd.DataFrame(rows, columns=columns)
+    return _project(data[_read_columns(projection) or columns].infer_objects(), projection)
+
+
+def available_csv_readers() -> List[str]:
+    return ["pandas"] + (["pyarrow"] if pyarrow is not None else [])
+
+
+def set_csv_reader(name: str):
+    """
+    Selects the reader for CSV and text files: "pandas", or "pyarrow" when it is installed.
+    """
+    global csv_reader
+    if name not in available_csv_readers():
+        raise ValueError(f"The CSV reader '{name}' is not available. Available: "
+                         f"{', '.join(available_csv_readers())}.")
+    csv_reader = name
+
+
+def read_csv_arrow(file_path: str, separator: str = ",", member: Optional[str] = None) -> pd.DataFrame:
+    """
+    Reads a CSV file, or a CSV file in a zip archive, with pyarrow's multi-threaded reader, into Arrow-backed
+    columns.
+
+    The column types inferred on the first read of a file are cached and given to the reader when the file is
+    read again, which then skips type inference. Columns added since are inferred; if a value no longer
+    converts to the cached type of its column, the whole file is inferred again.
+    """
+    key = _schema_key(file_path, member)
+    parse_options = pyarrow.csv.ParseOptions(delimiter=separator)
+    table = None
+    if key in _csv_schemas:
+        try:
+            with _arrow_input(file_path, member) as source:
+                table = pyarrow.csv.read_csv(source, parse_options=parse_options,
+                                             convert_options=pyarrow.csv.ConvertOptions(
+                                                 column_types=_csv_schemas[key]))
+        except pyarrow.ArrowInvalid:
+            pass
+    if table is None:
+        with _arrow_input(file_path, member) as source:
+            table = pyarrow.csv.read_csv(source, parse_options=parse_options)
+    _csv_schemas[key] = table.schema
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _schema_key(file_path: str, member: Optional[str] = None) -> str:
+    key = os.path.abspath(file_path)
+    return key if member is None else f"{key}/{member}"
+
+
+def write_file(file_path: str, sheets: Dict[str, pd.DataFrame]) -> List[str]:
+    """
+    Writes one or more sheets to a file in the format given by its extension and returns any warnings.
+
+    CSV and text files hold a single sheet, so only the first one is written. They are compressed while they
+    are written when their name ends with a compression extension, e.g. "out.csv.gz". An existing Excel file is
+    not overwritten; the sheets are written to "<name>_transformed<extension>" instead.
+    """
+    file_name = os.path.basename(file_path)
+    name, extension, compression = split_extension(file_name)
+    warnings = []
+    rows = sum(len(data) for data in sheets.values())
+
+    with performance_log.stage(f"export {file_name}", rows_in=rows) as stage:
+        if extension in (".csv", ".txt"):
+            if len(sheets) > 1:
+                warnings.append(f"The file '{file_name}' contains multiple sheets. "
+                                f"Only the first sheet will be exported as {extension[1:].upper()}.")
+            data = next(iter(sheets.values()))
+            if compression is None:
+                data.to_csv(file_path, sep=_separator(file_name), index=False)
+            else:
+                with open_output(file_path) as file:
+                    data.to_csv(file, sep=_separator(file_name), index=False)
+        elif extension in EXCEL_EXTENSIONS and compression is None:
+            if os.path.exists(file_path):
+                # Create new file with _transformed appended to the name
+                base_name, extension = os.path.splitext(file_path)
+                file_path = f"{base_name}_transformed{extension}"
+            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+                for sheet_name, data in sheets.items():
+                    data.to_excel(writer, sheet_name=sheet_name, index=False)
+        else:
+            raise ValueError(f"The extension '{file_name[len(name):]}' is not supported for export.")
+        stage.rows_out = rows
+
+    return warnings
+
+
+def set_backend(name: str):
+    """
+    Selects the backend for merge, pivot and sort: "pandas", or "polars"/"duckdb" when they are installed.
+    """
+    global execution_backend
+    if name not in backends.available_backends():
+        raise ValueError(f"The backend '{name}' is not available. Available: "
+                         f"{', '.join(backends.available_backends())}.")
+    execution_backend = name
+
+
+def _run_backend(op: str, *args):
+    """
+    Runs an operation on the selected backend. Returns None if pandas has to run it instead, because the backend
+    does not implement it or cannot handle the data.
+    """
+    function = backends.get_operation(execution_backend, op)
+    if function is None:
+        return None
+    with performance_log.stage(execution_backend) as stage:
+        try:
+            return function(*args)
+        except Exception:
+            stage.name = f"{execution_backend} (unsupported, using pandas)"
+            return None
+
+
+def merge(left: pd.DataFrame, right: pd.DataFrame, left_on: str, right_on: str, how: str = "inner") -> pd.DataFrame:
+    with performance_log.stage("merge", rows_in=len(left) + len(right)) as stage:
+        merged_data = _run_backend("merge", left, right, left_on, right_on, how)
+        if merged_data is None:
+            merged_data = pd.merge(left, right, left_on=left_on, right_on=right_on, how=how)
+        stage.rows_out = len(merged_data)
+    return merged_data
+
+
+def append(first: pd.DataFrame, second: pd.DataFrame, direction: str = "vertically") -> pd.DataFrame:
+    with performance_log.stage("append", rows_in=len(first) + len(second)) as stage:
+        if direction == "vertically":
+            appended_data = pd.concat([first, second], ignore_index=True)
+        else:
+            appended_data = pd.concat([first, second], axis=1)
+        stage.rows_out = len(appended_data)
+    return appended_data
+
+
+def pivot(data: pd.DataFrame, columns: str, values: str, index: Optional[str] = None,
+          aggfunc: str = "sum") -> pd.DataFrame:
+    """
+    Pivots the distinct values of a column into new columns. The index defaults to the first column.
+    """
+    with performance_log.stage("pivot", rows_in=len(data)) as stage:
+        index = data.columns[0] if index is None else index
+        pivot_data = _run_backend("pivot", data, columns, values, index, aggfunc)
+        if pivot_data is None:
+            pivot_data = data.pivot_table(index=index, columns=columns, values=values, aggfunc=aggfunc)
+        stage.rows_out = len(pivot_data)
+    return pivot_data
+
+
+def unpivot(data: pd.DataFrame, value_vars: List[str], var_name: str = "Variable",
+            value_name: str = "Value") -> pd.DataFrame:
+    """
+    Turns the given columns into (Variable, Value) rows, keeping all other columns as identifiers.
+    """
+    with performance_log.stage("unpivot", rows_in=len(data)) as stage:
+        id_vars = [col for col in data.columns if col not in value_vars]
+        unpivoted_data = data.melt(id_vars=id_vars, value_vars=value_vars, var_name=var_name, value_name=value_name)
+        stage.rows_out = len(unpivoted_data)
+    return unpivoted_data
+
+
+def sort(data: pd.DataFrame, by: Union[str, List[str]], ascending: Union[bool, List[bool]] = True,
+         order: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """
+    Sorts by one or more columns, each ascending or descending. order is a permutation computed before with
+    sort_order (e.g. by TableRevision.sort_order), in which case only the rows are taken.
+    """
+    with performance_log.stage("sort", rows_in=len(data)) as stage:
+        if order is None:
+            by, ascending = sort_keys(by, ascending)
+            order = sort_order(data[by], ascending)
+        sorted_data = data.iloc[order]
+        stage.rows_out = len(sorted_data)
+    return sorted_data
+
+
+def sort_keys(by: Union[str, List[str]], ascending: Union[bool, List[bool]] = True) -> Tuple[List, List[bool]]:
+    """
+    Normalizes sort arguments to a list of columns and a direction per column.
+    """
+    by = list(by) if isinstance(by, (list, tuple)) else [by]
+    ascending = list(ascending) if isinstance(ascending, (list, tuple)) else [ascending] * len(by)
+    if len(ascending) != len(by):
+        raise ValueError("Sort needs one direction per column.")
+    return by, [bool(direction) for direction in ascending]
+
+
+def sort_ranks(column: pd.Series) -> Tuple[np.ndarray, int]:
+    """
+    Returns the rank of every value among the distinct values of the column (-1 for missing values) and the number
+    of distinct values. Ranks sort like the values, so they can be reused for any direction and combination of keys.
+    """
+    codes, uniques = pd.factorize(column, sort=True)
+    return codes.astype(np.int64, copy=False), len(uniques)
+
+
+def sort_order(keys: Union[pd.Series, pd.DataFrame], ascending: Union[bool, List[bool]] = True,
+               ranks: Optional[Dict] = None) -> np.ndarray:
+    """
+    Returns the positions that sort the rows by the key columns, stable and with missing values last, as
+    sort_values does. ranks caches sort_ranks by column name between calls on the same data.
+    """
+    if isinstance(keys, pd.Series):
+        keys = keys.to_frame()
+    ascending = ascending if isinstance(ascending, list) else [ascending] * keys.shape[1]
+
+    order = _run_backend("sort_order", keys, ascending)
+    if order is not None:
+        return order
+
+    sortable = []
+    for position, direction in enumerate(ascending):
+        name = keys.columns[position]
+        if ranks is not None and name in ranks:
+            codes, count = ranks[name]
+        else:
+            codes, count = sort_ranks(keys.iloc[:, position])
+            if ranks is not None:
+                ranks[name] = (codes, count)
+        sortable.append(np.where(codes < 0, count, codes if direction else count - 1 - codes))
+    # lexsort is stable and sorts by the last key first
+    return np.lexsort(sortable[::-1])
+
+
+def sample_positions(rows: int, size: int = SAMPLE_ROWS, seed: int = 0) -> np.ndarray:
+    """
+    Returns the positions of a uniform random sample of size rows out of rows, without replacement and in row
+    order. The same seed gives the same sample, so a table keeps its sample between views.
+    """
+    if rows <= size:
+        return np.arange(rows)
+    return np.sort(np.random.default_rng(seed).choice(rows, size=size, replace=False))
+
+
+def join_sizes(left_index: KeyIndex, right_index: KeyIndex) -> Dict:
+    """
+    Returns the row counts that make up merge results of two key columns, from their KeyIndexes: "matched", the
+    rows of the inner join, and "left_unmatched" / "right_unmatched", the rows of each table without a match.
+    "estimated" is True if the left column has more than JOIN_SIZE_EXACT_KEYS distinct values, in which case
+    only its JOIN_SIZE_FREQUENT_KEYS most frequent values are counted exactly and a sample of the others is
+    scaled up.
+    """
+    keys, counts = left_index.values, left_index.row_counts
+    estimated = len(keys) > JOIN_SIZE_EXACT_KEYS
+    weights = np.ones(len(keys))
+    if estimated:
+        frequent = np.argpartition(counts, -JOIN_SIZE_FREQUENT_KEYS)[-JOIN_SIZE_FREQUENT_KEYS:]
+        others = np.setdiff1d(np.arange(len(keys)), frequent)
+        sampled = others[sample_positions(len(others), JOIN_SIZE_EXACT_KEYS - JOIN_SIZE_FREQUENT_KEYS)]
+        picked = np.concatenate([frequent, sampled])
+        weights = np.concatenate([np.ones(len(frequent)), np.full(len(sampled), len(others) / len(sampled))])
+        keys, counts = keys[picked], counts[picked]
+    right_counts = right_index.counts(keys)
+    left_matched = float(np.sum(weights * counts * (right_counts > 0)))
+    right_matched = float(np.sum(weights * right_counts))
+    return {
+        "matched": int(round(np.sum(weights * counts * right_counts))),
+        "left_unmatched": int(round(len(left_index.order) - left_matched)),
+        "right_unmatched": max(int(round(len(right_index.order) - right_matched)), 0),
+        "left_match_rate": left_matched / len(left_index.order) if len(left_index.order) else 0.0,
+        "right_match_rate": min(right_matched / len(right_index.order), 1.0) if len(right_index.order) else 0.0,
+        "estimated": estimated,
+    }
+
+
+def join_preview(left: pd.DataFrame, right: pd.DataFrame, left_on: str, right_on: str, how: str = "inner",
+                 left_index: Optional[KeyIndex] = None, right_index: Optional[KeyIndex] = None,
+                 sizes: Optional[Dict] = None, sample: int = JOIN_PREVIEW_SAMPLE,
+                 rows: int = JOIN_PREVIEW_ROWS) -> Dict:
+    """
+    Previews merge(left, right, left_on, right_on, how) without running the merge. Returns join_sizes with:
+
+    - rows: the number of rows of the result
+    - preview: the first joined rows of a sample of the rows, with the columns merge would return
+
+    The sampled rows of the left table (the right table for right joins) are looked up in the KeyIndex of the
+    other table. Pass the indexes and the join_sizes of the key columns to reuse them between previews, e.g.
+    when only the join type changes; they are computed here otherwise.
+    """
+    if how not in JOIN_TYPES:
+        raise ValueError(f"Unknown join type '{how}'. Expected one of {', '.join(JOIN_TYPES)}.")
+    left_index = left_index or KeyIndex(left[left_on])
+    right_index = right_index or KeyIndex(right[right_on])
+    result = dict(sizes or join_sizes(left_index, right_index))
+    result["rows"] = result["matched"] + {
+        "inner": 0,
+        "left": result["left_unmatched"],
+        "right": result["right_unmatched"],
+        "outer": result["left_unmatched"] + result["right_unmatched"],
+    }[how]
+
+    if how == "right":
+        right_sample = sample_positions(len(right), sample)
+        right_positions, left_positions = _probe(left_index, right_sample,
+                                                 left_index.lookup(right[right_on].iloc[right_sample]), True, rows)
+    else:
+        left_sample = sample_positions(len(left), sample)
+        left_positions, right_positions = _probe(right_index, left_sample,
+                                                 right_index.lookup(left[left_on].iloc[left_sample]),
+                                                 how != "inner", rows)
+    result["preview"] = _assemble_preview(left, right, left_on, right_on, left_positions, right_positions)
+    return result
+
+
+def _probe(index: KeyIndex, sample: np.ndarray, codes: np.ndarray, keep_unmatched: bool,
+           rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Pairs (sampled row, matching row of the other table) in sample order, until there are enough rows
+    probe_positions, found_positions = [], []
+    for position, code in zip(sample, codes):
+        if len(probe_positions) >= rows:
+            break
+        if code >= 0:
+            matches = index.rows(code)[:rows - len(probe_positions)]
+            probe_positions.extend([position] * len(matches))
+            found_positions.extend(matches)
+        elif keep_unmatched:
+            probe_positions.append(position)
+            found_positions.append(-1)
+    return np.array(probe_positions, dtype=np.int64), np.array(found_positions, dtype=np.int64)
+
+
+def _assemble_preview(left: pd.DataFrame, right: pd.DataFrame, left_on: str, right_on: str,
+                      left_positions: np.ndarray, right_positions: np.ndarray) -> pd.DataFrame:
+    # Only the previewed rows are taken from the tables, assemble_merge then works on those few rows
+    parts = []
+    for data, positions in ((left, left_positions), (right, right_positions)):
+        present = np.flatnonzero(positions >= 0)
+        local = np.full(len(positions), -1, dtype=np.int64)
+        local[present] = np.arange(len(present))
+        parts.append((data.iloc[positions[present]], local))
+    (left_rows, left_local), (right_rows, right_local) = parts
+    return backends.assemble_merge(left_rows, right_rows, left_on, right_on, left_local, right_local)
+
+
+def profile_column(column: pd.Series, top: int = PROFILE_TOP_VALUES) -> Dict:
+    """
+    Returns the dtype, row count, null count, distinct count, min, max and most frequent values of a column.
+
+    The distinct count and the top values come from a single value_counts. Columns with more than
+    PROFILE_EXACT_ROWS values instead get a HyperLogLog estimate of the distinct count and the top values of a
+    sample, with their counts scaled up; "estimated" is True for those.
+    """
+    values = column.dropna()
+    estimated = len(values) > PROFILE_EXACT_ROWS
+    if estimated:
+        distinct = hyperloglog_count(pd.util.hash_pandas_object(values, index=False).to_numpy())
+        counts = values.sample(PROFILE_SAMPLE_ROWS, random_state=0).value_counts()
+        scale = len(values) / PROFILE_SAMPLE_ROWS
+    else:
+        counts = values.value_counts()
+        distinct = len(counts)
+        scale = 1
+    minimum, maximum = _min_max(values)
+    return {
+        "dtype": str(column.dtype),
+        "rows": len(column),
+        "nulls": len(column) - len(values),
+        "distinct": distinct,
+        "estimated": estimated,
+        "min": minimum,
+        "max": maximum,
+        "top": [(value, int(round(count * scale))) for value, count in counts.head(top).items()],
+    }
+
+
+def _min_max(values: pd.Series) -> Tuple:
+    if values.empty:
+        return None, None
+    try:
+        return values.min(), values.max()
+    except TypeError:
+        # Mixed types, e.g. numbers and text in one column, have no order
+        return None, None
+
+
+def hyperloglog_count(hashes: np.ndarray, precision: int = 14) -> int:
+    """
+    Estimates the number of distinct values from their 64-bit hashes with HyperLogLog, using 2 ** precision
+    registers (16 KB and about 1% error for the default precision) however many values there are.
+    """
+    registers_count = 1 << precision
+    hashes = hashes.astype(np.uint64, copy=False)
+    # The first bits pick the register, the position of the first 1 bit in the rest is the rank
+    registers_index = (hashes >> np.uint64(64 - precision)).astype(np.intp)
+    rest = (hashes << np.uint64(precision)).astype(np.float64)
+    ranks = np.where(rest > 0, 65 - np.frexp(rest)[1], 64 - precision + 1).astype(np.uint8)
+    registers = np.zeros(registers_count, dtype=np.uint8)
+    np.maximum.at(registers, registers_index, ranks)
+
+    alpha = 0.7213 / (1 + 1.079 / registers_count)
+    estimate = alpha * registers_count ** 2 / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    empty = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * registers_count and empty:
+        # Few values: linear counting of the empty registers is more accurate
+        estimate = registers_count * np.log(registers_count / empty)
+    return int(round(estimate))
+
+
+def row_hashes(data: pd.DataFrame) -> np.ndarray:
+    """
+    Returns a 64-bit hash of the values of every row. Numeric columns are hashed as floats, so a column read as
+    integers once and as floats the next time (when it has a missing value) gives the same hashes for its rows.
+    """
+    if not len(data.columns):
+        return np.zeros(len(data), dtype=np.uint64)
+    columns = {position: _hashable(column) for position, (_, column) in enumerate(data.items())}
+    return pd.util.hash_pandas_object(pd.DataFrame(columns, copy=False), index=False).to_numpy()
+
+
+def _hashable(column: pd.Series) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+        return column.astype("float64")
+    return column
+
+
+def diff_rows(old_hashes: np.ndarray, new_hashes: np.ndarray) -> Dict:
+    """
+    Compares two versions of a table by their row hashes (row_hashes). Rows are matched by content, the n-th copy
+    of a row with its n-th copy, so rows that only moved are unchanged. Unmatched old and new rows between the
+    same matched rows are paired up as changed rows; the others are deleted and inserted rows.
+
+    Returns the positions of the deleted rows in the old version ("deleted"), of the inserted rows in the new
+    version ("inserted"), of the changed rows in both ("changed_old", "changed_new"), and the number of
+    unchanged rows ("unchanged").
+    """
+    old_keys, new_keys = _occurrence_keys(old_hashes), _occurrence_keys(new_hashes)
+    old_matched = pd.Index(old_keys).isin(new_keys)
+    new_matched = pd.Index(new_keys).isin(old_keys)
+    # The number of matched rows before an unmatched row identifies the gap it is in, in either version
+    old_rows = pd.DataFrame({"gap": np.cumsum(old_matched)[~old_matched], "old": np.flatnonzero(~old_matched)})
+    new_rows = pd.DataFrame({"gap": np.cumsum(new_matched)[~new_matched], "new": np.flatnonzero(~new_matched)})
+    old_rows["rank"] = old_rows.groupby("gap").cumcount()
+    new_rows["rank"] = new_rows.groupby("gap").cumcount()
+    changed = old_rows.merge(new_rows, on=["gap", "rank"])
+    return {
+        "deleted": np.setdiff1d(old_rows["old"].to_numpy(), changed["old"].to_numpy()),
+        "inserted": np.setdiff1d(new_rows["new"].to_numpy(), changed["new"].to_numpy()),
+        "changed_old": changed["old"].to_numpy(),
+        "changed_new": changed["new"].to_numpy(),
+        "unchanged": int(old_matched.sum()),
+    }
+
+
+def _occurrence_keys(hashes: np.ndarray) -> np.ndarray:
+    # Makes the hashes of repeated rows distinct: the n-th copy of a row gets its hash mixed with n
+    return hashes + _occurrences(hashes).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+
+
+def _occurrences(values: np.ndarray) -> np.ndarray:
+    # The number of earlier copies of each value. Only repeated values are numbered, most columns have few
+    occurrences = np.zeros(len(values), dtype=np.int64)
+    repeated = pd.Series(values).duplicated(keep=False).to_numpy()
+    if repeated.any():
+        occurrences[repeated] = pd.Series(values[repeated]).groupby(values[repeated]).cumcount().to_numpy()
+    return occurrences
+
+
+def diff_tables(old: pd.DataFrame, new: pd.DataFrame, key=None, match_rows: bool = False,
+                old_index: Optional[KeyIndex] = None) -> Dict:
+    """
+    Compares two tables, e.g. two revisions of a table, and returns the rows that were added, removed or modified.
+
+    Rows are aligned on a key column (the n-th row with a key in old with the n-th row with that key in new), by
+    content with diff_rows when match_rows is set, or else by row position. The cells of the aligned rows are
+    compared by their hashes, one column at a time. Returns a dict with:
+
+    - table: the added, modified and removed rows, with their change, their row numbers in old and new, the
+      names of their changed columns, and their values (the new values for modified rows)
+    - old_rows, new_rows: the positions of the rows of table in old and new, -1 where a row is not in one of them
+    - changed: whether each data cell of table changed, by row and by column after the DIFF_COLUMNS
+    - added, removed, modified, unchanged: the number of rows of each kind
+    - added_columns, removed_columns: the columns only new or only old has, which are not compared
+
+    Pass the KeyIndex of the key column of old to reuse it, see TableRevision.key_index.
+    """
+    compared = [column for column in old.columns if column in new.columns]
+    with performance_log.stage("align rows", rows_in=len(old) + len(new)):
+        if key is not None:
+            old_index = old_index or KeyIndex(old[key])
+            codes = old_index.lookup(new[key])
+            # The n-th new row with a key is aligned with the n-th old row with it
+            occurrences = _occurrences(codes)
+            found = codes >= 0
+            found[found] = occurrences[found] < old_index.row_counts[codes[found]]
+            new_positions = np.flatnonzero(found)
+            old_positions = old_index.order[old_index.starts[codes[found]] + occurrences[found]]
+            old_aligned = np.zeros(len(old), dtype=bool)
+            old_aligned[old_positions] = True
+            removed, added, unchanged = np.flatnonzero(~old_aligned), np.flatnonzero(~found), None
+        elif match_rows:
+            # Only the rows diff_rows pairs up as changed are compared, the matched rows are equal
+            rows = diff_rows(row_hashes(old[compared]), row_hashes(new[compared]))
+            old_positions, new_positions = rows["changed_old"], rows["changed_new"]
+            removed, added, unchanged = rows["deleted"], rows["inserted"], rows["unchanged"]
+        else:
+            old_positions = new_positions = np.arange(min(len(old), len(new)))
+            removed, added, unchanged = np.arange(len(new), len(old)), np.arange(len(old), len(new)), None
+
+    with performance_log.stage("compare cells", rows_in=len(old_positions)):
+        cells = np.zeros((len(old_positions), len(compared)), dtype=bool)
+        for position, column in enumerate(compared):
+            old_hashes = pd.util.hash_pandas_object(_hashable(old[column].iloc[old_positions]), index=False)
+            new_hashes = pd.util.hash_pandas_object(_hashable(new[column].iloc[new_positions]), index=False)
+            cells[:, position] = old_hashes.to_numpy() != new_hashes.to_numpy()
+        modified = cells.any(axis=1)
+    if unchanged is None:
+        unchanged = int((~modified).sum())
+
+    # The modified and added rows in the order of new, each removed row before the row that took its place
+    old_rows = np.concatenate([old_positions[modified], np.full(len(added), -1), removed])
+    new_rows = np.concatenate([new_positions[modified], added, np.full(len(removed), -1)])
+    order = np.lexsort((new_rows >= 0, np.where(new_rows >= 0, new_rows, old_rows)))
+    old_rows, new_rows = old_rows[order], new_rows[order]
+    cells = np.concatenate([cells[modified], np.zeros((len(added) + len(removed), len(compared)), dtype=bool)])[order]
+
+    columns = list(new.columns) + [column for column in old.columns if column not in new.columns]
+    in_new = new_rows >= 0
+    data = pd.concat([new.iloc[new_rows[in_new]], old.iloc[old_rows[~in_new]]]).reindex(columns=columns)
+    data = data.iloc[np.argsort(np.concatenate([np.flatnonzero(in_new), np.flatnonzero(~in_new)]), kind="stable")]
+    data = data.reset_index(drop=True)
+    both = in_new & (old_rows >= 0)
+    for column in columns[len(new.columns):]:
+        data.loc[both, column] = old[column].iloc[old_rows[both]].to_numpy()
+    changed = np.zeros((len(data), len(columns)), dtype=bool)
+    changed[:, [columns.index(column) for column in compared]] = cells
+
+    changed_columns = pd.Series("", index=data.index)
+    for position in np.flatnonzero(changed.any(axis=0)):
+        changed_columns = changed_columns.where(~changed[:, position], changed_columns + ", " + str(columns[position]))
+    names = unique_columns([str(column) for column in columns] + DIFF_COLUMNS)[len(columns):]
+    meta = pd.DataFrame({
+        names[0]: np.where(old_rows < 0, "added", np.where(in_new, "modified", "removed")),
+        names[1]: pd.Series(old_rows + 1, dtype="Int64").mask(old_rows < 0),
+        names[2]: pd.Series(new_rows + 1, dtype="Int64").mask(~in_new),
+        names[3]: changed_columns.str.slice(2),
+    })
+    return {
+        "table": pd.concat([meta, data], axis=1),
+        "old_rows": old_rows,
+        "new_rows": new_rows,
+        "changed": changed,
+        "added": len(added),
+        "removed": len(removed),
+        "modified": int(modified.sum()),
+        "unchanged": unchanged,
+        "added_columns": [column for column in new.columns if column not in old.columns],
+        "removed_columns": [column for column in old.columns if column not in new.columns],
+    }
+
+
+def delete_rows(data: pd.DataFrame, positions: Iterable[int]) -> pd.DataFrame:
+    keep = np.ones(len(data), dtype=bool)
+    keep[list(positions)] = False
+    return data.iloc[keep]
+
+
+def delete_columns(data: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+    return data.drop(columns=list(columns))
+
+
+def insert_row(data: pd.DataFrame, position: int) -> pd.DataFrame:
+    new_row = pd.DataFrame({column: "" for column in data.columns}, index=[position])
+    return pd.concat([data.iloc[:position], new_row, data.iloc[position:]], ignore_index=True)
+
+
+def insert_column(data: pd.DataFrame, position: int, name: str, value="") -> pd.DataFrame:
+    data = data.copy()
+    data.insert(position, name, value)
+    return data
+
+
+def rename_column(data: pd.DataFrame, old_name: str, new_name: str) -> pd.DataFrame:
+    return data.rename(columns={old_name: new_name})
+
+
+def set_cells(data: pd.DataFrame, cells: Dict[str, Tuple[np.ndarray, List]]) -> pd.DataFrame:
+    """
+    Sets cells given as {column: (row positions, values)}, one vectorized assignment per column. Only the edited
+    columns are copied, the others are shared with data. A column whose type cannot hold the new values, e.g. a
+    decimal in a column of integers, is converted to a type that holds both.
+    """
+    data = data.copy(deep=False)
+    for name, (positions, values) in cells.items():
+        column, values = data[name], pd.Series(values)
+        if isinstance(column.dtype, np.dtype) and column.dtype.kind in "iuf" and values.dtype.kind in "iuf":
+            column = column.astype(np.result_type(column.dtype, values.dtype))
+        elif isinstance(column.dtype, np.dtype) and column.dtype.kind in "biufmM" and values.dtype.kind == "O":
+            # Text, or missing values in a column of True/False values
+            column = column.astype(object)
+        else:
+            column = column.copy()
+        try:
+            column.iloc[positions] = values.to_numpy()
+        except (TypeError, ValueError):
+            # e.g. a new category in a categorical column
+            column = column.astype(object)
+            column.iloc[positions] = values.to_numpy()
+        data[name] = column
+    return data
+
+
+def parse_cell(column: pd.Series, text: str):
+    """
+    Converts text entered in a cell to a value of the column's type. Empty text is a missing value. Raises
+    ValueError if the text is not a number, a date or True/False in a column of that type.
+    """
+    values, failed = parse_cells(column, pd.Series([text], dtype=object))
+    if failed[0]:
+        raise ValueError(f"{column.name} holds {CELL_TYPES[_cell_type(column.dtype)]}, not {text.strip()!r}.")
+    return values.iloc[0]
+
+
+def parse_cells(column: pd.Series, texts: pd.Series) -> Tuple[pd.Series, np.ndarray]:
+    """
+    Converts texts to values of the column's type, see parse_cell, and returns them with a mask of the texts that
+    are not values of that type. Those are kept as text.
+    """
+    cell_type = _cell_type(column.dtype)
+    if cell_type is None:
+        return texts, np.zeros(len(texts), dtype=bool)
+    stripped = texts.str.strip()
+    if cell_type == "bool":
+        values = stripped.str.lower().map({"true": True, "false": False, "1": True, "0": False})
+    elif cell_type == "number":
+        values = pd.to_numeric(stripped, errors="coerce")
+    else:
+        values = pd.to_datetime(stripped, format="mixed", errors="coerce")
+    failed = (values.isna() & stripped.ne("")).to_numpy()
+    if failed.any():
+        values = values.astype(object).where(~failed, texts)
+    return values, failed
+
+
+def _cell_type(dtype) -> Optional[str]:
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "number"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "date"
+    return None
+
+
+def compute_columns(data: pd.DataFrame, formulas: List[Tuple[str, str]], position: Optional[int] = None,
+                    recalculated: Optional[List[Tuple[str, str]]] = None) -> pd.DataFrame:
+    """
+    Evaluates (column, expression) formulas in order with DataFrame.eval, on whole columns at once (with numexpr
+    when it is installed), and stores each result in its column. Expressions refer to columns by name, in
+    backticks for names that are not identifiers, e.g. "Price * `Units Sold`". Columns that do not exist yet are
+    inserted at position, at the end by default. Raises pandas' UndefinedVariableError if an expression uses a
+    column the data does not have.
+
+    The recalculated formulas, of existing computed columns (see update_formulas), are evaluated after them. One
+    whose expression uses a column the data no longer has is skipped instead, so the column keeps its values.
+    """
+    data = data.copy(deep=False)
+    recalculated = recalculated or []
+    for number, (name, expression) in enumerate(formulas + recalculated):
+        try:
+            values = evaluate_formula(data, name, expression)
+        except pd.errors.UndefinedVariableError:
+            if number < len(formulas):
+                raise
+            continue
+        if name in data.columns:
+            data[name] = values
+        else:
+            data.insert(len(data.columns) if position is None else position, name, values)
+    return data
+
+
+def evaluate_formula(data: pd.DataFrame, name: str, expression: str):
+    """ Returns the values of the expression for every row of data, or a single value for all rows """
+    values = data.eval(expression)
+    if isinstance(values, pd.DataFrame):
+        raise ValueError(f"The expression of {name} has to give one value per row: {expression}")
+    return values
+
+
+# The names of a formula, in backticks or not, and its strings, which may hold the same text
+_FORMULA_TOKEN = re.compile(r"`([^`]*)`|'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|(?<![\w.])([A-Za-z_]\w*)")
+
+
+def formula_columns(expression: str) -> set:
+    """ Returns the names an expression refers to: the names in backticks and the identifiers outside strings """
+    names = set(re.findall(r"`([^`]*)`", expression))
+    names.update(re.findall(r"[A-Za-z_]\w*", re.sub(r"`[^`]*`|'[^']*'|\"[^\"]*\"", " ", expression)))
+    return names
+
+
+def define_formula(formulas: Dict[str, str], name: str, expression: str) -> Dict[str, str]:
+    """
+    Returns the formulas with name computed from the expression. Raises ValueError if the expression depends on
+    name, directly or through other computed columns.
+    """
+    formulas = dict(formulas)
+    formulas[name] = expression
+    if name in _formula_inputs(formulas, formula_columns(expression)):
+        raise ValueError(f"The expression of {name} depends on {name} itself.")
+    return formulas
+
+
+def _formula_inputs(formulas: Dict[str, str], names: set) -> set:
+    # The names and, through the computed columns among them, every name they are computed from
+    inputs, pending = set(), list(names)
+    while pending:
+        name = pending.pop()
+        if name not in inputs:
+            inputs.add(name)
+            if name in formulas:
+                pending.extend(formula_columns(formulas[name]))
+    return inputs
+
+
+def dependent_formulas(formulas: Dict[str, str], columns: Iterable) -> List[Tuple[str, str]]:
+    """
+    Returns the formulas of the computed columns that depend on the columns, directly or through other
+    computed columns, in an order in which each comes after the computed columns it uses.
+    """
+    changed = set(columns)
+    dependents = [name for name, expression in formulas.items()
+                  if name not in changed and _formula_inputs(formulas, formula_columns(expression)) & changed]
+    return _formula_order(formulas, dependents)
+
+
+def _formula_order(formulas: Dict[str, str], names: Iterable[str]) -> List[Tuple[str, str]]:
+    # Depth-first, each formula after the formulas among names that it uses
+    names, ordered, visited = set(names), {}, set()
+
+    def visit(name):
+        if name in visited:
+            return
+        visited.add(name)
+        for column in formula_columns(formulas[name]):
+            if column in names:
+                visit(column)
+        ordered[name] = formulas[name]
+
+    for name in formulas:
+        if name in names:
+            visit(name)
+    return list(ordered.items())
+
+
+def update_formulas(formulas: Dict[str, str], op: str, params: Dict) -> Tuple[Dict[str, str], List[Tuple[str, str]]]:
+    """
+    Returns the formulas after an operation and the formulas to recalculate, in order, because the operation
+    changed the columns they depend on:
+
+    - rename_column: the expressions refer to the new name; nothing is recalculated
+    - delete_columns: computed columns that depended on a deleted column keep their values as plain columns
+    - append (vertically) and insert_row: the new rows are computed, so every formula is recalculated
+    - set_cells: the computed columns that depend on an edited column are recalculated; edited computed columns
+      keep their values as plain columns, so that a recalculation does not overwrite the edits
+    - pivot and unpivot: the columns are reshaped, so the computed columns become plain columns
+
+    Row selections and orderings (filter, sort, delete_rows) move computed values with their rows.
+    """
+    if not formulas:
+        return formulas, []
+    if op == "rename_column":
+        old_name, new_name = params["old_name"], params["new_name"]
+        reference = new_name if re.fullmatch(r"[A-Za-z_]\w*", str(new_name)) else f"`{new_name}`"
+
+        def rename(match):
+            # Strings are matched only to be left as they are; attributes (.str) are not names
+            name = match.group(1) if match.group(1) is not None else match.group(2)
+            return reference if name is not None and name == str(old_name) else match.group(0)
+
+        return {new_name if name == old_name else name: re.sub(_FORMULA_TOKEN, rename, expression)
+                for name, expression in formulas.items()}, []
+    if op == "delete_columns":
+        deleted = set(params["columns"])
+        return {name: expression for name, expression in formulas.items()
+                if name not in deleted and not _formula_inputs(formulas, formula_columns(expression)) & deleted}, []
+    if (op == "append" and params.get("direction", "vertically") == "vertically") or op == "insert_row":
+        return formulas, _formula_order(formulas, formulas)
+    if op == "set_cells":
+        formulas = {name: expression for name, expression in formulas.items() if name not in params["cells"]}
+        return formulas, dependent_formulas(formulas, params["cells"])
+    if op in ("pivot", "unpivot"):
+        return {}, []
+    return formulas, []
+
+
+def filter_mask(column: pd.Series, text: str, match_case: bool = False, whole_word: bool = False,
+                starts_with: bool = False) -> np.ndarray:
+    """
+    Returns a boolean mask of the cells in the column whose text matches the filter text.
+
+    Cells are compared as they are displayed (str of the value). Whole word takes precedence over starts with.
+    """
+    with performance_log.stage("filter", rows_in=len(column)) as stage:
+        values = column.map(str)
+        if not match_case:
+            values = values.str.lower()
+            text = text.lower()
+        if whole_word:
+            mask = values == text
+        elif starts_with:
+            mask = values.str.startswith(text)
+        else:
+            mask = values.str.contains(text, regex=False)
+        mask = mask.to_numpy(dtype=bool)
+        stage.rows_out = int(mask.sum())
+    return mask
+
+
+def filter_rows(data: pd.DataFrame, column: str, text: str, match_case: bool = False, whole_word: bool = False,
+                starts_with: bool = False) -> pd.DataFrame:
+    """
+    Keeps the rows whose value in the column matches the filter text, see filter_mask.
+    """
+    return data[filter_mask(data[column], text, match_case, whole_word, starts_with)]
+
+
+def find_pattern(text: str, match_case: bool = False, whole_word: bool = False, starts_with: bool = False,
+                 regex: bool = False) -> re.Pattern:
+    """
+    Compiles the text to find, with the options of the filter: whole_word matches the entire cell and takes
+    precedence over starts_with. Raises re.error if regex is set and the text is not a valid regular expression.
+    """
+    pattern = text if regex else re.escape(text)
+    if whole_word:
+        # \Z rather than $, which also matches before a newline at the end of the cell
+        pattern = f"^(?:{pattern})\\Z"
+    elif starts_with:
+        pattern = f"^(?:{pattern})"
+    return re.compile(pattern, 0 if match_case else re.IGNORECASE)
+
+
+def match_mask(column: pd.Series, text: str, match_case: bool = False, whole_word: bool = False,
+               starts_with: bool = False, regex: bool = False) -> np.ndarray:
+    """
+    Returns a boolean mask of the cells whose text (str of the value) contains a match of the text to find, see
+    find_pattern. Missing values never match.
+
+    With pyarrow, plain text is searched with Arrow's multi-threaded string kernels. Regular expressions are
+    always matched with Python's re, which also counts and replaces the matches: Arrow's regex syntax (RE2)
+    differs from it, e.g. its \\w only matches ASCII letters.
+    """
+    present = column.notna().to_numpy()
+    if pyarrow is not None and not regex:
+        texts = _arrow_texts(column)
+        if whole_word:
+            mask = pyarrow.compute.equal(texts if match_case else pyarrow.compute.utf8_lower(texts),
+                                         text if match_case else text.lower())
+        elif starts_with:
+            mask = pyarrow.compute.starts_with(texts, text, ignore_case=not match_case)
+        else:
+            mask = pyarrow.compute.match_substring(texts, text, ignore_case=not match_case)
+        return mask.fill_null(False).to_numpy(zero_copy_only=False) & present
+    pattern = find_pattern(text, match_case, whole_word, starts_with, regex)
+    texts = _cell_texts(column)
+    return np.fromiter((pattern.search(text) is not None for text in texts), dtype=bool, count=len(texts)) & present
+
+
+def _cell_texts(column: pd.Series) -> pd.Series:
+    # The text of each cell as the table shows it (str of the value), as in filter_mask. astype(str) gives the
+    # same text for integers and True/False values, faster, but not for dates: 2020-01-01 rather than
+    # 2020-01-01 00:00:00
+    if column.dtype == bool or (pd.api.types.is_integer_dtype(column.dtype) and isinstance(column.dtype, np.dtype)):
+        return column.astype(str)
+    return column.map(str)
+
+
+def _arrow_texts(column: pd.Series) -> "pyarrow.Array":
+    # The text of each cell as str() gives it, converted by Arrow where its text is the same
+    if pd.api.types.is_string_dtype(column.dtype) and column.dtype != object:
+        return pyarrow.array(column)
+    if pd.api.types.is_integer_dtype(column.dtype):
+        return pyarrow.compute.cast(pyarrow.array(column), pyarrow.string())
+    return pyarrow.array(_cell_texts(column).to_numpy(dtype=object), type=pyarrow.string())
+
+
+def find_replace(data: pd.DataFrame, text: str, replacement: str, columns: Optional[Iterable] = None,
+                 match_case: bool = False, whole_word: bool = False, starts_with: bool = False, regex: bool = False,
+                 cancelled: Optional[Callable[[], bool]] = None) -> Tuple[Dict[str, tuple], int]:
+    """
+    Replaces the matches of the text to find (see find_pattern) in the columns, all columns by default. Returns
+    the cells whose value changes as {column: (row positions, values)}, to be added with set_cells, and the
+    number of matches.
+
+    Only the cells that match are replaced, on their text. With regex, replacement may refer to groups of the
+    pattern (\\1, \\g<name>). Replaced text in a column of numbers, dates or True/False values is converted
+    back to that type where it can be, see parse_cells.
+
+    cancelled is called before each column; once it returns True, the cells and matches found so far are returned.
+    """
+    cells, matches = {}, 0
+    pattern = find_pattern(text, match_case, whole_word, starts_with, regex)
+    repl = replacement if regex else (lambda match: replacement)
+    for name in data.columns if columns is None else columns:
+        if cancelled is not None and cancelled():
+            break
+        column = data[name]
+        positions = np.flatnonzero(match_mask(column, text, match_case, whole_word, starts_with, regex))
+        if not len(positions):
+            continue
+        old_texts = _cell_texts(column.iloc[positions]).astype(object)
+        matches += int(old_texts.str.count(pattern).sum())
+        new_texts = old_texts.str.replace(pattern, repl, regex=True)
+        changed = (new_texts != old_texts).to_numpy()
+        if changed.any():
+            values, _ = parse_cells(column, new_texts[changed])
+            cells[name] = (positions[changed], values.to_numpy())
+    return cells, matches
+
+
+class QueryResult:
+    """
+    A SQL query over the tables of a TableStore, whose result is fetched page by page.
+
+    Every table the query mentions is exposed as a relation of the same name (quote names with spaces, e.g.
+    SELECT * FROM "sales - Sheet1"). DuckDB scans the DataFrames in place when it is installed; otherwise the
+    tables are copied into an in-memory sqlite3 database.
+
+    Functions:
+    - __init__: Registers the tables used by the query and runs it.
+    - fetch: Returns the next page of the result.
+    - fetch_all: Returns all rows that have not been fetched yet.
+    - close: Closes the connection.
+    """
+
+    def __init__(self, sql: str, tables: Dict[str, TableRevision], page_size: int = 1000):
+        self.sql = sql
+        self.page_size = page_size
+        self.engine_name = "DuckDB" if duckdb is not None else "SQLite"
+        self.rows_fetched = 0
+        self.exhausted = False
+
+        with performance_log.stage(f"query ({self.engine_name})", rows_in=0) as stage:
+            self.connection = duckdb.connect() if duckdb is not None else sqlite3.connect(":memory:")
+            try:
+                for name in referenced_tables(sql, tables):
+                    data = tables[name].get_data()
+                    stage.rows_in += len(data)
+                    if duckdb is not None:
+                        self.connection.register(name, data)
+                    else:
+                        data.to_sql(name, self.connection, index=False)
+                # Tables registered with DuckDB are only visible to the connection itself, not to its cursors
+                self.cursor = self.connection if duckdb is not None else self.connection.cursor()
+                self.cursor.execute(sql)
+            except Exception:
+                self.connection.close()
+                raise
+
+        # Statements like CREATE VIEW have no result rows
+        self.columns = unique_columns([column[0] for column in self.cursor.description or []])
+        self.exhausted = not self.columns
+        self._source_done = self.exhausted
+        # Rows fetched from the database that were not returned yet, DuckDB hands them out in fixed-size chunks
+        self._buffer: List[pd.DataFrame] = []
+
+    def fetch(self, rows: Optional[int] = None) -> pd.DataFrame:
+        rows = rows or self.page_size
+        while sum(len(chunk) for chunk in self._buffer) < rows and not self._source_done:
+            if duckdb is not None:
+                chunk = self.cursor.fetch_df_chunk()
+                chunk.columns = self.columns
+            else:
+                chunk = pd.DataFrame.from_records(self.cursor.fetchmany(rows), columns=self.columns)
+            if len(chunk) == 0:
+                self._source_done = True
+            else:
+                self._buffer.append(chunk)
+
+        data = self._take_buffer()
+        page, rest = data.iloc[:rows], data.iloc[rows:]
+        self._buffer = [rest] if len(rest) else []
+        self.rows_fetched += len(page)
+        self.exhausted = self._source_done and not self._buffer
+        return page.reset_index(drop=True)
+
+    def fetch_all(self, chunk_rows: int = 100_000) -> pd.DataFrame:
+        with performance_log.stage("fetch results") as stage:
+            chunks = [self._take_buffer()]
+            if not self._source_done:
+                if duckdb is not None:
+                    chunks.append(self.cursor.fetchdf().set_axis(self.columns, axis=1))
+                else:
+                    records = self.cursor.fetchmany(chunk_rows)
+                    while records:
+                        chunks.append(pd.DataFrame.from_records(records, columns=self.columns))
+                        records = self.cursor.fetchmany(chunk_rows)
+            data = concat_rows(chunks, self.columns)
+            self._buffer = []
+            self._source_done = self.exhausted = True
+            self.rows_fetched += len(data)
+            stage.rows_out = len(data)
+        return data
+
+    def _take_buffer(self) -> pd.DataFrame:
+        return concat_rows(self._buffer, self.columns)
+
+    def close(self):
+        self.connection.close()
+
+
+def unique_columns(columns: List[str]) -> List[str]:
+    """
+    Makes duplicate result column names (e.g. from SELECT a.*, b.*) unique with a _1, _2, ... suffix.
+    """
+    names = []
+    for column in columns:
+        name, number = column, 0
+        while name in names or (number and name in columns):
+            number += 1
+            name = f"{column}_{number}"
+        names.append(name)
+    return names
+
+
+def concat_rows(chunks: List[pd.DataFrame], columns: List[str]) -> pd.DataFrame:
+    """
+    Stacks result chunks, skipping empty ones, which do not have the dtypes of the result.
+    """
+    chunks = [chunk for chunk in chunks if len(chunk)]
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return chunks[0].reset_index(drop=True) if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+
+
+def referenced_tables(sql: str, tables: Iterable[str]) -> List[str]:
+    """
+    Returns the table names that appear in the query as a whole word, so only those are loaded into the database.
+    """
+    return [name for name in tables
+            if re.search(rf"(?<![\w]){re.escape(name)}(?![\w])", sql, flags=re.IGNORECASE)]
+
+
+def run_query(sql: str, tables: Dict[str, TableRevision]) -> pd.DataFrame:
+    """
+    Runs a SQL query over the tables and returns the whole result.
+    """
+    result = QueryResult(sql, tables)
+    try:
+        return result.fetch_all()
+    finally:
+        result.close()
+
+
+OPERATIONS = {
+    "merge": merge,
+    "append": append,
+    "pivot": pivot,
+    "unpivot": unpivot,
+    "sort": sort,
+    "filter": filter_rows,
+    "delete_rows": delete_rows,
+    "delete_columns": delete_columns,
+    "insert_row": insert_row,
+    "insert_column": insert_column,
+    "rename_column": rename_column,
+    "compute_columns": compute_columns,
+    "set_cells": set_cells,
+}
+
+# Operations that only select, reorder or rename rows and columns, and can be fused into one pass
+FUSABLE_OPERATIONS = {"rename_column", "delete_columns", "delete_rows", "sort", "filter"}
+
+
+def materialize(data: Union[pd.DataFrame, PlanNode]) -> pd.DataFrame:
+    """
+    Returns the data of a DataFrame or PlanNode, evaluating the recorded operations of the node and of its
+    ancestors without data in one go. The result is kept on the node.
+    """
+    if isinstance(data, pd.DataFrame):
+        return data
+    if data.result is not None:
+        return data.result
+
+    nodes = []
+    node = data
+    while isinstance(node, PlanNode) and node.result is None:
+        nodes.append(node)
+        node = node.parent
+    base = node if isinstance(node, pd.DataFrame) else node.result
+    steps = [(node.op, node.params) for node in reversed(nodes)]
+
+    with performance_log.stage(f"evaluate {', '.join(op for op, _ in steps)}", rows_in=len(base)) as stage:
+        data.result = evaluate(base, steps)
+        stage.rows_out = len(data.result)
+    return data.result
+
+
+def evaluate(data: pd.DataFrame, steps: List[Tuple[str, Dict]]) -> pd.DataFrame:
+    """
+    Applies (operation, parameters) steps to data.
+
+    Runs of fusable operations are not applied one by one. They only update a row selection (positions into
+    data) and a column selection (output name, source position), which are applied with a single take when an
+    operation that needs the actual data comes up, or at the end.
+    """
+    rows = None
+    columns = None
+    renamed = False
+
+    for op, params in steps:
+        if op not in FUSABLE_OPERATIONS:
+            data = _take(data, rows, columns, renamed)
+            rows, columns, renamed = None, None, False
+            params = {key: materialize(value) if isinstance(value, PlanNode) else value
+                      for key, value in params.items()}
+            data = OPERATIONS[op](data, **params)
+            continue
+
+        if columns is None:
+            columns = [(name, position) for position, name in enumerate(data.columns)]
+
+        if op == "rename_column":
+            columns = [(params["new_name"] if name == params["old_name"] else name, position)
+                       for name, position in columns]
+            renamed = True
+        elif op == "delete_columns":
+            deleted = set(params["columns"])
+            missing = deleted.difference(name for name, _ in columns)
+            if missing:
+                raise KeyError(f"{sorted(missing, key=str)} not found in axis")
+            columns = [(name, position) for name, position in columns if name not in deleted]
+        else:
+            if rows is None:
+                rows = np.arange(len(data))
+            if op == "delete_rows":
+                keep = np.ones(len(rows), dtype=bool)
+                keep[list(params["positions"])] = False
+                rows = rows[keep]
+            else:
+                if op == "sort" and params.get("order") is not None:
+                    # Sorted before (TableRevision.sort), only the permutation is applied
+                    rows = rows[params["order"]]
+                    continue
+                if op == "sort":
+                    key_names, ascending = sort_keys(params["by"], params.get("ascending", True))
+                else:
+                    key_names, ascending = [params["column"]], None
+                positions = []
+                for key_name in key_names:
+                    matches = [position for name, position in columns if name == key_name]
+                    if not matches:
+                        raise KeyError(key_name)
+                    positions.append(matches[0])
+                if op == "sort":
+                    keys = data.iloc[rows, positions].reset_index(drop=True)
+                    with performance_log.stage("sort", rows_in=len(keys)):
+                        rows = rows[sort_order(keys, ascending)]
+                else:
+                    key = data.iloc[rows, positions[0]].reset_index(drop=True)
+                    mask = filter_mask(key, params["text"], params.get("match_case", False),
+                                       params.get("whole_word", False), params.get("starts_with", False))
+                    rows = rows[mask]
+
+    return _take(data, rows, columns, renamed)
+
+
+def _take(data: pd.DataFrame, rows: Optional[np.ndarray], columns: Optional[List[Tuple[str, int]]],
+          renamed: bool) -> pd.DataFrame:
+    """ Applies a row and column selection from evaluate in one pass """
+    if columns is not None and not renamed and [position for _, position in columns] == list(range(data.shape[1])):
+        columns = None
+    if rows is None and columns is None:
+        return data
+
+    with performance_log.stage("take", rows_in=len(data)) as stage:
+        data = data.iloc[slice(None) if rows is None else rows,
+                         slice(None) if columns is None else [position for _, position in columns]]
+        if renamed:
+            data.columns = pd.Index([name for name, _ in columns])
+        stage.rows_out = len(data)
+    return data
@@ -0,0 +1,256 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+
+class StageRecord:
+    """
+    Timing of a single stage (load, parse, merge, populate, ...) inside an operation.
+
+    Stages can be nested, e.g. the item creation inside populate, so each stage keeps its depth.
+    """
+
+    def __init__(self, name: str, depth: int, rows_in: Optional[int] = None):
+        self.name = name
+        self.depth = depth
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.seconds = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "depth": self.depth,
+            "seconds": self.seconds,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+        }
+
+
+class OperationRecord:
+    """
+    Everything recorded for one user operation, e.g. "Merge as New".
+
+    The total is the sum of the top-level stages, so time the user spends in a dialog is not counted.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.now()
+        self.stages: List[StageRecord] = []
+        self.peak_memory = None
+        self.profile = None
+        self.error = None
+
+    @property
+    def seconds(self) -> float:
+        return sum(stage.seconds for stage in self.stages if stage.depth == 0)
+
+    @property
+    def rows_in(self) -> Optional[int]:
+        top_level = [stage for stage in self.stages if stage.depth == 0 and stage.rows_in is not None]
+        return top_level[0].rows_in if top_level else None
+
+    @property
+    def rows_out(self) -> Optional[int]:
+        top_level = [stage for stage in self.stages if stage.depth == 0 and stage.rows_out is not None]
+        return top_level[-1].rows_out if top_level else None
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "seconds": self.seconds,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "peak_memory": self.peak_memory,
+            "error": self.error,
+            "stages": [stage.to_dict() for stage in self.stages],
+            "profile": self.profile,
+        }
+
+
+class PerformanceLog:
+    """
+    Records how long each stage of each operation takes, the rows going in and out, and peak memory.
+
+    Usage:
+        with performance_log.operation("Merge as New"):
+            with performance_log.stage("merge", rows_in=len(left) + len(right)) as stage:
+                merged = pd.merge(left, right, ...)
+                stage.rows_out = len(merged)
+
+    A stage opened outside of an operation is recorded as an operation of its own, so helpers like
+    populate_table can be instrumented without knowing who called them.
+
+    Peak memory is measured with tracemalloc, which also sees numpy/pandas buffers, when track_memory is set.
+    It is off by default: tracing every allocation slows Python-heavy work down several times and would skew the
+    timings. When profile_enabled is set, each operation also gets a cProfile capture of its stages.
+
+    Only the main (GUI) thread records, and listeners may update widgets. A worker thread collects the stages it
+    times with collect(), and the main thread adds them with record_stage once the worker is done.
+
+    Functions:
+    - operation: Context manager that records one operation.
+    - stage: Context manager that times one stage of the current operation.
+    - record_stage: Adds a stage that was timed elsewhere, e.g. in a worker thread, to the current operation,
+      with the stages the worker collected.
+    - collect: Context manager that collects the stages timed in a worker thread.
+    - add_listener: Registers a callback that is called with each finished OperationRecord.
+    - clear: Removes all records.
+    - to_json: Returns all records as a JSON string.
+    - export_json: Writes all records to a JSON file.
+    """
+
+    def __init__(self, max_records: int = 500):
+        self.records = deque(maxlen=max_records)
+        self.track_memory = False
+        self.profile_enabled = False
+        self._listeners: List[Callable[[OperationRecord], None]] = []
+        self._current: Optional[OperationRecord] = None
+        self._depth = 0
+        self._profiler: Optional[cProfile.Profile] = None
+        self._started_tracemalloc = False
+        # The list collecting the stages of each worker thread, and their depth, see collect
+        self._worker = threading.local()
+
+    @contextmanager
+    def operation(self, name: str):
+        if threading.current_thread() is not threading.main_thread():
+            yield OperationRecord(name)
+            return
+        if self._current is not None:
+            # Nested operation, e.g. a sort triggered from inside a merge: record into the outer one
+            yield self._current
+            return
+
+        record = OperationRecord(name)
+        self._current = record
+        self._started_tracemalloc = self.track_memory and not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start()
+        elif self.track_memory:
+            tracemalloc.reset_peak()
+        self._profiler = cProfile.Profile() if self.profile_enabled else None
+
+        try:
+            yield record
+        except Exception as e:
+            record.error = str(e)
+            raise
+        finally:
+            if self.track_memory and tracemalloc.is_tracing():
+                record.peak_memory = tracemalloc.get_traced_memory()[1]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            if self._profiler is not None:
+                record.profile = self._format_profile(self._profiler)
+            self._profiler = None
+            self._current = None
+
+            if record.stages:
+                self.records.append(record)
+                for listener in self._listeners:
+                    listener(record)
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None):
+        if threading.current_thread() is not threading.main_thread():
+            depth = getattr(self._worker, "depth", 0)
+            stage = StageRecord(name, depth, rows_in)
+            stages = getattr(self._worker, "stages", None)
+            if stages is not None:
+                stages.append(stage)
+            self._worker.depth = depth + 1
+            start = time.perf_counter()
+            try:
+                yield stage
+            finally:
+                stage.seconds = time.perf_counter() - start
+                self._worker.depth = depth
+            return
+        if self._current is None:
+            with self.operation(name):
+                with self.stage(name, rows_in) as stage:
+                    yield stage
+            return
+
+        stage = StageRecord(name, self._depth, rows_in)
+        self._current.stages.append(stage)
+        profile_stage = self._profiler is not None and self._depth == 0
+        self._depth += 1
+        if profile_stage:
+            self._profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds = time.perf_counter() - start
+            if profile_stage:
+                self._profiler.disable()
+            self._depth -= 1
+
+    def record_stage(self, name: str, seconds: float, rows_in: Optional[int] = None, rows_out: Optional[int] = None,
+                     stages: Optional[List[StageRecord]] = None):
+        """
+        Adds a stage timed elsewhere to the current operation. stages are the stages a worker thread collected
+        while it ran (see collect), which are nested under it.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            with self.stage(name, rows_in) as stage:
+                stage.rows_out = rows_out
+            stage.seconds = seconds
+            return
+        with self.operation(name) as record:
+            stage = StageRecord(name, self._depth, rows_in)
+            stage.rows_out = rows_out
+            stage.seconds = seconds
+            record.stages.append(stage)
+            for worker_stage in stages or []:
+                worker_stage.depth += self._depth + 1
+                record.stages.append(worker_stage)
+
+    @contextmanager
+    def collect(self, stages: List[StageRecord]):
+        """
+        Collects the stages timed in this (worker) thread into stages, to be passed to record_stage on the main
+        thread. Stages timed in a worker thread outside of collect are not recorded.
+        """
+        previous = getattr(self._worker, "stages", None)
+        self._worker.stages = stages
+        try:
+            yield stages
+        finally:
+            self._worker.stages = previous
+
+    def add_listener(self, callback: Callable[[OperationRecord], None]):
+        self._listeners.append(callback)
+
+    def clear(self):
+        self.records.clear()
+
+    def to_json(self) -> str:
+        return json.dumps([record.to_dict() for record in self.records], indent=2)
+
+    def export_json(self, file_path: str):
+        with open(file_path, "w") as file:
+            file.write(self.to_json())
+
+    @staticmethod
+    def _format_profile(profiler: cProfile.Profile, limit: int = 40) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        return stream.getvalue()
+
+
+# Shared by the GUI and by anything else that runs operations in this process
+performance_log = PerformanceLog()
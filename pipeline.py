@@ -0,0 +1,303 @@
+"""
+Headless batch runner for pipelines of Spreadsheet Application operations.
+
+A pipeline file (JSON, or YAML when PyYAML is installed) lists the input files and the steps to apply to each
+of them. Every input file is processed on its own, in parallel worker processes, and each result is reported as
+soon as it finishes:
+
+    {
+        "inputs": ["feeds/*.csv"],
+        "tables": {"customers": "lookups/customers.xlsx"},
+        "steps": [
+            {"op": "merge", "right": "customers", "left_on": "Customer ID", "right_on": "ID", "how": "left"},
+            {"op": "pivot", "columns": "Region", "values": "Amount"},
+            {"op": "export", "path": "out/{stem}_by_region.csv"}
+        ]
+    }
+
+Steps work on the current table, which starts as the input file. "tables" are loaded once per worker and can be
+referenced by name in merge and append steps; "save" stores the current table under a name and "use" makes a
+stored table current. "compute" adds or replaces a column computed from an expression over the other columns
+({"op": "compute", "name": "Total", "expression": "Price * Units"}, see engine.compute_columns). Export paths
+may contain {stem} (input file name without extension), {name} (input file name) and {dir} (input file
+directory). "backend" selects the execution backend for merge, pivot and sort ("pandas", "polars" or "duckdb",
+see backends.py), and "csv_reader" the reader for CSV and text inputs ("pandas", or "pyarrow" for the
+multi-threaded Arrow reader).
+
+Usage:
+    python app.py --pipeline weekly.json
+    python app.py --pipeline weekly.json --workers 8 feeds/2024-*.csv
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Union
+
+import pandas as pd
+
+import engine
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+class PipelineError(Exception):
+    """ Raised when a pipeline file or one of its steps is invalid """
+
+
+def load_pipeline(file_path: str) -> Dict:
+    extension = os.path.splitext(file_path)[1].lower()
+    with open(file_path) as file:
+        if extension in (".yml", ".yaml"):
+            if yaml is None:
+                raise PipelineError("PyYAML is required for YAML pipeline files (pip install pyyaml).")
+            pipeline = yaml.safe_load(file)
+        else:
+            pipeline = json.load(file)
+
+    if not isinstance(pipeline, dict) or not isinstance(pipeline.get("steps"), list):
+        raise PipelineError(f"{file_path}: a pipeline needs a list of 'steps'.")
+    for number, step in enumerate(pipeline["steps"], start=1):
+        if not isinstance(step, dict):
+            raise PipelineError(f"{file_path}: step {number} is not a mapping of an op and its options.")
+        if step.get("op") not in STEPS:
+            raise PipelineError(f"{file_path}: step {number} has an unknown op {step.get('op')!r}. "
+                                f"Known ops: {', '.join(STEPS)}.")
+    return pipeline
+
+
+def expand_inputs(patterns: List[str], base_dir: str = "") -> List[str]:
+    """ Expand glob patterns, relative to base_dir, into a sorted list of files without duplicates """
+    files = []
+    for pattern in patterns:
+        pattern = os.path.join(base_dir, os.path.expanduser(pattern))
+        matches = sorted(glob.glob(pattern)) or ([pattern] if os.path.exists(pattern) else [])
+        files.extend(match for match in matches if match not in files)
+    return files
+
+
+def read_table(file_path: str, sheet: Optional[str] = None) -> pd.DataFrame:
+    sheets = engine.read_file(file_path)
+    if sheet is None:
+        return sheets[0][1]
+    for sheet_name, data in sheets:
+        if sheet_name == sheet:
+            return data
+    raise PipelineError(f"{file_path} has no sheet named {sheet!r}.")
+
+
+def _merge(data, tables, step):
+    return engine.PlanNode(data, "merge", {"right": tables[step["right"]],
+                                           "left_on": step.get("left_on", step.get("on")),
+                                           "right_on": step.get("right_on", step.get("on")),
+                                           "how": step.get("how", "inner")})
+
+
+def _append(data, tables, step):
+    return engine.PlanNode(data, "append", {"second": tables[step["other"]],
+                                            "direction": step.get("direction", "vertically")})
+
+
+def _pivot(data, tables, step):
+    return engine.PlanNode(data, "pivot", {"columns": step["columns"], "values": step["values"],
+                                           "index": step.get("index"), "aggfunc": step.get("aggfunc", "sum")})
+
+
+def _unpivot(data, tables, step):
+    return engine.PlanNode(data, "unpivot", {"value_vars": step["columns"],
+                                             "var_name": step.get("var_name", "Variable"),
+                                             "value_name": step.get("value_name", "Value")})
+
+
+def _sort(data, tables, step):
+    return engine.PlanNode(data, "sort", {"by": step["by"], "ascending": step.get("ascending", True)})
+
+
+def _filter(data, tables, step):
+    return engine.PlanNode(data, "filter", {"column": step["column"], "text": str(step["text"]),
+                                            "match_case": step.get("match_case", False),
+                                            "whole_word": step.get("whole_word", False),
+                                            "starts_with": step.get("starts_with", False)})
+
+
+def _delete_rows(data, tables, step):
+    return engine.PlanNode(data, "delete_rows", {"positions": step["rows"]})
+
+
+def _delete_columns(data, tables, step):
+    return engine.PlanNode(data, "delete_columns", {"columns": step["columns"]})
+
+
+def _insert_row(data, tables, step):
+    return engine.PlanNode(data, "insert_row", {"position": step["position"]})
+
+
+def _insert_column(data, tables, step):
+    return engine.PlanNode(data, "insert_column", {"position": step["position"], "name": step["name"],
+                                                   "value": step.get("value", "")})
+
+
+def _rename_column(data, tables, step):
+    return engine.PlanNode(data, "rename_column", {"old_name": step["old"], "new_name": step["new"]})
+
+
+def _compute(data, tables, step):
+    return engine.PlanNode(data, "compute_columns", {"formulas": [(step["name"], step["expression"])]})
+
+
+STEPS = {
+    "merge": _merge,
+    "append": _append,
+    "pivot": _pivot,
+    "unpivot": _unpivot,
+    "sort": _sort,
+    "filter": _filter,
+    "delete_rows": _delete_rows,
+    "delete_columns": _delete_columns,
+    "insert_row": _insert_row,
+    "insert_column": _insert_column,
+    "rename_column": _rename_column,
+    "compute": _compute,
+    "export": None,
+    "save": None,
+    "use": None,
+}
+
+# Shared tables already loaded by this worker process, by (path, sheet)
+_shared_tables: Dict[tuple, pd.DataFrame] = {}
+
+
+def run_steps(data: pd.DataFrame, steps: List[Dict], tables: Dict[str, Union[pd.DataFrame, engine.PlanNode]],
+              placeholders: Dict[str, str], base_dir: str = "") -> List[str]:
+    """
+    Applies the steps to data and returns the paths that were exported. tables is updated by "save" steps.
+
+    Steps are only recorded as engine.PlanNodes; the data is evaluated, with consecutive row and column steps
+    fused into one pass, when it is exported.
+    """
+    outputs = []
+    for step in steps:
+        op = step["op"]
+        if op == "export":
+            file_path = os.path.join(base_dir, step["path"].format(**placeholders))
+            os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+            data = _evaluate(data, op)
+            engine.write_file(file_path, {step.get("sheet", "Sheet1"): data})
+            outputs.append(file_path)
+        elif op == "save":
+            # Saved tables are used again, so evaluate them once here
+            data = _evaluate(data, op)
+            tables[step["name"]] = data
+        elif op == "use":
+            data = tables[step["name"]]
+        else:
+            try:
+                data = STEPS[op](data, tables, step)
+            except KeyError as e:
+                raise PipelineError(f"Step {op!r}: unknown table, option or column {e}.") from e
+    return outputs
+
+
+def _evaluate(data: Union[pd.DataFrame, engine.PlanNode], op: str) -> pd.DataFrame:
+    try:
+        return engine.materialize(data)
+    except KeyError as e:
+        raise PipelineError(f"Step {op!r}: unknown column {e} in an earlier step.") from e
+    except pd.errors.UndefinedVariableError as e:
+        raise PipelineError(f"Step {op!r}: the expression of a compute step uses an unknown column: {e}.") from e
+
+
+def run_file(pipeline: Dict, input_path: str, base_dir: str = "") -> Dict:
+    """
+    Runs the pipeline on one input file. This is the unit of work sent to the worker processes.
+    """
+    start = time.perf_counter()
+    result = {"input": input_path, "outputs": [], "rows": None, "seconds": 0.0, "error": None}
+    try:
+        # Set here rather than in main, worker processes do not share the engine module of the parent
+        engine.set_backend(pipeline.get("backend", "pandas"))
+        engine.set_csv_reader(pipeline.get("csv_reader", "pandas"))
+        tables = {}
+        for name, spec in pipeline.get("tables", {}).items():
+            path, sheet = (spec, None) if isinstance(spec, str) else (spec["path"], spec.get("sheet"))
+            path = os.path.join(base_dir, path)
+            if (path, sheet) not in _shared_tables:
+                _shared_tables[(path, sheet)] = read_table(path, sheet)
+            tables[name] = _shared_tables[(path, sheet)]
+
+        data = read_table(input_path, pipeline.get("sheet"))
+        result["rows"] = len(data)
+        placeholders = {
+            "stem": os.path.splitext(os.path.basename(input_path))[0],
+            "name": os.path.basename(input_path),
+            "dir": os.path.dirname(input_path),
+        }
+        result["outputs"] = run_steps(data, pipeline["steps"], tables, placeholders, base_dir)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_pipeline(pipeline: Dict, inputs: List[str], workers: Optional[int] = None,
+                 base_dir: str = "") -> Iterator[Dict]:
+    """
+    Runs the pipeline on every input file in a process pool, yielding each result as soon as it is done.
+    """
+    if workers == 1 or len(inputs) <= 1:
+        for input_path in inputs:
+            yield run_file(pipeline, input_path, base_dir)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_file, pipeline, input_path, base_dir) for input_path in inputs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a Spreadsheet Application pipeline without the GUI.")
+    parser.add_argument("--pipeline", required=True, help="Pipeline file (.json, or .yaml with PyYAML)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--backend", help="Execution backend for merge, pivot and sort (pandas, polars, duckdb)")
+    parser.add_argument("inputs", nargs="*", help="Input files or globs, instead of the pipeline's 'inputs'")
+    args = parser.parse_args(argv)
+
+    try:
+        pipeline = load_pipeline(args.pipeline)
+        if args.backend:
+            pipeline["backend"] = args.backend
+        engine.set_backend(pipeline.get("backend", "pandas"))
+        engine.set_csv_reader(pipeline.get("csv_reader", "pandas"))
+    except (OSError, ValueError, PipelineError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    # Paths in the pipeline file are relative to the pipeline file, paths on the command line to the cwd
+    base_dir = os.path.dirname(os.path.abspath(args.pipeline))
+    inputs = expand_inputs(args.inputs) if args.inputs else expand_inputs(pipeline.get("inputs", []), base_dir)
+    if not inputs:
+        print("Error: no input files matched.", file=sys.stderr)
+        return 2
+
+    failed = 0
+    for result in run_pipeline(pipeline, inputs, args.workers or pipeline.get("workers"), base_dir):
+        if result["error"]:
+            failed += 1
+            print(f"FAILED {result['input']}: {result['error']}", flush=True)
+        else:
+            print(f"done   {result['input']} ({result['rows']} rows, {result['seconds']:.2f}s) -> "
+                  f"{', '.join(result['outputs']) or 'no outputs'}", flush=True)
+
+    print(f"{len(inputs) - failed} of {len(inputs)} input files processed.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
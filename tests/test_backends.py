@@ -0,0 +1,68 @@
+"""
+The Polars and DuckDB backends give the same results as pandas.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import backends
+import engine
+
+BACKENDS = [name for name in backends.available_backends() if name != "pandas"]
+
+pytestmark = pytest.mark.skipif(not BACKENDS, reason="neither Polars nor DuckDB is installed")
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    engine.set_backend(request.param)
+    yield request.param
+    engine.set_backend("pandas")
+
+
+def run_on_pandas(function, *args, **kwargs):
+    backend = engine.execution_backend
+    engine.set_backend("pandas")
+    try:
+        return function(*args, **kwargs)
+    finally:
+        engine.set_backend(backend)
+
+
+@pytest.fixture
+def tables():
+    rng = np.random.default_rng(1)
+    left = pd.DataFrame({"Key": rng.integers(0, 50, 300), "Region": rng.choice(list("NSEW"), 300).astype(object),
+                         "Amount": rng.random(300)})
+    right = pd.DataFrame({"ID": np.arange(25, 75), "Name": [f"n{i}" for i in range(50)],
+                          "Amount": rng.random(50)})
+    return left, right
+
+
+@pytest.mark.parametrize("how", engine.JOIN_TYPES)
+def test_merge_on_different_key_names(backend, tables, how):
+    left, right = tables
+    expected = run_on_pandas(engine.merge, left, right, "Key", "ID", how)
+    pd.testing.assert_frame_equal(engine.merge(left, right, "Key", "ID", how), expected)
+
+
+@pytest.mark.parametrize("how", engine.JOIN_TYPES)
+def test_merge_on_a_shared_key_name(backend, tables, how):
+    left, right = tables
+    right = right.rename(columns={"ID": "Key"})
+    expected = run_on_pandas(engine.merge, left, right, "Key", "Key", how)
+    pd.testing.assert_frame_equal(engine.merge(left, right, "Key", "Key", how), expected)
+
+
+@pytest.mark.parametrize("aggfunc", backends.AGGREGATIONS)
+def test_pivot(backend, tables, aggfunc):
+    left, _ = tables
+    expected = run_on_pandas(engine.pivot, left, "Region", "Amount", index="Key", aggfunc=aggfunc)
+    result = engine.pivot(left, "Region", "Amount", index="Key", aggfunc=aggfunc)
+    pd.testing.assert_frame_equal(result, expected, check_names=False)
+
+
+def test_sort(backend, tables):
+    left, _ = tables
+    expected = run_on_pandas(engine.sort, left, ["Region", "Amount"], [True, False])
+    pd.testing.assert_frame_equal(engine.sort(left, ["Region", "Amount"], [True, False]), expected)
@@ -0,0 +1,270 @@
+"""
+Behavioural tests of the headless engine: lazy plans, the edit journal, diffs, find and replace, formulas and
+reading rows appended to a file.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+
+
+@pytest.fixture
+def sales():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "ID": np.arange(200),
+        "Region": rng.choice(["North", "South", "East", "West"], 200).astype(object),
+        "Amount": rng.random(200) * 100,
+        "Units": rng.integers(1, 10, 200),
+    })
+
+
+# Lazy plans
+
+CHAIN = [
+    ("rename_column", {"old_name": "Amount", "new_name": "Total"}),
+    ("filter", {"column": "Region", "text": "th"}),
+    ("sort", {"by": "Total", "ascending": False}),
+    ("delete_rows", {"positions": [0, 3, 5]}),
+    ("delete_columns", {"columns": ["Units"]}),
+    ("insert_column", {"position": 1, "name": "Note", "value": "x"}),
+    ("sort", {"by": ["Region", "ID"], "ascending": [True, False]}),
+]
+
+
+def test_fused_evaluation_matches_eager(sales):
+    eager = sales
+    for op, params in CHAIN:
+        eager = engine.OPERATIONS[op](eager, **params)
+    fused = engine.evaluate(sales, CHAIN)
+    pd.testing.assert_frame_equal(fused.reset_index(drop=True), eager.reset_index(drop=True))
+
+
+def test_recorded_revisions_evaluate_lazily(sales):
+    table_revision = engine.TableRevision(sales)
+    for op, params in CHAIN:
+        table_revision.record(op, **params)
+    assert table_revision.is_lazy()
+    expected = engine.evaluate(sales, CHAIN)
+    pd.testing.assert_frame_equal(table_revision.get_data(), expected)
+    # Undo goes back to a revision that is evaluated again from the original
+    table_revision.undo()
+    pd.testing.assert_frame_equal(table_revision.get_data(), engine.evaluate(sales, CHAIN[:-1]))
+
+
+def test_dropped_revisions_leave_no_cached_stats(sales):
+    table_revision = engine.TableRevision(sales)
+    for number in range(15):
+        table_revision.record("sort", by="ID", ascending=number % 2 == 0)
+        table_revision.get_data()
+        # As the memory inspector does
+        for index in range(len(table_revision.revisions)):
+            table_revision.revision_stats(index)
+    live = {id(revision if isinstance(revision, pd.DataFrame) else revision.result)
+            for revision in table_revision.revisions}
+    assert set(table_revision._stats_cache) <= live
+
+
+# Edit journal
+
+def test_set_cells_converts_columns_that_cannot_hold_the_values(sales):
+    edited = engine.set_cells(sales, {"Units": (np.array([0, 2]), [1.5, 7]), "Region": (np.array([1]), ["Up"])})
+    assert edited["Units"].dtype == np.float64
+    assert edited["Units"].iloc[[0, 1, 2]].tolist() == [1.5, sales["Units"].iloc[1], 7]
+    assert edited["Region"].iloc[1] == "Up"
+    # The columns that were not edited are shared, and the data is not changed
+    assert np.shares_memory(edited["ID"].to_numpy(), sales["ID"].to_numpy())
+    assert sales["Region"].iloc[1] != "Up"
+
+
+def test_edits_are_committed_as_one_revision(sales):
+    table_revision = engine.TableRevision(sales)
+    columns = list(sales.columns)
+    table_revision.edit_cell(0, columns.index("Units"), "42")
+    table_revision.edit_cell(5, columns.index("Region"), "Up")
+    assert table_revision.pending_edits() == 2
+    assert table_revision.cell(0, columns.index("Units")) == 42
+    assert len(table_revision.revisions) == 1
+
+    data = table_revision.get_data()
+    assert len(table_revision.revisions) == 2 and table_revision.pending_edits() == 0
+    assert data["Units"].iloc[0] == 42 and data["Region"].iloc[5] == "Up"
+    table_revision.undo()
+    pd.testing.assert_frame_equal(table_revision.get_data(), sales)
+
+
+def test_edit_cell_checks_the_column_type(sales):
+    table_revision = engine.TableRevision(sales)
+    with pytest.raises(ValueError):
+        table_revision.edit_cell(0, list(sales.columns).index("Units"), "many")
+    assert table_revision.pending_edits() == 0
+
+
+# Diffs
+
+def test_diff_rows_matches_moved_rows_by_content():
+    old = pd.DataFrame({"a": [1, 2, 3, 4, 5], "b": list("abcde")})
+    new = pd.DataFrame({"a": [2, 1, 3, 40, 5, 6], "b": list("bacdef")})
+    diff = engine.diff_rows(engine.row_hashes(old), engine.row_hashes(new))
+    assert diff["unchanged"] == 4
+    assert diff["changed_old"].tolist() == [3] and diff["changed_new"].tolist() == [3]
+    assert diff["deleted"].tolist() == [] and diff["inserted"].tolist() == [5]
+
+
+def test_diff_rows_numbers_repeated_rows():
+    old = pd.DataFrame({"a": [1, 1, 1]})
+    new = pd.DataFrame({"a": [1, 1]})
+    diff = engine.diff_rows(engine.row_hashes(old), engine.row_hashes(new))
+    assert diff["unchanged"] == 2 and diff["deleted"].tolist() == [2]
+
+
+def test_diff_tables_on_a_key():
+    old = pd.DataFrame({"k": [1, 2, 3], "v": [10, 20, 30], "gone": ["x", "y", "z"]})
+    new = pd.DataFrame({"k": [3, 1, 4], "v": [30, 11, 40], "extra": [0, 0, 0]})
+    diff = engine.diff_tables(old, new, key="k")
+    assert (diff["added"], diff["removed"], diff["modified"], diff["unchanged"]) == (1, 1, 1, 1)
+    assert diff["added_columns"] == ["extra"] and diff["removed_columns"] == ["gone"]
+    table = diff["table"]
+    # In the order of new, each removed row before the row that took its place
+    assert table["Change"].tolist() == ["removed", "modified", "added"]
+    assert table["Changed Columns"].tolist() == ["", "v", ""]
+    assert table["k"].tolist() == [2, 1, 4]
+    assert table["Old Row"].tolist()[:2] == [2, 1] and table["New Row"].tolist()[1:] == [2, 3]
+
+
+def test_diff_tables_by_position():
+    old = pd.DataFrame({"v": [1, 2, 3]})
+    new = pd.DataFrame({"v": [1, 5]})
+    diff = engine.diff_tables(old, new)
+    assert diff["table"]["Change"].tolist() == ["modified", "removed"]
+    assert diff["changed"][:, list(diff["table"].columns[len(engine.DIFF_COLUMNS):]).index("v")].tolist() == \
+        [True, False]
+
+
+# Find and replace
+
+def test_find_replace_counts_and_converts_back():
+    data = pd.DataFrame({"s": ["one two", "two", None, "Two three"], "n": [12, 2, 22, 3]})
+    cells, matches = engine.find_replace(data, "two", "2")
+    assert matches == 3 and list(cells) == ["s"]
+    replaced = engine.set_cells(data, cells)
+    assert replaced["s"].tolist()[:2] == ["one 2", "2"] and replaced["s"].iloc[3] == "2 three"
+    assert pd.isna(replaced["s"].iloc[2])
+
+    # Numbers are replaced on their text and converted back to numbers
+    cells, matches = engine.find_replace(data, "2", "5", columns=["n"])
+    assert matches == 4
+    replaced = engine.set_cells(data, cells)
+    assert replaced["n"].tolist() == [15, 5, 55, 3] and replaced["n"].dtype.kind == "i"
+
+
+def test_find_replace_stops_between_columns_when_cancelled():
+    data = pd.DataFrame({"a": ["x", "y"], "b": ["x", "x"]})
+    searched = []
+    cells, matches = engine.find_replace(data, "x", "z", cancelled=lambda: searched.append(1) or len(searched) > 1)
+    assert list(cells) == ["a"] and matches == 1
+
+
+def test_find_replace_whole_cell_and_regex_groups():
+    data = pd.DataFrame({"s": ["ab", "abc", "ab\n", "café"]})
+    cells, matches = engine.find_replace(data, "ab", "x", whole_word=True)
+    assert matches == 1 and cells["s"][0].tolist() == [0]
+    cells, matches = engine.find_replace(data, r"^(\w)(\w+)$", r"\2\1", regex=True)
+    # Regular expressions are Python's: \w matches é, and $ matches before a final newline
+    assert dict(zip(cells["s"][0].tolist(), cells["s"][1].tolist())) == {0: "ba", 1: "bca", 2: "ba\n", 3: "aféc"}
+
+
+def test_find_replace_searches_the_shown_text_of_dates():
+    data = pd.DataFrame({"d": [pd.Timestamp("2020-01-01"), pd.Timestamp("2021-06-01 12:30")]})
+    assert engine.match_mask(data["d"], "00:00:00").tolist() == [True, False]
+
+
+# Formulas
+
+def test_dependent_formulas_are_ordered():
+    formulas = {"C": "B * 2", "B": "A + 1", "D": "C + B", "E": "Other"}
+    assert engine.dependent_formulas(formulas, ["A"]) == [("B", "A + 1"), ("C", "B * 2"), ("D", "C + B")]
+    assert engine.dependent_formulas(formulas, ["Other"]) == [("E", "Other")]
+
+
+def test_define_formula_rejects_cycles():
+    with pytest.raises(ValueError):
+        engine.define_formula({"B": "A + 1"}, "A", "B * 2")
+
+
+def test_renaming_a_column_keeps_strings():
+    formulas, _ = engine.update_formulas({"C": "(R == 'A') * A + `A`"}, "rename_column",
+                                         {"old_name": "A", "new_name": "A B"})
+    assert formulas == {"C": "(R == 'A') * `A B` + `A B`"}
+
+
+def test_changed_columns_recalculate_their_formulas(sales):
+    table_revision = engine.TableRevision(sales)
+    table_revision.compute_column("Price", "Amount / Units")
+    table_revision.compute_column("Double", "Price * 2")
+    table_revision.edit_cell(0, list(sales.columns).index("Amount"), "90")
+    data = table_revision.get_data()
+    assert data["Price"].iloc[0] == pytest.approx(90 / sales["Units"].iloc[0])
+    assert data["Double"].iloc[0] == pytest.approx(2 * data["Price"].iloc[0])
+
+
+def test_formulas_carry_over_when_the_oldest_revision_is_dropped(sales):
+    table_revision = engine.TableRevision(sales)
+    table_revision.compute_column("Price", "Amount / Units")
+    for number in range(12):
+        table_revision.record("sort", by="ID", ascending=number % 2 == 0)
+    assert len(table_revision.revisions) == 10
+    assert table_revision.formulas() == {"Price": "Amount / Units"}
+
+
+def test_only_recalculated_formulas_skip_missing_columns(sales):
+    with pytest.raises(pd.errors.UndefinedVariableError):
+        engine.compute_columns(sales, [("D", "Amount * Amont")])
+    data = engine.compute_columns(sales.assign(D=1), [], recalculated=[("D", "Amount * Amont")])
+    assert (data["D"] == 1).all()
+
+    table_revision = engine.TableRevision(sales)
+    with pytest.raises(pd.errors.UndefinedVariableError):
+        table_revision.compute_column("D", "Amount * Amont")
+    assert table_revision.formulas() == {} and len(table_revision.revisions) == 1
+
+
+# Followed files
+
+def test_read_new_rows_leaves_a_partial_line(tmp_path):
+    path = tmp_path / "feed.csv"
+    path.write_bytes(b"a,b\n1,x\n")
+    offset = path.stat().st_size
+    with open(path, "ab") as file:
+        file.write(b"2,y\n3,")
+    rows, offset = engine.read_new_rows(str(path), offset, pd.Series({"a": np.int64, "b": object}))
+    assert rows.to_dict("list") == {"a": [2], "b": ["y"]}
+    assert offset == len(b"a,b\n1,x\n2,y\n")
+
+    with open(path, "ab") as file:
+        file.write(b"z\n")
+    rows, offset = engine.read_new_rows(str(path), offset)
+    assert rows.to_dict("list") == {"a": [3], "b": ["z"]} and offset == path.stat().st_size
+
+    rows, _ = engine.read_new_rows(str(path), offset)
+    assert rows.empty and list(rows.columns) == ["a", "b"]
+
+
+# Tables
+
+def test_add_table_keeps_only_the_data_of_an_evaluated_result(sales):
+    tables = engine.TableStore()
+    node = engine.PlanNode(sales, "delete_columns", {"columns": ["Units"]})
+    engine.materialize(node)
+    name = tables.add_table("Query", node)
+    assert isinstance(tables[name].revisions[0], pd.DataFrame)
+    assert list(tables[name].get_data().columns) == ["ID", "Region", "Amount"]
+    assert tables.add_table("Query", sales) == "Query (1)"
+
+
+def test_a_merge_on_keys_of_different_types_fails_when_evaluated(sales):
+    lookup = pd.DataFrame({"ID": np.arange(10).astype(str), "Name": list("abcdefghij")})
+    with pytest.raises(ValueError):
+        engine.materialize(engine.PlanNode(sales, "merge", {"right": lookup, "left_on": "ID", "right_on": "ID",
+                                                            "how": "inner"}))
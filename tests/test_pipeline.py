@@ -0,0 +1,27 @@
+"""
+The headless pipeline runner reports invalid pipelines and failing steps instead of writing wrong outputs.
+"""
+import json
+
+import pipeline
+
+
+def write_pipeline(tmp_path, steps) -> str:
+    (tmp_path / "in.csv").write_text("Amount,Units\n1,2\n3,4\n")
+    file_path = tmp_path / "pipeline.json"
+    file_path.write_text(json.dumps({"inputs": ["in.csv"], "steps": steps}))
+    return str(file_path)
+
+
+def test_a_compute_step_with_an_unknown_column_fails(tmp_path, capsys):
+    file_path = write_pipeline(tmp_path, [{"op": "compute", "name": "D", "expression": "Amount * Amont"},
+                                          {"op": "export", "path": "out.csv"}])
+    assert pipeline.main(["--pipeline", file_path, "--workers", "1"]) == 1
+    assert "PipelineError" in capsys.readouterr().out
+    assert not (tmp_path / "out.csv").exists()
+
+
+def test_a_step_that_is_not_a_mapping_is_an_error(tmp_path, capsys):
+    file_path = write_pipeline(tmp_path, ["export"])
+    assert pipeline.main(["--pipeline", file_path]) == 2
+    assert "step 1 is not a mapping" in capsys.readouterr().err